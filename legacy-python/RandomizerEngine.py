@@ -1,30 +1,93 @@
-
 import json
+import os
 import random
 import re
+from functools import lru_cache
 from typing import Dict, List, Any, Optional
 
+from expander import DEFAULT_MAX_DEPTH, DEFAULT_MAX_EXPANSIONS, Expander
+from grammar_ir import RULE_TOKEN_RE, compile_generator
+from include_loader import IncludeResolver, bundle_stem, read_json
+from prng import get_prng, index_states
+from session import GenerationContext, GenerationSession
+from variable_store import UNSET, VariableStore, VariablesView
+
+SELECTION_MODES = ('exact', 'alias')
+
+# Longest input the modifier LRU caches; longer texts rarely repeat
+MODIFIER_CACHE_MAX_LENGTH = 64
+
 class RandomizerEngine:
-    def __init__(self, seed=None):
+    def __init__(self, seed=None, selection='exact', prng='lcg',
+                 max_depth=DEFAULT_MAX_DEPTH, max_expansions=DEFAULT_MAX_EXPANSIONS, modifier_cache_size=0,
+                 vectorize=True):
+        """
+        selection: 'exact' reproduces the historical LCG-driven picks bit for bit
+        (bisect over cumulative integer weights, linear scan otherwise); 'alias'
+        uses precomputed Walker/Vose alias tables for O(1) weighted picks.
+
+        prng: 'lcg' (the historical 32-bit generator, bit-compatible replays) or
+        'splitmix64' (2^64 period, O(1) jump-ahead and independent substreams).
+        A class implementing the prng.py interface is accepted as well.
+
+        max_depth / max_expansions: limits on nested and total rule expansions per
+        generation; past them a marker is rendered instead of raising RecursionError.
+
+        modifier_cache_size: when positive, pure modifiers (`a_an`, `plural` and
+        those registered with pure=True) remember this many results for inputs
+        of up to MODIFIER_CACHE_MAX_LENGTH characters.
+
+        vectorize: let generate_many sample flat grammars with NumPy when it is
+        installed (see vectorized.py); the items are the same either way.
+        """
+        if selection not in SELECTION_MODES:
+            raise ValueError(f"Unknown selection mode '{selection}', expected one of {SELECTION_MODES}")
+        self.selection = selection
+        self._alias_selection = selection == 'alias'
         self.loaded_generators = {}
-        self.variables = {}
+        self._compiled = {}
+        self._stores: Dict[str, VariableStore] = {}
+        # Flat "{generator_name}.{var_name}" view over the per-generator stores
+        self.variables = VariablesView(self._stores)
         self.assets = {}
+        # Files each generator was built from (bundle + includes), for snapshots
+        self._sources: Dict[str, List[str]] = {}
         self._seed = None
-        self._prng_state = None
+        self.prng = get_prng(prng)
+        # Rules are expanded with an explicit stack (see expander.py)
+        self._expander = Expander(max_depth, max_expansions)
+        self.profile = None  # Profile while enable_profiling() is in effect
+        self.traces = None  # default TraceLog while enable_tracing() is in effect
+        self._tracer = None  # TracingExpander for calls that carry a TraceLog
+        self._rng = None
+        self._session_count = 0
         self.modifiers = {
-            "capitalize": lambda s: s.capitalize(),
-            "upper": lambda s: s.upper(),
-            "lower": lambda s: s.lower(),
+            "capitalize": str.capitalize,
+            "upper": str.upper,
+            "lower": str.lower,
             "a_an": self._modifier_a_an,
             "plural": self._modifier_plural,
         }
+        self._builtin_modifiers = dict(self.modifiers)
+        # Modifier chains (#rule.mod1.mod2#) resolved to one callable each; reset by register_modifier
+        self._modifier_chains = {}
+        self._pure_modifiers = {"a_an", "plural"}
+        self._modifier_cache_size = modifier_cache_size
+        self._cached_modifiers = {}
+        self._reported_modifiers = set()
+        self.vectorize = vectorize
+        # (generator, entry point, target) -> (compiled generator, vectorized plan or None)
+        self._batch_plans = {}
+        self._async_running = 0  # agenerate calls in flight (see aio.py)
+        self._async_forks = 0    # substreams handed to overlapping agenerate calls
         if seed is not None:
             self.set_seed(seed)
 
     def _modifier_a_an(self, text: str) -> str:
-        if not text: return text
-        first_word = text.split()[0]
-        if first_word[0].lower() in "aeiou":
+        # Only the first character of the first word matters
+        stripped = text.lstrip()
+        if not stripped: return text
+        if stripped[0].lower() in "aeiou":
             return f"an {text}"
         return f"a {text}"
 
@@ -38,50 +101,112 @@ class RandomizerEngine:
         else:
             return text + "s"
 
-    def register_modifier(self, name: str, func: callable):
+    def register_modifier(self, name: str, func: callable, pure: bool = False):
+        """
+        Add or replace a modifier. pure: the result depends only on the input
+        text, so the modifier LRU (modifier_cache_size) may remember it.
+        """
         self.modifiers[name] = func
-
-    def _xfnv1a(self, string_seed: str) -> int:
-        """Simple string to int hash for seeding."""
-        h = 2166136261
-        for char in string_seed:
-            h = (h ^ ord(char)) * 16777619
-        return h & 0xFFFFFFFF # Ensure 32-bit unsigned like behavior
-
-    def _lcg(self):
-        """Linear Congruential Generator."""
-        # Parameters from Numerical Recipes
-        self._prng_state = (1664525 * self._prng_state + 1013904223) & 0xFFFFFFFF
-        return (self._prng_state / 0xFFFFFFFF)
+        if pure:
+            self._pure_modifiers.add(name)
+        else:
+            self._pure_modifiers.discard(name)
+        self._cached_modifiers.pop(name, None)
+        self._modifier_chains.clear()
+        self._batch_plans.clear()
 
     def set_seed(self, seed: Any):
-        if isinstance(seed, str):
-            self._seed = seed
-            self._prng_state = self._xfnv1a(seed)
-        elif isinstance(seed, int):
+        if isinstance(seed, (str, int)):
             self._seed = seed # Store original seed
-            self._prng_state = seed & 0xFFFFFFFF # Ensure 32-bit
         else:
             # Fallback to system random if seed is weird, but store None for _seed
             self._seed = None
-            self._prng_state = random.randint(0, 0xFFFFFFFF)
-
-        # Call LCG a few times to warm it up, as first few numbers can be less random
-        for _ in range(5):
-            self._lcg()
+        self._rng = self.prng.from_seed(self._seed)
 
     def get_seed(self) -> Any:
         return self._seed
 
-    def _get_random_float(self) -> float:
-        if self._prng_state is not None:
-            return self._lcg()
-        else:
-            # Fallback to Python's default random if no seed was set
-            return random.random()
-
-    def load_generator(self, generator_data, bundle_name=None):
-        """Load a generator bundle from JSON"""
+    def get_rng(self):
+        """The engine's current PRNG (None until a seed is set)"""
+        return self._rng
+
+    def enable_profiling(self):
+        """
+        Start recording per-rule expansion counts, inclusive/exclusive time and
+        option histograms (see profiler.py); returns the Profile. Generation
+        output is unchanged, and nothing is measured while profiling is disabled.
+        """
+        from profiler import Profile, ProfilingExpander
+
+        if self.traces is not None:
+            raise ValueError('Tracing is enabled; disable it before profiling')
+        if self.profile is None:
+            self.profile = Profile()
+            self._expander = ProfilingExpander(self._expander.max_depth, self._expander.max_expansions,
+                                               self.profile)
+        return self.profile
+
+    def disable_profiling(self):
+        """Stop profiling and return the collected Profile (None if it was not enabled)"""
+        profile = self.profile
+        if profile is not None:
+            self._expander = Expander(self._expander.max_depth, self._expander.max_expansions)
+            self.profile = None
+        return profile
+
+    def enable_tracing(self):
+        """
+        Trace every call that does not pass its own `trace` log: its rule path,
+        chosen option indices, fired actions and variable changes go to a
+        compact TraceLog (see tracer.py); returns the log. `log[i]` is the i-th
+        output generated since. Generation output is unchanged.
+        """
+        from tracer import TraceLog
+
+        if self.profile is not None:
+            raise ValueError('Profiling is enabled; disable it before tracing')
+        if self.traces is None:
+            self.traces = TraceLog()
+        return self.traces
+
+    def disable_tracing(self):
+        """Stop the default tracing and return its TraceLog (None if it was not enabled)"""
+        traces = self.traces
+        self.traces = None
+        return traces
+
+    def _expander_for(self, context):
+        """The expander walking `context`: the tracing one when the call records a trace"""
+        if context.trace is None:
+            return self._expander
+        tracer = self._tracer
+        if tracer is None:
+            from tracer import TracingExpander
+
+            if self.profile is not None:
+                raise ValueError('Profiling is enabled; disable it before tracing')
+            tracer = self._tracer = TracingExpander(self._expander.max_depth, self._expander.max_expansions)
+        return tracer
+
+    def session(self, seed=None):
+        """
+        Independent generation state (PRNG + variable values) over this engine's
+        shared, read-only grammars. Use one session per thread or task; sessions
+        never see each other's variable changes. Without a seed, a session derives
+        its own substream from the engine's PRNG (or uses system random if unseeded).
+        """
+        if seed is None and self._rng is not None:
+            self._session_count += 1
+            return GenerationSession(self, rng=self._rng.substream(self._session_count))
+        return GenerationSession(self, seed=seed)
+
+    def load_generator(self, generator_data, bundle_name=None, base_path=None):
+        """
+        Load a generator bundle from JSON.
+
+        base_path: path of the bundle file; `$include` paths are resolved
+        relative to it. Without it they resolve against ./generators/.
+        """
         try:
             if isinstance(generator_data, str):
                 generator = json.loads(generator_data)
@@ -94,9 +219,13 @@ class RandomizerEngine:
             name = bundle_name or generator['metadata']['name']
 
             # Initialize variables
+            store = self._stores.get(name)
+            if store is None:
+                store = self._stores[name] = VariableStore()
+                self.variables.adopt(name, store)
             if 'variables' in generator:
                 for var_name, var_def in generator['variables'].items():
-                    self.variables[f"{name}.{var_name}"] = var_def.get('default')
+                    store.set(var_name, var_def.get('default'))
 
             # Load assets
             if 'assets' in generator:
@@ -105,24 +234,28 @@ class RandomizerEngine:
             # Store the generator
             self.loaded_generators[name] = generator
 
-            # Process $include directives in grammar
+            # Inline $include directives (nested, cached, relative to the bundle's path)
             if 'grammar' in generator:
-                for rule_name, rule_content in generator['grammar'].items():
-                    if isinstance(rule_content, dict) and '$include' in rule_content:
-                        include_path = rule_content['$include']
-                        # Assuming include_path is relative to the generator file
-                        # For simplicity, we'll assume it's in the same 'generators' directory
-                        full_include_path = f"generators/{include_path}"
-                        try:
-                            with open(full_include_path, 'r') as f:
-                                included_data = json.load(f)
-                            generator['grammar'][rule_name] = included_data
-                        except FileNotFoundError:
-                            print(f"Warning: Included file not found: {full_include_path}")
-                            generator['grammar'][rule_name] = f"[INCLUDE_ERROR: {include_path}]"
-                        except json.JSONDecodeError:
-                            print(f"Warning: Invalid JSON in included file: {full_include_path}")
-                            generator['grammar'][rule_name] = f"[INCLUDE_ERROR: {include_path}]"
+                if base_path is None:
+                    # Legacy: bundles given as data resolve against ./generators/
+                    root_dir, stem = 'generators', bundle_stem(generator['metadata']['name'])
+                else:
+                    root_dir = os.path.dirname(base_path)
+                    stem = os.path.splitext(os.path.basename(base_path))[0]
+                resolver = IncludeResolver(root_dir, stem)
+                resolver.resolve_grammar(generator['grammar'])
+                sources = resolver.files
+            else:
+                sources = []
+            if base_path is not None:
+                sources.insert(0, os.path.abspath(base_path))
+            self._sources[name] = sources
+
+            # Pre-parse every rule once so generation never re-tokenizes text
+            compiled = self._compiled[name] = compile_generator(name, generator, store)
+            self._drop_batch_plans(name)
+            for mod_name in sorted(compiled.modifier_names.difference(self.modifiers)):
+                self._report_unknown_modifier(mod_name)
 
             print(f"Successfully loaded generator: {name}")
             return name
@@ -130,6 +263,66 @@ class RandomizerEngine:
             print(f"Failed to load generator: {error}")
             raise error
 
+    def load_generator_file(self, path, bundle_name=None):
+        """Load a generator bundle from a .json file, resolving includes next to it"""
+        data = read_json(path)
+        # The parsed file is cached and shared; includes are inlined into a copy
+        generator = dict(data)
+        if isinstance(data.get('grammar'), dict):
+            generator['grammar'] = dict(data['grammar'])
+        return self.load_generator(generator, bundle_name, base_path=path)
+
+    async def aload_generator_file(self, path, bundle_name=None):
+        """load_generator_file with the bundle and its includes read and parsed on a worker thread"""
+        import asyncio
+
+        from include_loader import prefetch_bundle
+
+        await asyncio.get_running_loop().run_in_executor(None, prefetch_bundle, path)
+        return self.load_generator_file(path, bundle_name)
+
+    def save_snapshot(self, path, generator_names=None):
+        """
+        Write the loaded (include-resolved, compiled) generators and their variable
+        stores to a versioned binary file that load_snapshot can restore quickly
+        """
+        from snapshot import save_snapshot
+
+        save_snapshot(self, path, generator_names)
+
+    def load_snapshot(self, path, validate=True):
+        """
+        Restore generators written by save_snapshot; returns their names.
+        validate: refuse the snapshot if a recorded source file has changed since.
+        """
+        from snapshot import load_snapshot
+
+        return load_snapshot(self, path, validate=validate)
+
+    def analyze_generator(self, generator_name):
+        """
+        Static report on a loaded generator: missing and invalid rules, undefined
+        and variable references, unreachable rules, cycles and worst-case depth
+        (see grammar_analyzer.py)
+        """
+        from grammar_analyzer import analyze_generator
+
+        if generator_name not in self.loaded_generators:
+            raise ValueError(f"Generator '{generator_name}' not found")
+        return analyze_generator(self, generator_name)
+
+    def count_outputs(self, generator_name, entry_point=None, target=None, variables=None):
+        """
+        Exact derivation count, option probabilities and entropy (bits) of an
+        entry point or target, with conditions evaluated against the current
+        variable values overridden by `variables` (see grammar_analyzer.py)
+        """
+        from grammar_analyzer import count_outputs
+
+        if generator_name not in self.loaded_generators:
+            raise ValueError(f"Generator '{generator_name}' not found")
+        return count_outputs(self, generator_name, entry_point, target, variables)
+
     def _validate_generator(self, generator):
         """Validate generator structure"""
         if 'metadata' not in generator or 'name' not in generator['metadata']:
@@ -141,326 +334,385 @@ class RandomizerEngine:
 
     def generate(self, generator_name, options=None):
         """Generate text from a loaded generator"""
+        return self._generate(generator_name, options, None)
+
+    def _generate(self, generator_name, options, session):
         if options is None:
             options = {}
 
         entry_point = options.get('entry_point')
         context = options.get('context', {})
         target = options.get('target')
+        trace = options.get('trace')
 
         if generator_name not in self.loaded_generators:
             raise ValueError(f"Generator '{generator_name}' not found")
 
-        generator = self.loaded_generators[generator_name]
+        run = self._entry_runner(generator_name, entry_point, target)
+        store = self._stores[generator_name]
+        if session is None:
+            values, rng = store.values, self._rng
+        else:
+            values, rng = session._values_for(generator_name), session.rng
+        # Values as of the start of this generation; reads fall back to the live values
+        generation_context = GenerationContext(generator_name, store, values, values[:], rng, context,
+                                               self.traces if trace is None else trace)
+        return run(generation_context)
+
+    def generate_targets(self, generator_name, targets=None, context=None, trace=None):
+        """
+        Render several `targeting` templates (default: all of them) from one
+        derivation: shared placeholder rules are expanded once, so every target
+        describes the same content. Returns {target: output}. A single target
+        gives the same output as generate(name, {'target': target}).
+        """
+        return self._generate_targets(generator_name, targets, context, None, trace)
+
+    def _generate_targets(self, generator_name, targets, context, session, trace=None):
+        if generator_name not in self.loaded_generators:
+            raise ValueError(f"Generator '{generator_name}' not found")
+        targets = self._target_names(generator_name, targets)
+        store = self._stores[generator_name]
+        if session is None:
+            values, rng = store.values, self._rng
+        else:
+            values, rng = session._values_for(generator_name), session.rng
+        generation_context = GenerationContext(generator_name, store, values, values[:], rng, context or {},
+                                               self.traces if trace is None else trace)
+        return dict(zip(targets, self._render_targets(targets, generation_context)))
+
+    def generate_many_targets(self, generator_name, n, targets=None, seed=None, context=None, start=0, trace=None):
+        """
+        Lazily generate `n` {target: output} dicts, each rendered from one
+        derivation like generate_targets; item `i` follows the generate_many
+        contract (a pure function of seed and i)
+        """
+        if generator_name not in self.loaded_generators:
+            raise ValueError(f"Generator '{generator_name}' not found")
+        if seed is None:
+            seed = self._seed if self._seed is not None else random.getrandbits(32)
+        targets = self._target_names(generator_name, targets)
+
+        def render(generation_context):
+            return dict(zip(targets, self._render_targets(targets, generation_context)))
+
+        initial = self._stores[generator_name].snapshot()
+        return self._generate_batch(generator_name, n, seed, render, initial, context or {}, start,
+                                    self.traces if trace is None else trace)
+
+    def _target_names(self, generator_name, targets):
+        if targets is None:
+            return list(self._compiled[generator_name].targets)
+        if isinstance(targets, str):
+            return [targets]
+        return list(targets)
+
+    def generate_many(self, generator_name, n, seed=None, entry_point=None, target=None, context=None, start=0,
+                      trace=None):
+        """
+        Lazily generate `n` outputs from a loaded generator.
+
+        Item `i` (counting from `start`) is a pure function of (seed, i): it gets its
+        own PRNG stream, `prng.for_index(seed, i)` (for the legacy LCG: as if the engine
+        had been seeded with f"{seed}:{i}"), and starts
+        from the generator's variable values at the time of the call. Items never see
+        each other's variable changes, so item `i` is the same string whatever the
+        batch size. The engine's own seed stream and variables are never modified,
+        so batches can run concurrently with each other and with sessions.
+
+        Large batches of flat grammars are sampled with NumPy when available
+        (`vectorize`, see vectorized.py); the items do not change. `trace` is a
+        TraceLog that gets one trace per item (see tracer.py).
+        """
+        if generator_name not in self.loaded_generators:
+            raise ValueError(f"Generator '{generator_name}' not found")
+        if seed is None:
+            seed = self._seed if self._seed is not None else random.getrandbits(32)
+        return self._generate_many(generator_name, n, seed, entry_point, target, context, start, trace=trace)
+
+    def _generate_many(self, generator_name, n, seed, entry_point, target, context, start, include_variables=False,
+                       trace=None):
+        """generate_many for a resolved seed; with include_variables, items are (output, variables)"""
+        run = self._entry_runner(generator_name, entry_point, target)
+        initial = self._stores[generator_name].snapshot()
+        if trace is None:
+            trace = self.traces
+        if include_variables:
+            run = self._with_variables(run)
+        elif self.vectorize and trace is None:
+            from vectorized import vectorized_batch
+
+            batch = vectorized_batch(self, generator_name, n, seed, entry_point, target, initial, context or {}, start)
+            if batch is not None:
+                return batch
+        return self._generate_batch(generator_name, n, seed, run, initial, context or {}, start, trace)
+
+    @staticmethod
+    def _with_variables(run):
+        """Runner returning (output, the item's set variables after its generation)"""
+        def run_with_variables(context):
+            output = run(context)
+            return output, {name: value for name, value in zip(context.store.names, context.values)
+                            if value is not UNSET}
+        return run_with_variables
+
+    async def agenerate(self, generator_name, options=None, timeout=None, slice_size=None):
+        """
+        `generate` for asyncio code: yields to the event loop every `slice_size`
+        rule expansions, raises TimeoutError once `timeout` seconds have passed,
+        and can be cancelled mid-expansion. The engine's variables and seed
+        stream only change when the output is complete (see aio.py).
+        """
+        from aio import DEFAULT_SLICE_SIZE, agenerate
+
+        return await agenerate(self, generator_name, options, timeout, slice_size or DEFAULT_SLICE_SIZE)
+
+    def agenerate_many(self, generator_name, n, seed=None, entry_point=None, target=None, context=None, start=0,
+                       timeout=None, slice_size=None):
+        """
+        Async iterator over the items of generate_many(...), expanded in slices
+        like agenerate; `timeout` covers the whole batch
+        """
+        from aio import DEFAULT_SLICE_SIZE, agenerate_many
 
-        generation_context = {
-            **context,
-            'generator_name': generator_name,
-            'variables': self._get_variables_for_generator(generator_name)
-        }
+        if generator_name not in self.loaded_generators:
+            raise ValueError(f"Generator '{generator_name}' not found")
+        if seed is None:
+            seed = self._seed if self._seed is not None else random.getrandbits(32)
+        return agenerate_many(self, generator_name, n, seed, entry_point, target, context, start, timeout,
+                              slice_size or DEFAULT_SLICE_SIZE)
+
+    def generate_parallel(self, generator_name, n, workers=None, seed=None, entry_point=None, target=None,
+                          context=None, start=0, chunk_size=None, trace=None):
+        """
+        Generate `n` outputs across a pool of worker processes.
+
+        Follows the generate_many contract, so the items (yielded lazily, in index
+        order) are identical to generate_many(...) for any worker count. Custom
+        modifiers must be picklable to reach the workers. Workers cannot trace:
+        raises ValueError when `trace` is given or tracing is enabled.
+        """
+        from parallel import generate_parallel
+
+        if generator_name not in self.loaded_generators:
+            raise ValueError(f"Generator '{generator_name}' not found")
+        if seed is None:
+            seed = self._seed if self._seed is not None else random.getrandbits(32)
+        return generate_parallel(self, generator_name, n, seed, workers=workers, entry_point=entry_point,
+                                 target=target, context=context, start=start, chunk_size=chunk_size, trace=trace)
+
+    def export(self, generator_name, path, n, seed=None, entry_point=None, target=None, context=None,
+               include_variables=False, chunk_size=1000, resume=False, workers=None):
+        """
+        Stream items 0..n-1 of a generate_many batch to a .jsonl or .csv file
+        (optionally .gz/.xz) in chunked writes; `resume=True` continues an
+        interrupted file from its last intact row (see exporter.py)
+        """
+        from exporter import export
+
+        return export(self, generator_name, path, n, seed=seed, entry_point=entry_point, target=target,
+                      context=context, include_variables=include_variables, chunk_size=chunk_size,
+                      resume=resume, workers=workers)
+
+    def generate_unique(self, generator_name, n, seed=None, entry_point=None, target=None, context=None,
+                        mode='bloom', error_rate=1e-6, max_attempts=None, window=1000, max_duplicate_rate=0.99):
+        """
+        Lazily generate up to `n` distinct outputs.
+
+        Draws items 0, 1, 2, ... of generate_many(...) and skips repeats, found
+        through a fixed-size Bloom filter over 64-bit hashes (`mode='bloom'`,
+        may skip a new item with probability `error_rate`) or an exact table of
+        the hashes (`mode='exact'`); the outputs themselves are never kept.
+        Stops early when at least `max_duplicate_rate` of the last `window`
+        attempts were repeats (the output space is exhausted), or after
+        `max_attempts`. The returned `UniqueSampler` is iterated once; its
+        `report()` then gives produced/attempts/duplicates and the stop reason.
+        """
+        from dedup import UniqueSampler, make_filter
+
+        if generator_name not in self.loaded_generators:
+            raise ValueError(f"Generator '{generator_name}' not found")
+        attempts = max_attempts if max_attempts is not None else 2 ** 63
+        outputs = self.generate_many(generator_name, attempts, seed=seed, entry_point=entry_point,
+                                     target=target, context=context)
+        return UniqueSampler(outputs, n, make_filter(mode, max(n, 1), error_rate), window, max_duplicate_rate)
+
+    def _generate_batch(self, generator_name, n, seed, run, initial, context, start, trace=None):
+        # Per-generator and per-seed setup is hoisted out of the loop: one PRNG and one
+        # context are reused, reset to item `index`'s stream and a fresh copy of the
+        # initial values before each item
+        index_state = index_states(self.prng, seed)
+        rng = self.prng.for_index(seed, start)
+        generation_context = GenerationContext(generator_name, self._stores[generator_name], None, initial, rng,
+                                               context, trace)
+        setstate = rng.setstate
+        for index in range(start, start + n):
+            setstate(index_state(index))
+            generation_context.values = initial[:]
+            yield run(generation_context)
+
+    def _entry_runner(self, generator_name, entry_point=None, target=None):
+        """Resolve entry point / target once and return a callable(context) -> str"""
+        generator = self.loaded_generators[generator_name]
+        compiled = self._compiled[generator_name]
 
         if target:
-            return self._generate_from_target(generator, target, generation_context)
+            return lambda context: self._generate_from_target(target, context)
 
         start_rule = entry_point or generator['entry_points']['default']
 
         # If start_rule is a string with placeholders, process it as text
+        expander_for = self._expander_for
         if isinstance(start_rule, str) and '#' in start_rule:
-            return self._process_text(start_rule, generation_context)
+            node = compiled.text(start_rule)
+            return lambda context: expander_for(context).render(self, node, context)
         else:
             # Otherwise, treat it as a rule name
-            return self._expand_rule(generator, start_rule, generation_context)
-
-    def _generate_from_target(self, generator, target, context):
-        if 'targeting' not in generator or target not in generator['targeting']:
-            raise ValueError(f"Target '{target}' not found in generator '{generator['metadata']['name']}'")
-
-        target_config = generator['targeting'][target]
-        template = target_config['template']
-
-        placeholders = re.findall(r'#([a-zA-Z_][a-zA-Z0-9_]*)#', template)
-
+            node = compiled.rule(start_rule)
+            return lambda context: expander_for(context).expand(self, node, context)
+
+    def _generate_from_target(self, target, context):
+        return self._render_targets([target], context)[0]
+
+    def _render_targets(self, targets, context):
+        """
+        Render several targeting templates from one derivation: every placeholder
+        rule is expanded once, in order of first appearance across the targets
+        """
+        compiled = self._compiled[context.generator_name]
+        compiled_targets = []
+        for target in targets:
+            compiled_target = compiled.targets.get(target)
+            if compiled_target is None:
+                raise ValueError(f"Target '{target}' not found in generator '{context.generator_name}'")
+            compiled_targets.append(compiled_target)
+
+        expander = self._expander_for(context)
         expanded_values = {}
-        for rule_name in placeholders:
-            if rule_name not in expanded_values:
-                expanded_values[rule_name] = self._expand_rule(generator, rule_name, context)
-
-        # Apply parameter mapping if available
-        parameter_map = target_config.get('parameterMap')
-        if parameter_map:
-            for rule_name, mapping in parameter_map.items():
-                if rule_name in expanded_values and expanded_values[rule_name] in mapping:
-                    expanded_values[rule_name] = mapping[expanded_values[rule_name]]
-
-        result = template
-        for rule_name, value in expanded_values.items():
-            result = result.replace(f'#{rule_name}#', str(value))
-
-        return result
-
-    def _expand_rule(self, generator, rule_name, context):
-        """Core rule expansion logic"""
-        if rule_name not in generator['grammar']:
-            return f"[MISSING RULE: {rule_name}]"
-
-        rule = generator['grammar'][rule_name]
-
-        # If rule is just a raw string, treat it as text to process
-        if isinstance(rule, str):
-            return self._process_text(rule, context)
-
-        if isinstance(rule, list):
-            # Simple array of options
-            return self._select_from_array(rule, context)
-        elif isinstance(rule, dict) and 'type' in rule:
-            # Complex rule with type
-            return self._process_complex_rule(generator, rule, context)
-        elif isinstance(rule, dict):
-            # Handle objects that wrap their options in a single-array field (e.g. {"species": [...], "actions": [...]})
-            list_fields = [v for v in rule.values() if isinstance(v, list)]
-            if list_fields:
-                # If multiple list fields exist, assume the first one contains the options
-                options = list_fields[0]
-                # Temporarily merge any top-level actions with each option so _select_from_array can fire them
-                top_actions = rule.get('actions')
-                if top_actions:
-                    # Ensure each option is a dict so we can merge actions safely
-                    merged_opts = []
-                    for opt in options:
-                        if isinstance(opt, dict):
-                            # Merge but preserve existing actions at option level
-                            existing_actions = opt.get('actions')
-                            if existing_actions:
-                                opt['actions'] = existing_actions + top_actions
-                            else:
-                                opt['actions'] = top_actions
-                            merged_opts.append(opt)
-                        else:
-                            merged_opts.append({'text': opt, 'actions': top_actions})
-                    options = merged_opts
-                return self._select_from_array(options, context)
-
-        return '[INVALID RULE FORMAT]'
-
-    def _select_from_array(self, options, context):
-        """Select from array (with optional weights)"""
-        weighted_options = []
-        total_weight = 0
-
-        for option in options:
-            if isinstance(option, str):
-                weighted_options.append({'text': option, 'weight': 1})
-                total_weight += 1
-            elif isinstance(option, dict) and 'text' in option:
-                weight = option.get('weight', 1)
-                if self._check_conditions(option.get('conditions'), context):
-                    weighted_options.append({**option, 'weight': weight})
-                    total_weight += weight
-
-        if not weighted_options:
-            return '[NO VALID OPTIONS]'
-
-        # Weighted random selection
-        rand = self._get_random_float() * total_weight
-        for option in weighted_options:
-            rand -= option['weight']
-            if rand <= 0:
-                self._execute_actions(option.get('actions'), context)
-                return self._process_text(option['text'], context)
-
-        return weighted_options[0]['text']
-
-    def _process_complex_rule(self, generator, rule, context):
-        """Process complex rules"""
-        rule_type = rule.get('type')
-
-        if rule_type == 'weighted':
-            return self._process_weighted_rule(generator, rule, context)
-        elif rule_type == 'conditional':
-            return self._process_conditional_rule(generator, rule, context)
-        elif rule_type == 'sequential':
-            return self._process_sequential_rule(generator, rule, context)
-        elif rule_type == 'markov':
-            return self._process_markov_rule(generator, rule, context)
-        else:
-            return f"[UNKNOWN RULE TYPE: {rule_type}]"
-
-    def _process_weighted_rule(self, generator, rule, context):
-        """Process weighted rules"""
-        options = rule['options']
-        weights = rule.get('weights', [1] * len(options))
-
-        total_weight = sum(weights)
-        rand = self._get_random_float() * total_weight
-
-        for i, option in enumerate(options):
-            rand -= weights[i]
-            if rand <= 0:
-                return self._process_text(option, context)
-
-        return self._process_text(options[0], context)
-
-    def _process_conditional_rule(self, generator, rule, context):
-        """Process conditional rules"""
-        for option in rule['options']:
-            if self._check_conditions(option.get('conditions'), context):
-                self._execute_actions(option.get('actions'), context)
-                return self._process_text(option['text'], context)
-
-        # Use fallback even if it is an empty string; only display error if fallback key missing
-        if 'fallback' in rule:
-            return self._process_text(rule.get('fallback', ''), context)
-        return '[NO CONDITIONS MET]'
-
-    def _process_sequential_rule(self, generator, rule, context):
-        """Process sequential rules"""
-        final_result = ''
-        for i, option in enumerate(rule['options']):
-            text_to_process = ''
-            joiner = ' '  # Default joiner
-
-            if isinstance(option, str):
-                text_to_process = option
-            elif isinstance(option, dict) and 'text' in option:
-                text_to_process = option['text']
-                if 'joiner' in option:
-                    joiner = option['joiner']
-            else:
-                text_to_process = '[INVALID SEQUENTIAL OPTION]'
-
-            final_result += self._process_text(text_to_process, context)
-
-            # Add joiner if it's not the last option
-            if i < len(rule['options']) - 1:
-                final_result += joiner
-        return final_result
-
-    def _process_markov_rule(self, generator, rule, context):
-        """Process Markov chain rules"""
-        # Simplified Markov implementation
-        return self._select_from_array(rule['options'], context)
+        for compiled_target in compiled_targets:
+            for rule_name in compiled_target.names:
+                if rule_name not in expanded_values:
+                    expanded_values[rule_name] = expander.expand(self, compiled.rule(rule_name), context)
+        return [compiled_target.render(expanded_values) for compiled_target in compiled_targets]
 
     def _process_text(self, text, context):
         """Process text with rule expansion and variable substitution"""
-        if not text:
-            return ''
-
-        # Rule and modifier regex: #ruleName.mod1.mod2#
-        rule_modifier_regex = r'#([a-zA-Z_][a-zA-Z0-9_]*)(?:\.([a-zA-Z0-9_.]+))?#'
-
-        # First expand rules and apply modifiers
-        def expand_and_modify_rule(match):
-            rule_name = match.group(1)
+        return self._expander_for(context).render(self, self._text_node(text, context), context)
+
+    def _text_node(self, text, context):
+        """Compiled node for a memory-mapped option, making room for any variable slots it adds"""
+        node = self._compiled[context.generator_name].mapped_text(text)
+        slot_count = len(context.store.names)
+        for values in (context.values, context.snapshot):
+            if len(values) < slot_count:
+                values.extend([UNSET] * (slot_count - len(values)))
+        return node
+
+    def _apply_modifiers(self, text, modifier_names):
+        """Apply a chain of modifiers (#rule.mod1.mod2#) to expanded text"""
+        chain = self._modifier_chains.get(modifier_names)
+        if chain is None:
+            chain = self._modifier_chain(modifier_names)
+        return chain(text)
+
+    def _modifier_chain(self, modifier_names):
+        """Compose a modifier chain once; unknown modifiers are reported once and skipped"""
+        steps = []
+        for mod_name in modifier_names:
+            func = self.modifiers.get(mod_name)
+            if func is None:
+                self._report_unknown_modifier(mod_name)
+                continue
+            if self._modifier_cache_size > 0 and mod_name in self._pure_modifiers:
+                func = self._cached_modifier(mod_name, func)
+            steps.append((mod_name, func))
+        steps = tuple(steps)
+
+        def chain(text):
+            for mod_name, func in steps:
+                try:
+                    text = func(text)
+                except Exception as e:
+                    print(f"Error applying modifier '{mod_name}' to text '{text}': {e}")
+                    # Keep text as is before modifier error
+            return text
+
+        self._modifier_chains[modifier_names] = chain
+        return chain
+
+    def _cached_modifier(self, mod_name, func):
+        cached = self._cached_modifiers.get(mod_name)
+        if cached is None:
+            remembered = lru_cache(maxsize=self._modifier_cache_size)(func)
+
+            def cached(text):
+                if text.__class__ is str and len(text) <= MODIFIER_CACHE_MAX_LENGTH:
+                    return remembered(text)
+                return func(text)
+            self._cached_modifiers[mod_name] = cached
+        return cached
+
+    def _report_unknown_modifier(self, mod_name):
+        if mod_name not in self._reported_modifiers:
+            self._reported_modifiers.add(mod_name)
+            print(f"Warning: Modifier '{mod_name}' not found.")
+
+    def _lookup_variable(self, ref, context):
+        """Resolve a compiled #varName# or #varName.mod# placeholder"""
+        value = context.snapshot[ref.slot] # Values at generation start first
+        if value is None or value is UNSET:
+            value = context.values[ref.slot] # Then the live values
+        if value is None or value is UNSET:
+            return ref.raw # Keep original if not found
+        if ref.modifiers:
+            return self._apply_modifiers(str(value), ref.modifiers)
+        return str(value)
+
+    def _substitute_variables(self, text, context):
+        """Variable substitution pass for text whose placeholders can only be found after expansion"""
+        slots = context.store.slots
+        slot_count = len(context.snapshot)
+        search = RULE_TOKEN_RE.search
+        out = []
+        pos = 0
+        while True:
+            match = search(text, pos)
+            if match is None:
+                break
+            start = match.start()
+            slot = slots.get(match.group(1))
+            if slot is not None and slot >= slot_count:
+                slot = None
             modifier_str = match.group(2)
-
-            generator = self.loaded_generators[context['generator_name']]
-            expanded_text = ""
-
-            if rule_name in generator['grammar']:
-                expanded_text = self._expand_rule(generator, rule_name, context)
-            else:
-                # If rule_name is not in grammar, it might be a variable.
-                # So, we don't return match.group(0) yet, let variable substitution handle it.
-                # However, if modifiers were present, they are lost, which is intended.
-                return match.group(0) # Keep original if not a rule
-
-            if modifier_str:
-                modifier_names = modifier_str.split('.')
-                for mod_name in modifier_names:
-                    if mod_name in self.modifiers:
-                        try:
-                            expanded_text = self.modifiers[mod_name](expanded_text)
-                        except Exception as e:
-                            print(f"Error applying modifier '{mod_name}' to text '{expanded_text}': {e}")
-                            # Keep text as is before modifier error
-                    else:
-                        print(f"Warning: Modifier '{mod_name}' not found.")
-            return expanded_text
-
-        processed_text = re.sub(rule_modifier_regex, expand_and_modify_rule, text)
-
-        # Then variable substitution on any remaining placeholders (e.g. #varName# without modifiers)
-        # This regex should not conflict with the rule_modifier_regex because rules are processed first.
-        variable_regex = r'#([a-zA-Z_][a-zA-Z0-9_]*)#'
-        def replace_var(match):
-            var_name = match.group(1)
-            # Check if it was already processed as a rule; if so, it won't be a simple #varName# anymore.
-            # This check is somewhat implicit: if it still matches '#varName#', it wasn't a rule.
-
-            full_var_name = f"{context['generator_name']}.{var_name}"
-            value = context['variables'].get(var_name) # Check context specific vars first
-            if value is None:
-                 value = self.variables.get(full_var_name) # Check global engine vars
-
-            return str(value) if value is not None else match.group(0) # Keep original if not found
-
-        final_text = re.sub(variable_regex, replace_var, processed_text)
-
-        return final_text
-
-    def _check_conditions(self, conditions, context):
-        """Check conditions"""
-        if not conditions:
-            return True
-
-        for key, value in conditions.items():
-            if key == '$and':
-                if not all(self._check_conditions(cond, context) for cond in value):
-                    return False
-            elif key == '$or':
-                if not any(self._check_conditions(cond, context) for cond in value):
-                    return False
-            elif key == '$not':
-                if self._check_conditions(value, context):
-                    return False
+            if modifier_str is None:
+                # Plain #name#, matched exactly as VARIABLE_TOKEN_RE would
+                value = match.group(0) if slot is None else self._lookup_variable_slot(slot, match.group(0), context)
             else:
-                var_name = key
-                condition = value
-                full_var_name = f"{context['generator_name']}.{var_name}"
-                var_value = context['variables'].get(var_name) or self.variables.get(full_var_name)
-
-                if '$lt' in condition and var_value >= condition['$lt']:
-                    return False
-                if '$gt' in condition and var_value <= condition['$gt']:
-                    return False
-                if '$eq' in condition and var_value != condition['$eq']:
-                    return False
-                if '$gte' in condition and var_value < condition['$gte']:
-                    return False
-                if '$lte' in condition and var_value > condition['$lte']:
-                    return False
-
-        return True
-
-    def _execute_actions(self, actions, context):
-        """Execute actions"""
-        if not actions:
-            return
-
-        if 'set' in actions:
-            for var_name, value in actions['set'].items():
-                full_var_name = f"{context['generator_name']}.{var_name}"
-                if isinstance(value, dict) and '$multiply' in value:
-                    current_value = context['variables'].get(var_name) or self.variables.get(full_var_name, 0)
-                    self.variables[full_var_name] = current_value * value['$multiply']
-                else:
-                    self.variables[full_var_name] = value
-
-        if 'increment' in actions:
-            for var_name, amount in actions['increment'].items():
-                full_var_name = f"{context['generator_name']}.{var_name}"
-                current_value = context['variables'].get(var_name) or self.variables.get(full_var_name, 0)
-                self.variables[full_var_name] = current_value + amount
+                value = None if slot is None else self._lookup_variable_slot(slot, None, context)
+                if value is None:
+                    # Only a set variable takes modifiers; otherwise leave the closing '#' to the next token
+                    out.append(text[pos:start + 1])
+                    pos = start + 1
+                    continue
+                value = self._apply_modifiers(value, tuple(modifier_str.split('.')))
+            out.append(text[pos:start])
+            out.append(value)
+            pos = match.end()
+        if not out:
+            return text
+        out.append(text[pos:])
+        return ''.join(out)
+
+    def _lookup_variable_slot(self, slot, raw, context):
+        value = context.snapshot[slot]
+        if value is None or value is UNSET:
+            value = context.values[slot]
+        return str(value) if value is not None and value is not UNSET else raw
 
     def _get_variables_for_generator(self, generator_name):
         """Get variables for a specific generator"""
-        result = {}
-        prefix = f"{generator_name}."
-        for full_name, value in self.variables.items():
-            if full_name.startswith(prefix):
-                var_name = full_name[len(prefix):]
-                result[var_name] = value
-        return result
+        store = self._stores.get(generator_name)
+        return store.as_dict() if store is not None else {}
 
     def list_generators(self):
         """List all loaded generators"""
@@ -471,15 +723,21 @@ class RandomizerEngine:
         generator = self.loaded_generators.get(generator_name)
         return generator['metadata'] if generator else None
 
+    def _drop_batch_plans(self, generator_name):
+        """Forget the vectorized plans (and the compiled generator they hold) of a replaced or removed generator"""
+        for key in [key for key in self._batch_plans if key[0] == generator_name]:
+            del self._batch_plans[key]
+
     def unload_generator(self, generator_name):
         """Remove a generator"""
         if generator_name in self.loaded_generators:
             del self.loaded_generators[generator_name]
+        self._compiled.pop(generator_name, None)
+        self._sources.pop(generator_name, None)
+        self._drop_batch_plans(generator_name)
 
         # Clean up variables
-        to_remove = [key for key in self.variables.keys() if key.startswith(f"{generator_name}.")]
-        for key in to_remove:
-            del self.variables[key]
+        self._stores.pop(generator_name, None)
 
         # Clean up assets
         if generator_name in self.assets:
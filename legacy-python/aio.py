@@ -0,0 +1,189 @@
+"""
+Asyncio generation for the Python RandomizerEngine.
+
+`engine.generate` runs a whole expansion in one go, so a pathological bundle
+can hold an event loop for as long as it takes. `agenerate` and
+`agenerate_many` walk the same compiled graph with `SlicedExpander`, the
+expander with its `_pause` hook stopping the walk after every `slice_size`
+steps (rule expansions, plus the parts of each finished text). The driver gives the loop a turn
+at each pause and then resumes the walk from its stack, so other tasks wait at
+most one slice, and:
+
+- `timeout` (seconds, for the whole call) raises `TimeoutError` once the
+  deadline has passed at a slice boundary
+- `asyncio` cancellation lands at the next slice boundary as usual
+
+`agenerate` follows `generate` (the engine's seed stream, variables carried
+over) but works on private copies of the PRNG and variable values and commits
+them in one synchronous step once the output is complete; a timed-out or
+cancelled call leaves the engine as it was. Calls never wait for each other:
+
+- only the variables a call changed are written back, so changes made by
+  calls (async or sync) that finished meanwhile are kept; for a variable two
+  calls both changed, the one that finishes last wins
+- the seed stream advances only if nothing else moved it during the call;
+  a call that starts while others are still running draws from a substream
+  of its own, so overlapping calls do not repeat each other's output
+
+Calls awaited one after another therefore give exactly the `generate`
+sequence. `agenerate_many` follows the `generate_many` contract (item i is a
+pure function of (seed, i)). Neither is profiled, traced or vectorized.
+"""
+
+import asyncio
+from typing import Any, AsyncIterator, Optional
+
+from expander import _PAUSED, _TEXT, Expander
+from session import GenerationContext
+from variable_store import UNSET
+
+# Expansion steps between two turns of the event loop (about 0.1 ms on typical bundles)
+DEFAULT_SLICE_SIZE = 100
+
+
+class SlicedExpander(Expander):
+    """Expander that pauses every `slice_size` steps; `resume` continues the walk"""
+    __slots__ = ('slice_size', 'left', 'stack', 'value', 'budget')
+    hooked = True
+
+    def __init__(self, max_depth: int, max_expansions: int, slice_size: int = DEFAULT_SLICE_SIZE):
+        super().__init__(max_depth, max_expansions)
+        if slice_size < 1:
+            raise ValueError('slice_size must be at least 1')
+        self.slice_size = slice_size
+        self.left = slice_size  # steps until the next pause, carried across walks
+        self.stack = self.value = self.budget = None
+
+    def _expand_rule(self, engine, context, node, name, stack, depth, parent):
+        self.left -= 1
+        return self._push(engine, node.select(engine, context), context, stack, depth)
+
+    def _finish(self, frame, stack, generator_name):
+        # A finished text costs the parts it joined, markers for cut-off rules included
+        self.left -= len(frame[3]) if frame[0] is _TEXT else 1
+
+    def _pause(self, stack, value, budget):
+        if self.left > 0:
+            return False
+        self.left = self.slice_size
+        self.stack, self.value, self.budget = stack, value, budget
+        return True
+
+    def resume(self, engine, context):
+        """Continue the paused walk; its value, or _PAUSED again"""
+        stack, value = self.stack, self.value
+        self.stack = self.value = None
+        return self._run(engine, context, stack, self.budget, value)
+
+
+def _steps(expander, engine, context, value):
+    """Resume a walk until it has a value, yielding at every pause"""
+    while value is _PAUSED:
+        yield
+        value = expander.resume(engine, context)
+    return value
+
+
+def _entry_steps(engine, expander, generator_name, entry_point, target, context):
+    """The engine's _entry_runner, one generator per output"""
+    compiled = engine._compiled[generator_name]
+    if target:
+        compiled_target = compiled.targets.get(target)
+        if compiled_target is None:
+            raise ValueError(f"Target '{target}' not found in generator '{generator_name}'")
+        values = {}
+        for rule_name in compiled_target.names:
+            if rule_name not in values:
+                values[rule_name] = yield from _steps(expander, engine, context,
+                                                      expander.expand(engine, compiled.rule(rule_name), context))
+        return compiled_target.render(values)
+    start_rule = entry_point or engine.loaded_generators[generator_name]['entry_points']['default']
+    if isinstance(start_rule, str) and '#' in start_rule:
+        value = expander.render(engine, compiled.text(start_rule), context)
+    else:
+        value = expander.expand(engine, compiled.rule(start_rule), context)
+    return (yield from _steps(expander, engine, context, value))
+
+
+def _expander(engine, slice_size):
+    limits = engine._expander
+    return SlicedExpander(limits.max_depth, limits.max_expansions, slice_size)
+
+
+def _deadline(timeout):
+    return None if timeout is None else asyncio.get_running_loop().time() + timeout
+
+
+async def _drive(steps, deadline):
+    """Run a step generator to completion, giving the loop a turn between slices"""
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            try:
+                next(steps)
+            except StopIteration as done:
+                return done.value
+            if deadline is not None and loop.time() >= deadline:
+                raise TimeoutError('generation deadline exceeded')
+            await asyncio.sleep(0)
+    finally:
+        steps.close()
+
+
+def _commit(engine, store, start, values, start_state, rng):
+    """Write a finished call's changes back to the engine (synchronous: no other task runs meanwhile)"""
+    live = store.values
+    if len(live) < len(values):
+        live.extend([UNSET] * (len(values) - len(live)))
+    for slot, value in enumerate(values):
+        if slot >= len(start) or value != start[slot]:
+            live[slot] = value
+    if start_state is not None and engine._rng is not None and engine._rng.getstate() == start_state:
+        engine._rng.setstate(rng.getstate())
+
+
+async def agenerate(engine, generator_name: str, options: Optional[dict], timeout: Optional[float],
+                    slice_size: int) -> str:
+    if options is None:
+        options = {}
+    if generator_name not in engine.loaded_generators:
+        raise ValueError(f"Generator '{generator_name}' not found")
+    deadline = _deadline(timeout)
+    store = engine._stores[generator_name]
+    start = store.values[:]
+    values = start[:]
+    rng = start_state = None
+    if engine._rng is not None:
+        if engine._async_running:
+            # Others are mid-generation from this stream position: draw from a substream instead
+            engine._async_forks += 1
+            rng = engine._rng.substream(engine._async_forks)
+        else:
+            # A private copy through the prng interface; committed back below
+            start_state = engine._rng.getstate()
+            rng = engine._rng.__class__.__new__(engine._rng.__class__)
+            rng.setstate(start_state)
+    context = GenerationContext(generator_name, store, values, start, rng, options.get('context', {}))
+    steps = _entry_steps(engine, _expander(engine, slice_size), generator_name, options.get('entry_point'),
+                         options.get('target'), context)
+    engine._async_running += 1
+    try:
+        output = await _drive(steps, deadline)
+    finally:
+        engine._async_running -= 1
+    _commit(engine, store, start, values, start_state, rng)
+    return output
+
+
+async def agenerate_many(engine, generator_name: str, n: int, seed: Any, entry_point, target, context: Optional[dict],
+                         start: int, timeout: Optional[float], slice_size: int) -> AsyncIterator[str]:
+    deadline = _deadline(timeout)
+    expander = _expander(engine, slice_size)
+    store = engine._stores[generator_name]
+    initial = store.snapshot()
+    for_index = engine.prng.for_index
+    extra = context or {}
+    for index in range(start, start + n):
+        item_context = GenerationContext(generator_name, store, initial[:], initial, for_index(seed, index), extra)
+        yield await _drive(_entry_steps(engine, expander, generator_name, entry_point, target, item_context),
+                           deadline)
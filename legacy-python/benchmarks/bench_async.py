@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Event-loop latency next to a slow generation: `generate` vs `agenerate`.
+
+A "request" task wakes every millisecond and records how late it was, while
+another task generates from a pathological bundle (a rule that references
+itself twice, cut off at `max_expansions`). With the sync call the loop is
+held for the whole generation; with `agenerate` it gets a turn every slice.
+Both produce the same output.
+
+    python legacy-python/benchmarks/bench_async.py [max_expansions] [slice_size]
+"""
+
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from RandomizerEngine import RandomizerEngine
+
+BUNDLE = {
+    'metadata': {'name': 'pathological'},
+    'grammar': {'x': ['#x# #x#', '#x# #x#', 'leaf']},
+    'entry_points': {'default': 'x'},
+}
+ROUNDS = 5
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def measure(engine, slice_size, use_async):
+    lateness = []
+    done = asyncio.Event()
+
+    async def requests():
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lateness.append(time.perf_counter() - start - 0.001)
+
+    ticker = asyncio.create_task(requests())
+    await asyncio.sleep(0.01)
+    outputs = []
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        engine.set_seed('bench')
+        if use_async:
+            outputs.append(await engine.agenerate('pathological', slice_size=slice_size))
+        else:
+            outputs.append(engine.generate('pathological'))
+        await asyncio.sleep(0)
+    elapsed = (time.perf_counter() - start) / ROUNDS
+    done.set()
+    await ticker
+    return elapsed, lateness, outputs
+
+
+async def main():
+    max_expansions = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    slice_size = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    engine = RandomizerEngine(max_expansions=max_expansions)
+    with contextlib.redirect_stdout(io.StringIO()):
+        engine.load_generator(BUNDLE)
+
+    results = {}
+    for label, use_async in (('generate', False), ('agenerate', True)):
+        results[label] = await measure(engine, slice_size, use_async)
+        elapsed, lateness, _ = results[label]
+        print(f"{label:10} {elapsed * 1e3:8.1f} ms/output   request lateness p50 {percentile(lateness, 0.5) * 1e3:6.2f} ms"
+              f"  p99 {percentile(lateness, 0.99) * 1e3:7.2f} ms  max {max(lateness) * 1e3:7.2f} ms")
+    assert results['generate'][2] == results['agenerate'][2], 'outputs differ'
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
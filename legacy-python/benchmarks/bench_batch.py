@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Per-item cost of RandomizerEngine.generate_many versus a plain generate() loop.
+
+Extra bundles are loaded alongside the measured one, as in a long-lived
+process, since the plain loop rescans every loaded variable per call. The
+variants run in alternating rounds and the median round is reported:
+
+- loop: `generate()` on the engine's own seed stream
+- same items: the naive loop that reproduces generate_many's items
+  (reseed with f"{seed}:{i}" and reset the variables before every call)
+- generate_many
+
+    python legacy-python/benchmarks/bench_batch.py [count] [rounds]
+"""
+
+import contextlib
+import glob
+import io
+import json
+import os
+import statistics
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+GENERATORS = os.path.join(HERE, '..', '..', 'generators')
+sys.path.insert(0, os.path.join(HERE, '..'))
+
+from RandomizerEngine import RandomizerEngine
+
+BUNDLES = [
+    'televangelist_generator.json',
+    'deciduous_tree_generator.json',
+]
+
+
+def load_engine(seed='bench'):
+    engine = RandomizerEngine(seed=seed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for path in sorted(glob.glob(os.path.join(GENERATORS, '*.json'))):
+            try:
+                engine.load_generator_file(path)
+            except Exception:
+                pass
+    return engine
+
+
+def time_loop(engine, name, count, start):
+    began = time.perf_counter()
+    for _ in range(count):
+        engine.generate(name)
+    return time.perf_counter() - began
+
+
+def time_same_items(engine, name, count, start):
+    store = engine._stores[name]
+    initial = store.snapshot()
+    began = time.perf_counter()
+    for index in range(start, start + count):
+        engine.set_seed(f"bench:{index}")
+        store.values[:] = initial
+        engine.generate(name)
+    elapsed = time.perf_counter() - began
+    store.values[:] = initial
+    return elapsed
+
+
+def time_batch(engine, name, count, start):
+    began = time.perf_counter()
+    for _ in engine.generate_many(name, count, seed='bench', start=start):
+        pass
+    return time.perf_counter() - began
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 9
+    engine = load_engine()
+    variants = (('loop', time_loop), ('same items', time_same_items), ('generate_many', time_batch))
+    for path in BUNDLES:
+        with open(os.path.join(GENERATORS, path), 'r') as f:
+            name = json.load(f)['metadata']['name']
+
+        times = {label: [] for label, _ in variants}
+        for round_index in range(rounds):
+            for label, measure in variants:
+                times[label].append(measure(engine, name, count, round_index * count) / count * 1e6)
+        print(f"{name:32} " + '   '.join(f"{label} {statistics.median(values):6.2f}"
+                                          for label, values in times.items()) + ' us/item')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Compiled condition/action closures and the `$eq` dispatch table vs the tuple interpreter.
+
+For each bundle, times `generate_many` and the selection of every rule with
+conditions twice: as loaded (closures, indexed conditional rules) and with
+the options switched back to the tuple interpreter below and the index
+dropped, which is how the engine evaluated them before. Times are the best of several rounds; both runs must
+produce the same outputs.
+
+    python legacy-python/benchmarks/bench_conditions.py [n]
+"""
+
+import contextlib
+import io
+import os
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from grammar_ir import AND, MULTIPLY, NOT, OR, SET, ChoiceRule, ConditionalRule
+from RandomizerEngine import RandomizerEngine
+from session import GenerationContext
+from variable_store import UNSET
+
+BUNDLES = ('generators/televangelist_generator.json', 'generators/deciduous_tree_generator.json')
+
+
+def conditional_rules(engine, name):
+    return {rule_name: rule for rule_name, rule in engine._compiled[name].rules.items()
+            if rule.__class__ is ConditionalRule or (rule.__class__ is ChoiceRule and rule.dynamic)}
+
+
+def _check_conditions(conditions, context):
+    """Reference interpreter for compiled condition clauses (what Option.check compiles)"""
+    if not conditions:
+        return True
+    for key, value in conditions:
+        if key == AND:
+            if not all(_check_conditions(cond, context) for cond in value):
+                return False
+        elif key == OR:
+            if not any(_check_conditions(cond, context) for cond in value):
+                return False
+        elif key == NOT:
+            if _check_conditions(value, context):
+                return False
+        else:
+            var_value = context.snapshot[key] or context.values[key]
+            if var_value is UNSET:
+                var_value = None
+            if '$lt' in value and var_value >= value['$lt']:
+                return False
+            if '$gt' in value and var_value <= value['$gt']:
+                return False
+            if '$eq' in value and var_value != value['$eq']:
+                return False
+            if '$gte' in value and var_value < value['$gte']:
+                return False
+            if '$lte' in value and var_value > value['$lte']:
+                return False
+    return True
+
+
+def _execute_actions(actions, context):
+    """Reference interpreter for compiled (op, slot, argument) actions (what Option.run compiles)"""
+    values, snapshot = context.values, context.snapshot
+    for op, slot, argument in actions:
+        if op == SET:
+            values[slot] = argument
+            continue
+        current_value = snapshot[slot] or values[slot]
+        if current_value is UNSET:
+            current_value = 0
+        values[slot] = current_value * argument if op == MULTIPLY else current_value + argument
+
+
+def interpret(rules):
+    """Route every option through the tuple interpreter again and drop the `$eq` tables"""
+    for rule in rules.values():
+        for option in rule.options:
+            if option.conditions is not None:
+                option.check = lambda context, c=option.conditions: _check_conditions(c, context)
+            if option.actions is not None:
+                option.run = lambda context, a=option.actions: _execute_actions(a, context)
+        if rule.__class__ is ConditionalRule:
+            rule.table = None
+
+
+def time_selects(engine, name, rules, number):
+    store = engine._stores[name]
+    initial = store.snapshot()
+    values = initial[:]
+    context = GenerationContext(name, store, values, initial, engine.get_rng())
+    timings = {}
+    for rule_name, rule in rules.items():
+        def select(rule=rule):
+            values[:] = initial  # undo the previous call's actions
+            rule.select(engine, context)
+        timings[rule_name] = min(timeit.repeat(select, number=number, repeat=5)) / number
+    return timings
+
+
+def time_batch(engine, name, n):
+    best = None
+    for _ in range(3):
+        start = time.perf_counter()
+        outputs = list(engine.generate_many(name, n, seed='bench'))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, outputs
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    for path in BUNDLES:
+        engine = RandomizerEngine(seed='bench')
+        with contextlib.redirect_stdout(io.StringIO()):
+            name = engine.load_generator_file(path)
+        rules = conditional_rules(engine, name)
+        indexed = sorted(rule_name for rule_name, rule in rules.items()
+                         if rule.__class__ is ConditionalRule and rule.table is not None)
+
+        results = {}
+        for mode in ('compiled', 'interpreted'):
+            if mode == 'interpreted':
+                interpret(rules)
+            selects = time_selects(engine, name, rules, 20000)
+            elapsed, outputs = time_batch(engine, name, n)
+            results[mode] = (elapsed, selects, outputs)
+
+        compiled, interpreted = results['compiled'], results['interpreted']
+        assert compiled[2] == interpreted[2], 'outputs differ'
+        print(f"{os.path.basename(path)}: {len(rules)} rules with conditions, "
+              f"$eq-indexed: {', '.join(indexed) or '-'}")
+        for rule_name in sorted(rules):
+            old, new = interpreted[1][rule_name] * 1e6, compiled[1][rule_name] * 1e6
+            print(f"  select {rule_name:36} {old:7.2f} -> {new:7.2f} us  ({old / new:4.2f}x)")
+        print(f"  generate_many({n})  {' ' * 28}{interpreted[0]:7.2f} -> {compiled[0]:7.2f} s   "
+              f"({interpreted[0] / compiled[0]:4.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
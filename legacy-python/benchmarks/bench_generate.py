@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for RandomizerEngine.generate on the bundled generators.
+
+Run from the repository root so `$include` paths resolve:
+
+    python legacy-python/benchmarks/bench_generate.py [iterations]
+"""
+
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from RandomizerEngine import RandomizerEngine
+
+BUNDLES = [
+    'generators/televangelist_generator.json',
+    'generators/deciduous_tree_generator.json',
+]
+
+
+def bench_bundle(path, iterations, seed='bench'):
+    """Return (load_seconds, generations_per_second) for one bundle"""
+    with open(path, 'r') as f:
+        data = json.load(f)
+
+    engine = RandomizerEngine(seed=seed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        name = engine.load_generator(data)
+        load_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        engine.generate(name)
+    elapsed = time.perf_counter() - start
+    return load_time, iterations / elapsed
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    for path in BUNDLES:
+        load_time, rate = bench_bundle(path, iterations)
+        print(f"{os.path.basename(path):40} load {load_time * 1000:8.2f} ms   {rate:10.0f} gen/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Memory and speed of a wordlist-sized rule as a JSON list vs a mapped .strings file.
+
+Builds a synthetic bundle with one rule of N plain-string options, loads it both
+ways and reports the Python heap held by the engine (tracemalloc) and the cost
+of generate(). Seeded output must be identical.
+
+    python legacy-python/benchmarks/bench_mapped_strings.py [options] [iterations]
+"""
+
+import contextlib
+import gc
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import include_loader
+from mapped_strings import externalize_string_lists
+from RandomizerEngine import RandomizerEngine
+
+
+def load(path):
+    include_loader.clear_cache()
+    gc.collect()
+    tracemalloc.start()
+    engine = RandomizerEngine(seed='bench')
+    with contextlib.redirect_stdout(io.StringIO()):
+        engine.load_generator_file(path)
+    include_loader.clear_cache()  # only count what the engine itself keeps alive
+    gc.collect()
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return engine, held
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 50000
+    bundle = {
+        'metadata': {'name': 'wordlist'},
+        'grammar': {
+            'occupation': [f"occupation number {i} of the realm" for i in range(count)],
+            'origin': 'a humble #occupation#',
+        },
+        'entry_points': {'default': 'origin'},
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        plain_path = os.path.join(tmp, 'wordlist.json')
+        with open(plain_path, 'w') as f:
+            json.dump(bundle, f)
+        mapped_path = os.path.join(tmp, 'wordlist_mapped.json')
+        externalize_string_lists(plain_path, mapped_path, min_options=1000)
+
+        results = {}
+        for label, path in (('json list', plain_path), ('mmap', mapped_path)):
+            engine, held = load(path)
+            start = time.perf_counter()
+            outputs = [engine.generate('wordlist') for _ in range(iterations)]
+            per_call = (time.perf_counter() - start) / iterations * 1e6
+            results[label] = outputs
+            print(f"{label:10} {count} options  heap {held / 2 ** 20:7.2f} MiB  {per_call:6.2f} us/generate")
+
+    assert results['json list'] == results['mmap']
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Regression benchmark: dict-wrapped option lists with top-level actions.
+
+Expands a rule shaped like evergreen's `pick_species` ({"species": [...],
+"actions": [...]}) a million times and asserts that memory stays flat, the
+per-call time stays constant and the loaded bundle is never mutated.
+
+    python legacy-python/benchmarks/bench_merged_actions.py [expansions]
+"""
+
+import contextlib
+import copy
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from RandomizerEngine import RandomizerEngine
+
+BUNDLE = {
+    "metadata": {"name": "merged-actions"},
+    "variables": {"picks": {"default": 0}},
+    "grammar": {
+        "pick_species": {
+            "species": [
+                {"text": "pine", "weight": 15, "actions": [{"note": "conifer"}]},
+                {"text": "spruce", "weight": 10},
+                "fir",
+            ],
+            "actions": [{"set_variable_from_selected_text": "tree_species_name"}],
+        },
+        "counted": {
+            "species": [{"text": "oak"}, "elm"],
+            "actions": {"increment": {"picks": 1}},
+        },
+    },
+    "entry_points": {"default": "pick_species"},
+}
+
+WINDOWS = 10
+
+
+def main():
+    expansions = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    pristine = copy.deepcopy(BUNDLE)
+    engine = RandomizerEngine(seed='bench')
+    with contextlib.redirect_stdout(io.StringIO()):
+        engine.load_generator(BUNDLE)
+
+    per_window = expansions // WINDOWS
+    timings = []
+    for _ in range(WINDOWS):
+        start = time.perf_counter()
+        for _ in range(per_window):
+            engine.generate('merged-actions')
+        timings.append((time.perf_counter() - start) / per_window * 1e6)
+
+    tracemalloc.start()
+    for _ in range(per_window):
+        engine.generate('merged-actions')
+    before, _ = tracemalloc.get_traced_memory()
+    for _ in range(per_window):
+        engine.generate('merged-actions')
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    for _ in range(1000):
+        engine.generate('merged-actions', {'entry_point': 'counted'})
+
+    print(f"{expansions} expansions, us/call per window: " + ' '.join(f"{t:.2f}" for t in timings))
+    print(f"traced memory growth over {per_window} extra calls: {after - before} bytes")
+
+    assert engine.loaded_generators['merged-actions']['grammar'] == pristine['grammar'], 'bundle was mutated'
+    assert max(timings[1:]) < timings[0] * 1.5 + 1.0, 'per-call time grows with expansions'
+    assert after - before < 64 * 1024, 'memory grows with expansions'
+    assert engine.variables['merged-actions.picks'] == 1000, 'top-level actions fired more than once'
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Scaling benchmark for RandomizerEngine.generate_parallel (1/2/4/8 workers).
+
+Also checks that every worker count produces exactly the single-process output.
+
+    python legacy-python/benchmarks/bench_parallel.py [count]
+"""
+
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from RandomizerEngine import RandomizerEngine
+
+BUNDLE = 'generators/deciduous_tree_generator.json'
+WORKER_COUNTS = (1, 2, 4, 8)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    with open(BUNDLE, 'r') as f:
+        data = json.load(f)
+    engine = RandomizerEngine(seed='bench')
+    with contextlib.redirect_stdout(io.StringIO()):
+        name = engine.load_generator(data)
+
+    reference = None
+    base_rate = None
+    print(f"{name}: {count} items, {os.cpu_count()} CPUs")
+    for workers in WORKER_COUNTS:
+        start = time.perf_counter()
+        items = list(engine.generate_parallel(name, count, workers=workers, seed='bench'))
+        rate = count / (time.perf_counter() - start)
+        if reference is None:
+            reference, base_rate = items, rate
+        identical = 'identical' if items == reference else 'MISMATCH'
+        print(f"  workers={workers}  {rate:10.0f} items/s  x{rate / base_rate:4.2f}  {identical}")
+
+
+if __name__ == '__main__':
+    main()
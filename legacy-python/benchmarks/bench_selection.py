@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Micro benchmark for weighted option selection on a long option list.
+
+Compares the 'exact' selection mode (bisect / linear scan, bit-compatible with
+older seeds) with the 'alias' mode (Walker/Vose alias tables).
+
+    python legacy-python/benchmarks/bench_selection.py [options] [iterations]
+"""
+
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from RandomizerEngine import RandomizerEngine
+
+
+def make_bundle(option_count, float_weights):
+    weight = (lambda i: 0.5 + (i % 7) * 0.25) if float_weights else (lambda i: 1 + i % 7)
+    return {
+        "metadata": {"name": "selection-bench"},
+        "grammar": {
+            "pick": [{"text": f"option {i}", "weight": weight(i)} for i in range(option_count)],
+        },
+        "entry_points": {"default": "pick"},
+    }
+
+
+def bench(selection, bundle, iterations):
+    engine = RandomizerEngine(seed='bench', selection=selection)
+    with contextlib.redirect_stdout(io.StringIO()):
+        engine.load_generator(bundle)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        engine.generate('selection-bench')
+    return iterations / (time.perf_counter() - start)
+
+
+def main():
+    option_count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 50000
+    for float_weights in (False, True):
+        bundle = make_bundle(option_count, float_weights)
+        label = 'float weights' if float_weights else 'int weights'
+        for selection in ('exact', 'alias'):
+            rate = bench(selection, bundle, iterations)
+            print(f"{option_count} options, {label:13} {selection:6} {rate:10.0f} picks/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Cold-start cost: loading every bundle in generators/ from JSON vs from a snapshot.
+
+"json" clears the process-wide include cache before each run, so it pays for
+parsing, include resolution, validation and compilation like a fresh process.
+Also checks that the snapshot generates the same seeded output.
+
+    python legacy-python/benchmarks/bench_snapshot.py [repeats]
+"""
+
+import contextlib
+import glob
+import io
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import include_loader
+from RandomizerEngine import RandomizerEngine
+
+
+def load_sources(paths):
+    include_loader.clear_cache()
+    engine = RandomizerEngine(seed='bench')
+    with contextlib.redirect_stdout(io.StringIO()):
+        for path in paths:
+            try:
+                engine.load_generator_file(path)
+            except Exception:
+                pass  # not every .json in generators/ is a bundle
+    return engine
+
+
+def sample(engine, name):
+    out = []
+    for _ in range(20):
+        try:
+            out.append(engine.generate(name))
+        except Exception as error:  # some bundles fail to generate; compare that too
+            out.append(repr(error))
+    return out
+
+
+def best_of(repeats, func):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    logging.disable(logging.WARNING)
+    paths = sorted(glob.glob('generators/*.json'))
+
+    json_time, engine = best_of(repeats, lambda: load_sources(paths))
+    names = engine.list_generators()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot_path = os.path.join(tmp, 'bundles.snap')
+        engine.save_snapshot(snapshot_path)
+        size = os.path.getsize(snapshot_path)
+
+        def restore(validate):
+            restored = RandomizerEngine(seed='bench')
+            restored.load_snapshot(snapshot_path, validate=validate)
+            return restored
+
+        snap_time, restored = best_of(repeats, lambda: restore(True))
+        unchecked_time, _ = best_of(repeats, lambda: restore(False))
+
+    fresh = load_sources(paths)
+    for name in names:
+        assert sample(restored, name) == sample(fresh, name), name
+
+    print(f"{len(names)} generators, snapshot {size / 1024:.0f} KiB")
+    print(f"json + includes + compile   {json_time * 1000:8.2f} ms")
+    print(f"snapshot (validated)        {snap_time * 1000:8.2f} ms  ({json_time / snap_time:5.1f}x)")
+    print(f"snapshot (validate=False)   {unchecked_time * 1000:8.2f} ms  ({json_time / unchecked_time:5.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Reproducible benchmark suite for the engine's hot paths, with JSON results
+and baseline comparison.
+
+Groups (all seeded with 'bench'):
+
+- micro/*: text processing, weighted selection (exact and alias), weighted
+  rules, condition evaluation, modifier chains, target rendering and a full
+  generate, on a small synthetic bundle
+- generate/<bundle>: `generate` on every bundle in generators/
+- load/<bundle>: load_generator_file with a cold include cache (file read,
+  include resolution, validation, compilation)
+- memory/<bundle>: tracemalloc peak while loading a bundle and generating 100
+  outputs
+
+Timings are seconds per call from `repeat` rounds, each sized to run about
+`--time` seconds (garbage collection off, as in timeit); `best_us` is the
+fastest round. `--baseline old.json` compares best times and memory peaks and
+exits with 1 when anything is slower or larger by more than `--threshold`.
+
+Run from the repository root:
+
+    python legacy-python/benchmarks/bench_suite.py [-o results.json] [--baseline old.json] [--filter micro]
+"""
+
+import argparse
+import contextlib
+import gc
+import glob
+import io
+import json
+import os
+import platform
+import sys
+import time
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import include_loader
+from RandomizerEngine import RandomizerEngine
+from session import GenerationContext
+
+SEED = 'bench'
+
+MICRO_BUNDLE = {
+    'metadata': {'name': 'bench-micro'},
+    'variables': {'score': {'default': 7}, 'mood': {'default': 'calm'}},
+    'grammar': {
+        'animal': [{'text': 'owl', 'weight': 3}, {'text': 'fox', 'weight': 2}, 'eel', 'yak', 'elk', 'ape'],
+        'color': {'type': 'weighted', 'options': ['red', 'green', 'blue', 'amber'], 'weights': [5, 3, 1, 1]},
+        'gate': {
+            'type': 'conditional',
+            'options': [
+                {'text': 'high', 'conditions': {'$and': [{'score': {'$gt': 5}}, {'score': {'$lt': 10}}]}},
+                {'text': 'odd', 'conditions': {'$or': [{'score': {'$eq': 1}}, {'mood': {'$eq': 'wild'}}]}}
+            ],
+            'fallback': 'low'
+        },
+        'origin': '#color.capitalize# #animal.a_an# feels #mood# (#gate#)'
+    },
+    'entry_points': {'default': 'origin'},
+    'targeting': {'short': {'template': '#color# #animal#', 'parameterMap': {'color': {'red': 'crimson'}}}}
+}
+MICRO_TEXT = 'The #animal# is #color# and #gate#, mood #mood#'
+
+
+def _quiet_load(engine, path=None, data=None):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return engine.load_generator_file(path) if path else engine.load_generator(data)
+
+
+def _context(engine, name):
+    store = engine._stores[name]
+    values = store.snapshot()
+    return GenerationContext(name, store, values, values[:], engine.get_rng())
+
+
+def _reset(engine, name, initial):
+    """Same seed and variable values at the start of every round"""
+    def reset():
+        engine.set_seed(SEED)
+        engine._stores[name].restore(initial)
+    return reset
+
+
+def micro_benchmarks():
+    """(name, callable, reset) for the synthetic bundle"""
+    benchmarks = []
+    for selection in ('exact', 'alias'):
+        engine = RandomizerEngine(seed=SEED, selection=selection)
+        name = _quiet_load(engine, data=MICRO_BUNDLE)
+        compiled = engine._compiled[name]
+        reset = _reset(engine, name, engine._stores[name].snapshot())
+        context = _context(engine, name)
+        animal, color = compiled.rule('animal'), compiled.rule('color')
+        benchmarks.append((f'micro/select_choice_{selection}', lambda r=animal, e=engine, c=context: r.select(e, c),
+                           reset))
+        benchmarks.append((f'micro/select_weighted_{selection}', lambda r=color, e=engine, c=context: r.select(e, c),
+                           reset))
+        if selection == 'alias':
+            continue
+        check = compiled.rule('gate').options[0].check
+        benchmarks += [
+            ('micro/process_text', lambda e=engine, c=context: e._process_text(MICRO_TEXT, c), reset),
+            ('micro/check_conditions', lambda c=context: check(c), reset),
+            ('micro/apply_modifiers', lambda e=engine: e._apply_modifiers('apple pie', ('a_an', 'capitalize')),
+             reset),
+            ('micro/render_target', lambda e=engine: e.generate(name, {'target': 'short'}), reset),
+            ('micro/generate', lambda e=engine: e.generate(name), reset),
+        ]
+    return benchmarks
+
+
+def bundle_benchmarks(paths):
+    """(name, callable, reset) generating from each bundle; bundles that fail are reported, not timed"""
+    benchmarks, errors = [], {}
+    for path in paths:
+        key = f"generate/{os.path.splitext(os.path.basename(path))[0]}"
+        engine = RandomizerEngine(seed=SEED)
+        try:
+            name = _quiet_load(engine, path=path)
+            with contextlib.redirect_stdout(io.StringIO()):
+                engine.generate(name)
+        except Exception as error:
+            errors[key] = f"{type(error).__name__}: {error}"
+            continue
+        reset = _reset(engine, name, engine._stores[name].snapshot())
+        benchmarks.append((key, lambda e=engine, n=name: e.generate(n), reset))
+    return benchmarks, errors
+
+
+def load_benchmarks(paths):
+    benchmarks = []
+    for path in paths:
+        def load(path=path):
+            include_loader.clear_cache()
+            _quiet_load(RandomizerEngine(), path=path)
+        try:
+            load()
+        except Exception:
+            continue  # reported by bundle_benchmarks
+        benchmarks.append((f"load/{os.path.splitext(os.path.basename(path))[0]}", load, None))
+    return benchmarks
+
+
+def peak_memory(path, generations=100):
+    """tracemalloc peak (bytes) while loading a bundle and generating from it"""
+    include_loader.clear_cache()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        engine = RandomizerEngine(seed=SEED)
+        name = _quiet_load(engine, path=path)
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _ in range(generations):
+                engine.generate(name)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+        include_loader.clear_cache()
+
+
+def measure(fn, reset, repeat, seconds):
+    """Seconds per call: (best, median) over `repeat` rounds of about `seconds` each"""
+    timer = timeit.Timer(fn, setup=reset or 'pass')
+    number = 1
+    while True:
+        if timer.timeit(number) >= seconds / 5 or number >= 1 << 24:
+            break
+        number *= 2
+    number = max(1, int(number * seconds / max(timer.timeit(number), 1e-9)))
+    rounds = sorted(t / number for t in timer.repeat(repeat, number))
+    return rounds[0], rounds[len(rounds) // 2], number
+
+
+def run(paths, name_filter=None, repeat=5, seconds=0.2, log=sys.stderr):
+    results = {}
+    bundles, errors = bundle_benchmarks(paths)
+    for key, fn, reset in micro_benchmarks() + bundles + load_benchmarks(paths):
+        if name_filter and name_filter not in key:
+            continue
+        with contextlib.redirect_stdout(io.StringIO()):
+            best, median, number = measure(fn, reset, repeat, seconds)
+        results[key] = {'best_us': round(best * 1e6, 3), 'median_us': round(median * 1e6, 3), 'number': number}
+        print(f"{key:50} {best * 1e6:12.2f} us  (median {median * 1e6:.2f})", file=log)
+    for path in paths:
+        key = f"memory/{os.path.splitext(os.path.basename(path))[0]}"
+        if (name_filter and name_filter not in key) or f"generate/{key[7:]}" in errors:
+            continue
+        peak = peak_memory(path)
+        results[key] = {'peak_kib': round(peak / 1024, 1)}
+        print(f"{key:50} {peak / 1024:12.1f} KiB peak", file=log)
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'machine': platform.machine(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'repeat': repeat,
+            'seed': SEED,
+        },
+        'results': results,
+        'errors': errors,
+    }
+
+
+def compare(current, baseline, threshold):
+    """Lines describing each shared benchmark, and the names that regressed"""
+    lines, regressions = [], []
+    for key, result in sorted(current['results'].items()):
+        old = baseline.get('results', {}).get(key)
+        if old is None:
+            continue
+        metric = 'best_us' if 'best_us' in result else 'peak_kib'
+        if not old.get(metric):
+            continue
+        ratio = result[metric] / old[metric]
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = 'REGRESSION'
+            regressions.append(key)
+        elif ratio < 1 - threshold:
+            flag = 'improved'
+        unit = 'us' if metric == 'best_us' else 'KiB'
+        lines.append(f"{key:50} {old[metric]:12.2f} -> {result[metric]:12.2f} {unit:3}  "
+                     f"{(ratio - 1) * 100:+6.1f}%  {flag}")
+    return lines, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='bench_suite', description='Benchmark the Python engine hot paths')
+    parser.add_argument('bundles', nargs='*', help='bundle .json files (default: generators/*.json)')
+    parser.add_argument('-o', '--output', help='write results as JSON to this file')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='relative slowdown or growth counted as a regression (default 0.10)')
+    parser.add_argument('--filter', help='only run benchmarks whose name contains this text')
+    parser.add_argument('--repeat', type=int, default=5, help='timed rounds per benchmark')
+    parser.add_argument('--time', type=float, default=0.2, help='seconds per round')
+    args = parser.parse_args(argv)
+
+    paths = args.bundles or sorted(glob.glob(os.path.join('generators', '*.json')))
+    current = run(paths, args.filter, args.repeat, args.time)
+    for key, error in sorted(current['errors'].items()):
+        print(f"{key:50} skipped: {error}", file=sys.stderr)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2)
+            f.write('\n')
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    lines, regressions = compare(current, baseline, args.threshold)
+    print('\n'.join(lines))
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
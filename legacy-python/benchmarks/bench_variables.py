@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Cost of generate() as more bundles are loaded into one long-lived engine.
+
+Loads the televangelist bundle under 1, 10 and 50 names; with per-generator
+variable stores the per-call cost should not depend on the number loaded.
+
+    python legacy-python/benchmarks/bench_variables.py [iterations]
+"""
+
+import contextlib
+import copy
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from RandomizerEngine import RandomizerEngine
+
+BUNDLE = 'generators/televangelist_generator.json'
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    with open(BUNDLE, 'r') as f:
+        data = json.load(f)
+
+    for loaded in (1, 10, 50):
+        engine = RandomizerEngine(seed='bench')
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i in range(loaded):
+                engine.load_generator(copy.deepcopy(data), f"tv-{i}")
+        start = time.perf_counter()
+        for _ in range(iterations):
+            engine.generate('tv-0')
+        per_call = (time.perf_counter() - start) / iterations * 1e6
+        print(f"{loaded:3} bundles loaded ({len(engine.variables):5} variables)  {per_call:7.2f} us/generate")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+NumPy batch sampler (vectorized.py) vs the scalar generate_many loop.
+
+Times `n` outputs (default 1M) of each flat bundle with `vectorize=True` and
+`vectorize=False`, for both PRNGs, and checks that the first and last
+items of the two batches agree. The techPanel bundle's option files hold
+UI entries ({"label", "value"}); its rules are rebuilt from their values,
+and its `variables` (not in the engine's format) are dropped.
+
+    python legacy-python/benchmarks/bench_vectorized.py [n]
+"""
+
+import collections
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from RandomizerEngine import RandomizerEngine
+from vectorized import np
+
+CHECKED = 20000  # items compared at each end of the batch
+
+
+def techpanel_bundle():
+    path = 'generators/anachronisticTechPanel.json'
+    with open(path) as f:
+        bundle = json.load(f)
+    bundle['variables'] = {}
+    for rule_name, options in bundle['grammar'].items():
+        include = next((o['$include'] for o in options if isinstance(o, dict) and '$include' in o), None)
+        if include is None:
+            continue
+        include_path = os.path.join('generators', include.lstrip('/'))
+        with open(include_path) as f:
+            entries = json.load(f)
+        bundle['grammar'][rule_name] = [e['value'] if isinstance(e, dict) else e for e in entries]
+    return bundle
+
+
+def bundles():
+    yield 'techPanel', techpanel_bundle()
+    with open('generators/satanic_panic_generator.json') as f:
+        yield 'satanic_panic', json.load(f)
+
+
+def load(bundle, prng, vectorize):
+    engine = RandomizerEngine(prng=prng, vectorize=vectorize)
+    with contextlib.redirect_stdout(io.StringIO()):
+        name = engine.load_generator(bundle)
+    return engine, name
+
+
+def time_batch(engine, name, n):
+    start = time.perf_counter()
+    collections.deque(engine.generate_many(name, n, seed='bench'), maxlen=0)
+    return time.perf_counter() - start
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    if np is None:
+        sys.exit('numpy is not installed; every batch takes the scalar path')
+
+    for label, bundle in bundles():
+        for prng in ('lcg', 'splitmix64'):
+            fast, name = load(bundle, prng, True)
+            slow, _ = load(bundle, prng, False)
+            for start in (0, max(n - CHECKED, 0)):
+                count = min(CHECKED, n)
+                assert (list(fast.generate_many(name, count, seed='bench', start=start))
+                        == list(slow.generate_many(name, count, seed='bench', start=start))), 'outputs differ'
+            assert fast._batch_plans[(name, None, None)][1] is not None, 'not vectorized'
+            scalar = time_batch(slow, name, n)
+            vector = time_batch(fast, name, n)
+            print(f"{label:14} {prng:11} {n} outputs  scalar {scalar:7.2f} s  numpy {vector:6.2f} s  "
+                  f"({scalar / vector:5.1f}x, {n / vector / 1e6:4.2f}M/s)")
+
+
+if __name__ == '__main__':
+    main()
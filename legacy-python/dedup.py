@@ -0,0 +1,174 @@
+"""
+Memory-bounded duplicate filtering for `RandomizerEngine.generate_unique`.
+
+Outputs are reduced to 64-bit BLAKE2b hashes (stable across processes, so a
+seeded run rejects the same items every time) and checked against one of:
+
+- `BloomFilter`: fixed size chosen from the expected count and a false
+  positive rate (about 3.6 bytes per item at 1e-6), whatever the number of
+  attempts. A false positive only skips a new output; it never lets a
+  duplicate through.
+- `HashSet64`: exact membership over the hashes in an open-addressing
+  `array('Q')` (16-32 bytes per item, versus ~100+ for a `set` of strings).
+
+`UniqueSampler` draws from a stream of outputs until it has `n` distinct
+ones, and stops early when nearly every recent attempt is a duplicate,
+which means the reachable output space is exhausted.
+"""
+
+import math
+from array import array
+from collections import deque
+from hashlib import blake2b
+from typing import Any, Dict, Iterator, Optional
+
+_LN2 = math.log(2)
+
+
+def hash64(text: str) -> int:
+    return int.from_bytes(blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class BloomFilter:
+    """Bloom filter over 64-bit hashes sized for `capacity` items at `error_rate`"""
+    __slots__ = ('bit_count', 'hash_count', '_bits')
+
+    def __init__(self, capacity: int, error_rate: float = 1e-6):
+        if capacity < 1 or not 0 < error_rate < 1:
+            raise ValueError('capacity must be at least 1 and error_rate between 0 and 1')
+        self.bit_count = max(64, math.ceil(-capacity * math.log(error_rate) / (_LN2 * _LN2)))
+        self.hash_count = max(1, round(self.bit_count / capacity * _LN2))
+        self._bits = bytearray((self.bit_count + 7) // 8)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._bits)
+
+    def add(self, h: int) -> bool:
+        """Insert a hash; False if it was (probably) present already"""
+        bits = self._bits
+        m = self.bit_count
+        # Kirsch-Mitzenmacher double hashing from the two halves of the hash
+        start = h % m
+        step = ((h >> 32) | 1) % m or 1
+        new = False
+        for position in range(start, start + self.hash_count * step, step):
+            position %= m
+            mask = 1 << (position & 7)
+            if not bits[position >> 3] & mask:
+                bits[position >> 3] |= mask
+                new = True
+        return new
+
+
+class HashSet64:
+    """Exact set of 64-bit hashes in an open-addressing table (linear probing)"""
+    __slots__ = ('_table', '_mask', '_count')
+
+    def __init__(self, capacity: int = 1024):
+        size = 1 << max(4, (2 * capacity - 1).bit_length())
+        self._table = array('Q', bytes(8 * size))
+        self._mask = size - 1
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._table) * 8
+
+    def add(self, h: int) -> bool:
+        """Insert a hash; False if it was present already"""
+        h = h or 1  # 0 marks an empty slot
+        table, mask = self._table, self._mask
+        i = h & mask
+        while True:
+            current = table[i]
+            if current == 0:
+                table[i] = h
+                self._count += 1
+                if self._count * 2 > len(table):
+                    self._grow()
+                return True
+            if current == h:
+                return False
+            i = (i + 1) & mask
+
+    def _grow(self):
+        old = self._table
+        self._table = array('Q', bytes(16 * len(old)))
+        self._mask = len(self._table) - 1
+        self._count = 0
+        for h in old:
+            if h:
+                self.add(h)
+
+
+def make_filter(mode: str, capacity: int, error_rate: float = 1e-6):
+    if mode == 'bloom':
+        return BloomFilter(capacity, error_rate)
+    if mode == 'exact':
+        return HashSet64(capacity)
+    raise ValueError(f"Unknown dedup mode '{mode}' (expected 'bloom' or 'exact')")
+
+
+class UniqueSampler:
+    """
+    Iterator over the distinct items of `outputs`, at most `n`.
+
+    Stops early (`exhausted`) once `window` attempts have been made and at
+    least `max_duplicate_rate` of the last `window` were duplicates. After
+    iteration the counters and `stop_reason` ('complete', 'exhausted' or
+    'attempts', when `outputs` ran out) describe the run.
+    """
+
+    def __init__(self, outputs: Iterator[str], n: int, seen, window: int = 1000, max_duplicate_rate: float = 0.99):
+        if window < 1 or not 0 < max_duplicate_rate <= 1:
+            raise ValueError('window must be at least 1 and max_duplicate_rate in (0, 1]')
+        self.requested = n
+        self.produced = 0
+        self.attempts = 0
+        self.duplicates = 0
+        self.stop_reason: Optional[str] = None
+        self.filter = seen
+        self._outputs = outputs
+        self._window = window
+        self._limit = math.ceil(max_duplicate_rate * window)
+
+    @property
+    def exhausted(self) -> bool:
+        return self.stop_reason == 'exhausted'
+
+    def __iter__(self):
+        add = self.filter.add
+        recent = deque(maxlen=self._window)  # 1 per duplicate among the last `window` attempts
+        recent_duplicates = 0
+        for output in self._outputs if self.requested > 0 else ():
+            self.attempts += 1
+            duplicate = not add(hash64(output))
+            if len(recent) == self._window:
+                recent_duplicates -= recent[0]
+            recent.append(duplicate)
+            if duplicate:
+                self.duplicates += 1
+                recent_duplicates += 1
+                if len(recent) == self._window and recent_duplicates >= self._limit:
+                    self.stop_reason = 'exhausted'
+                    return
+                continue
+            self.produced += 1
+            yield output
+            if self.produced >= self.requested:
+                break
+        self.stop_reason = 'complete' if self.produced >= self.requested else 'attempts'
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            'requested': self.requested,
+            'produced': self.produced,
+            'attempts': self.attempts,
+            'duplicates': self.duplicates,
+            'stop_reason': self.stop_reason,
+            'filter_bytes': self.filter.nbytes,
+        }
@@ -0,0 +1,231 @@
+"""
+Iterative expansion of compiled rules for the Python RandomizerEngine.
+
+`node.expand()` / `text.render()` in grammar_ir.py recurse through Python
+frames once per grammar level, so deep or self-recursive grammars raise
+`RecursionError`. `Expander` walks the same compiled graph with an explicit
+work stack and per-text fragment lists that are joined once. It calls each
+rule's `select()` (which consumes the PRNG and runs actions exactly like
+`expand()`) and renders the chosen text itself, so seeded output is
+identical.
+
+Two limits keep runaway grammars from hanging or crashing a process:
+
+- `max_depth`: nested rule expansions; deeper references render as
+  `[MAX DEPTH EXCEEDED: rule]`
+- `max_expansions`: rule expansions per generation; after that every further
+  reference renders as `[EXPANSION LIMIT REACHED]`
+
+Neither marker consumes randomness.
+
+`_run` is the only walker. Subclasses that set `hooked` get three hooks
+instead of the inlined fast path: `_expand_rule` for every placeholder
+expansion, `_finish` for every completed frame and `_pause`, which can stop
+the walk at a frame boundary (the profiler and tracer, and aio.py's sliced
+expander). Frames may carry extra fields after the ones listed below. A paused
+walk's state is all on its stack, so `_run` resumes it from there.
+"""
+
+from grammar_ir import ErrorText, MappedText, RuleRef, SequentialRule, TextNode, VarRef
+
+DEFAULT_MAX_DEPTH = 1000
+DEFAULT_MAX_EXPANSIONS = 100000
+
+EXPANSION_LIMIT_MARKER = '[EXPANSION LIMIT REACHED]'
+
+# Returned by _push when it pushed a frame instead of producing a value
+_PUSHED = object()
+
+# Returned by _run when `_pause` stopped the walk
+_PAUSED = object()
+
+# Work stack frame kinds
+_TEXT = 0  # [_TEXT, node, next part index, fragments, dirty, depth]
+_SEQ = 1   # [_SEQ, rule, next text index, result, depth]
+
+
+class Expander:
+    """Explicit-stack walker with depth and expansion budgets (shared, stateless)"""
+    __slots__ = ('max_depth', 'max_expansions')
+
+    # Subclasses that observe or pause the walk set this; see the module docstring
+    hooked = False
+
+    def __init__(self, max_depth: int = DEFAULT_MAX_DEPTH, max_expansions: int = DEFAULT_MAX_EXPANSIONS):
+        if max_depth < 1 or max_expansions < 1:
+            raise ValueError('max_depth and max_expansions must be at least 1')
+        self.max_depth = max_depth
+        self.max_expansions = max_expansions
+
+    def expand(self, engine, rule, context) -> str:
+        """Expand a compiled rule node"""
+        chosen = rule.select(engine, context)
+        if chosen.__class__ is TextNode:
+            # Most rules pick a text; skip the generic dispatch for them
+            if chosen.static is not None:
+                return chosen.static
+            if not chosen.has_refs:
+                return chosen.render(engine, context)
+            return self._run(engine, context, [[_TEXT, chosen, 0, [], chosen.has_hash, 1]], self.max_expansions - 1)
+        stack = []
+        value = self._push(engine, chosen, context, stack, 1)
+        if value is not _PUSHED:
+            return value
+        return self._run(engine, context, stack, self.max_expansions - 1)
+
+    def render(self, engine, text, context) -> str:
+        """Render a compiled text node (e.g. an entry-point template)"""
+        stack = []
+        value = self._push(engine, text, context, stack, 0)
+        if value is not _PUSHED:
+            return value
+        return self._run(engine, context, stack, self.max_expansions)
+
+    @staticmethod
+    def _push(engine, chosen, context, stack, depth):
+        """Return the value of a selected text, or push a frame for it and return _PUSHED"""
+        cls = chosen.__class__
+        if cls is TextNode:
+            if chosen.static is not None:
+                return chosen.static
+            if not chosen.has_refs:
+                return chosen.render(engine, context)
+            stack.append([_TEXT, chosen, 0, [], chosen.has_hash, depth])
+            return _PUSHED
+        if cls is MappedText:
+            if '#' not in chosen.value:
+                return chosen.value
+            return Expander._push(engine, engine._text_node(chosen.value, context), context, stack, depth)
+        if cls is SequentialRule:
+            if not chosen.texts:
+                return ''
+            stack.append([_SEQ, chosen, 0, '', depth])
+            return _PUSHED
+        if cls is ErrorText:
+            chosen.render(engine, context)  # raises the original error
+        return chosen  # plain value: markers, literals, raw fallback text
+
+    # -- hooks (only called when `hooked`) --------------------------------
+
+    def _expand_rule(self, engine, context, node, name, stack, depth, parent):
+        """Pick an option of `node` (referenced as `name` from `parent`); its value, or _PUSHED"""
+        return self._push(engine, node.select(engine, context), context, stack, depth)
+
+    def _finish(self, frame, stack, generator_name):
+        """Called with each frame popped from the stack"""
+
+    def _pause(self, stack, value, budget) -> bool:
+        """True to stop the walk here; resume with _run(engine, context, stack, budget, value)"""
+        return False
+
+    def _run(self, engine, context, stack, budget, value=None):
+        push = self._push
+        max_depth = self.max_depth
+        rule_ref, text_node = RuleRef, TextNode
+        hooked = self.hooked
+        while True:
+            if hooked and self._pause(stack, value, budget):
+                return _PAUSED
+            frame = stack[-1]
+
+            if frame[0] is _TEXT:
+                node, index, out, dirty, depth = frame[1], frame[2], frame[3], frame[4], frame[5]
+                if value is not None:
+                    # Result of the rule referenced by parts[index - 1]
+                    modifiers = node.parts[index - 1].modifiers
+                    if modifiers:
+                        value = engine._apply_modifiers(value, modifiers)
+                    if not dirty and '#' in value:
+                        dirty = True
+                    out.append(value)
+                    value = None
+
+                parts = node.parts
+                count = len(parts)
+                while index < count:
+                    part = parts[index]
+                    index += 1
+                    cls = part.__class__
+                    if cls is not rule_ref:
+                        out.append(part)  # literal str, or VarRef looked up at the end
+                        continue
+                    if depth >= max_depth:
+                        result = f"[MAX DEPTH EXCEEDED: {part.name}]"
+                    elif budget <= 0:
+                        result = EXPANSION_LIMIT_MARKER
+                    else:
+                        budget -= 1
+                        if hooked:
+                            result = self._expand_rule(engine, context, part.node, part.name, stack, depth + 1,
+                                                       frame)
+                            if result is _PUSHED:
+                                break
+                        else:
+                            result = part.node.select(engine, context)
+                            # Inline the common _push cases
+                            cls = result.__class__
+                            if cls is text_node:
+                                if result.static is not None:
+                                    result = result.static
+                                elif not result.has_refs:
+                                    result = result.render(engine, context)
+                                else:
+                                    stack.append([_TEXT, result, 0, [], result.has_hash, depth + 1])
+                                    break  # resume at `index` with the child's value
+                            elif cls is not str:
+                                result = push(engine, result, context, stack, depth + 1)
+                                if result is _PUSHED:
+                                    break
+                    if part.modifiers:
+                        result = engine._apply_modifiers(result, part.modifiers)
+                    if not dirty and '#' in result:
+                        dirty = True
+                    out.append(result)
+                else:
+                    # Same finishing pass as TextNode.render
+                    stack.pop()
+                    if dirty:
+                        joined = ''.join(p.raw if p.__class__ is VarRef else p for p in out)
+                        value = engine._substitute_variables(joined, context)
+                    else:
+                        if node.var_count:
+                            for i, part in enumerate(out):
+                                if part.__class__ is VarRef:
+                                    out[i] = engine._lookup_variable(part, context)
+                        value = ''.join(out)
+                    if hooked:
+                        self._finish(frame, stack, context.generator_name)
+                    if not stack:
+                        return value
+                    continue
+                frame[2] = index
+                frame[4] = dirty
+                continue
+
+            # _SEQ: render each text in order, joined by the per-option joiners
+            rule, index = frame[1], frame[2]
+            texts = rule.texts
+            last = len(texts) - 1
+            if value is not None:
+                frame[3] += value
+                if index - 1 < last:
+                    frame[3] += rule.joiners[index - 1]
+                value = None
+            while index <= last:
+                text = texts[index]
+                index += 1
+                result = push(engine, text, context, stack, frame[4])
+                if result is _PUSHED:
+                    break
+                frame[3] += result
+                if index - 1 < last:
+                    frame[3] += rule.joiners[index - 1]
+            else:
+                stack.pop()
+                value = frame[3]
+                if hooked:
+                    self._finish(frame, stack, context.generator_name)
+                if not stack:
+                    return value
+                continue
+            frame[2] = index
@@ -0,0 +1,279 @@
+"""
+Streaming export of generated outputs to JSONL or CSV files.
+
+`export()` pulls items from `generate_many` (or `generate_parallel` with
+`workers`) and writes one row per item:
+
+    index, seed, entry_point, target, output[, variables]
+
+`variables` (with `include_variables`) are the item's values after its
+generation, from the same batch path, so `workers` applies to them too. In
+CSV, a string seed made of digits is written JSON-quoted ("007" vs 7) so a
+resumed file keeps the seed's type.
+
+Rows are joined into chunks of `chunk_size` and written and flushed with one
+call per chunk, so memory stays constant for any `n`, and an interrupted plain
+or gzip file loses at most the chunk in flight. With `workers`, the pool keeps
+only a few chunks per worker ahead of the writer (see parallel.py), so a slow
+writer such as `.xz` holds the workers back instead of buffering their output. The format follows the file
+name: `.jsonl`/`.ndjson` or `.csv`, optionally with `.gz` (gzip) or
+`.xz`/`.lzma`.
+
+Because item `i` is a pure function of (seed, i), `resume=True` scans an
+existing file, drops a torn last row and appends from the next index. The
+finished file matches an uninterrupted run. Plain files are truncated in place;
+compressed files have their intact prefix re-compressed.
+
+    python legacy-python/exporter.py bundle.json out.jsonl.gz -n 1000000 --seed 42 [--resume]
+"""
+
+import csv
+import gzip
+import io
+import json
+import lzma
+import os
+import random
+from typing import Any, Dict, List, Optional, Tuple
+
+from prng import parse_seed
+
+FIELDS = ('index', 'seed', 'entry_point', 'target', 'output')
+
+_COMPRESSION = {'.gz': 'gzip', '.xz': 'lzma', '.lzma': 'lzma'}
+_FORMATS = {'.jsonl': 'jsonl', '.ndjson': 'jsonl', '.csv': 'csv'}
+_BLOCK = 1 << 20
+
+
+def export_format(path: str) -> Tuple[str, Optional[str]]:
+    """(format, compression) from a file name such as prompts.csv.gz"""
+    stem, ext = os.path.splitext(path)
+    compression = _COMPRESSION.get(ext.lower())
+    if compression:
+        stem, ext = os.path.splitext(stem)
+    fmt = _FORMATS.get(ext.lower())
+    if fmt is None:
+        raise ValueError(f"Cannot tell the export format of '{path}' (use .jsonl or .csv, optionally .gz/.xz)")
+    return fmt, compression
+
+
+def _open(path, compression, mode):
+    if compression == 'gzip':
+        return gzip.open(path, mode)
+    if compression == 'lzma':
+        return lzma.open(path, mode)
+    return open(path, mode)
+
+
+def _read_lines(path, compression, state):
+    """Decompressed lines of a file that may end mid-row or mid-stream"""
+    with _open(path, compression, 'rb') as f:
+        try:
+            for line in f:
+                state['end'] += len(line)
+                state['complete'] = line.endswith(b'\n')
+                yield line
+        except (EOFError, lzma.LZMAError, OSError):
+            state['torn'] = True
+
+
+def _scan(path, fmt, compression):
+    """
+    (CSV header, last intact row, decompressed length through that row, whether
+    anything follows it)
+    """
+    state = {'end': 0, 'complete': True, 'torn': False}
+    lines = _read_lines(path, compression, state)
+    header = last = None
+    offset = 0
+    try:
+        if fmt == 'jsonl':
+            for line in lines:
+                if not state['complete']:
+                    break
+                try:
+                    last = json.loads(line)
+                except ValueError:
+                    break
+                offset = state['end']
+        else:
+            try:
+                for row in csv.reader(line.decode('utf-8', 'replace') for line in lines):
+                    if not state['complete']:
+                        break
+                    if header is None:
+                        header = row
+                    elif len(row) != len(header):
+                        break
+                    else:
+                        last = dict(zip(header, row))
+                    offset = state['end']
+            except csv.Error:
+                pass
+    finally:
+        lines.close()
+    return header, last, offset, state['torn'] or offset != state['end']
+
+
+def _truncate(path, compression, offset):
+    """Cut the file back to `offset` decompressed bytes"""
+    if compression is None:
+        with open(path, 'r+b') as f:
+            f.truncate(offset)
+        return
+    tmp_path = f"{path}.tmp"
+    with _open(path, compression, 'rb') as src, _open(tmp_path, compression, 'wb') as dst:
+        remaining = offset
+        while remaining:
+            block = src.read(min(_BLOCK, remaining))
+            if not block:
+                break
+            dst.write(block)
+            remaining -= len(block)
+    os.replace(tmp_path, path)
+
+
+def _csv_seed(seed) -> str:
+    """
+    Seed as written to a CSV cell. String seeds that would read back as
+    something else (digits, or a leading quote) are JSON-quoted, so resume
+    continues the same stream
+    """
+    if isinstance(seed, str) and (parse_seed(seed) != seed or seed.startswith('"')):
+        return json.dumps(seed)
+    return str(seed)
+
+
+def _parse_csv_seed(text: str):
+    if text.startswith('"'):
+        return json.loads(text)
+    return parse_seed(text)
+
+
+def export(engine, generator_name: str, path: str, n: int, seed=None, entry_point: Optional[str] = None,
+           target: Optional[str] = None, context: Optional[Dict[str, Any]] = None,
+           include_variables: bool = False, chunk_size: int = 1000, resume: bool = False,
+           workers: Optional[int] = None) -> Dict[str, Any]:
+    """Write items 0..n-1 of a batch to `path`; returns what was written"""
+    if generator_name not in engine.loaded_generators:
+        raise ValueError(f"Generator '{generator_name}' not found")
+    if chunk_size < 1:
+        raise ValueError('chunk_size must be at least 1')
+    fmt, compression = export_format(path)
+    columns = FIELDS + (('variables',) if include_variables else ())
+    entry = None if target else entry_point or engine.loaded_generators[generator_name]['entry_points']['default']
+
+    start = 0
+    header = None
+    if resume and os.path.exists(path) and os.path.getsize(path) > 0:
+        header, last, offset, torn = _scan(path, fmt, compression)
+        if header is not None and tuple(header) != columns:
+            raise ValueError(f"{path} has columns {header}, expected {list(columns)}")
+        if last is not None:
+            file_seed = _parse_csv_seed(last['seed']) if fmt == 'csv' else last['seed']
+            if seed is None:
+                seed = file_seed
+            elif seed != file_seed:
+                raise ValueError(f"{path} was written with seed {file_seed!r}, not {seed!r}")
+            if (last['entry_point'] or None, last['target'] or None) != (entry, target or None):
+                raise ValueError(f"{path} was written for entry point {last['entry_point']!r} "
+                                 f"and target {last['target']!r}")
+            start = int(last['index']) + 1
+        if torn:
+            _truncate(path, compression, offset)
+        mode = 'ab'
+    else:
+        mode = 'wb'
+    if seed is None:
+        seed = engine._seed if engine._seed is not None else random.getrandbits(32)
+
+    count = max(0, n - start)
+    if count == 0 and mode == 'ab':
+        return {'path': path, 'format': fmt, 'compression': compression, 'seed': seed,
+                'resumed_at': start, 'written': 0, 'next_index': start}
+    if workers and workers > 1:
+        from parallel import generate_parallel
+
+        items = generate_parallel(engine, generator_name, count, seed, workers=workers, entry_point=entry_point,
+                                  target=target, context=context, start=start, include_variables=include_variables)
+    else:
+        items = engine._generate_many(generator_name, count, seed, entry_point, target, context, start,
+                                      include_variables)
+    if not include_variables:
+        items = ((output, None) for output in items)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == 'csv' else None
+    csv_seed = _csv_seed(seed)
+    written = 0
+    with _open(path, compression, mode) as f:
+        if writer is not None and header is None:
+            writer.writerow(columns)
+
+        def flush():
+            f.write(buffer.getvalue().encode('utf-8'))
+            f.flush()
+            buffer.seek(0)
+            buffer.truncate()
+
+        index = start
+        for output, variables in items:
+            if writer is not None:
+                row: List[Any] = [index, csv_seed, entry or '', target or '', output]
+                if include_variables:
+                    row.append(json.dumps(variables, ensure_ascii=False, default=str))
+                writer.writerow(row)
+            else:
+                record = {'index': index, 'seed': seed, 'entry_point': entry, 'target': target, 'output': output}
+                if include_variables:
+                    record['variables'] = variables
+                buffer.write(json.dumps(record, ensure_ascii=False, default=str))
+                buffer.write('\n')
+            index += 1
+            written += 1
+            if written % chunk_size == 0:
+                flush()
+        flush()
+
+    return {
+        'path': path,
+        'format': fmt,
+        'compression': compression,
+        'seed': seed,
+        'resumed_at': start,
+        'written': written,
+        'next_index': start + written,
+    }
+
+
+def main(argv=None):
+    import argparse
+    import contextlib
+
+    from RandomizerEngine import RandomizerEngine
+
+    parser = argparse.ArgumentParser(description='Stream generated outputs to a JSONL or CSV file')
+    parser.add_argument('bundle', help='bundle .json file')
+    parser.add_argument('output', help='.jsonl/.ndjson/.csv, optionally .gz/.xz')
+    parser.add_argument('-n', '--count', type=int, required=True, help='total number of rows')
+    parser.add_argument('--seed', type=parse_seed, help='batch seed (digits are an integer seed)')
+    parser.add_argument('--entry-point', help='rule name or template')
+    parser.add_argument('--target', help='targeting template name')
+    parser.add_argument('--variables', action='store_true', help="add each item's variable values")
+    parser.add_argument('--chunk-size', type=int, default=1000, help='rows per write')
+    parser.add_argument('--workers', type=int, help='worker processes')
+    parser.add_argument('--resume', action='store_true', help='continue an interrupted export')
+    args = parser.parse_args(argv)
+
+    engine = RandomizerEngine()
+    with contextlib.redirect_stdout(io.StringIO()):
+        name = engine.load_generator_file(args.bundle)
+    result = export(engine, name, args.output, args.count, seed=args.seed, entry_point=args.entry_point,
+                    target=args.target, include_variables=args.variables, chunk_size=args.chunk_size,
+                    resume=args.resume, workers=args.workers)
+    print(json.dumps(result))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
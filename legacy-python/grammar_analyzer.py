@@ -0,0 +1,575 @@
+"""
+Static analysis of a loaded generator's compiled grammar.
+
+`analyze_generator` builds the rule dependency graph from every placeholder
+in rule texts, options, entry points and targeting templates, and reports:
+
+- missing rules: entry points / targeting placeholders naming no rule
+  (these render `[MISSING RULE: x]`)
+- invalid rules: malformed definitions, failed includes, unknown rule types
+- undefined references: `#x#` that is neither a rule nor a known variable
+  (declared, or written by an action); rendered verbatim
+- variable references: placeholders that resolve to variables, not rules
+- unreachable rules: not reachable from any entry point or target (they can
+  still be requested explicitly with `entry_point=`)
+- cycles: groups of mutually recursive rules
+- max depth: worst-case nesting of rule expansions from the entry points,
+  `None` when a reachable cycle makes it unbounded
+
+`count_outputs` measures the output space of one entry point or target:
+the exact number of distinct derivations (choice trees, as a Python int),
+the exact probability of every option of every rule (`Fraction`s that
+respect weights), the Shannon entropy in bits, the probability that two
+generations take the same derivation, and the probability of the single
+most likely one. Conditions are evaluated once against a fixed variable
+assignment (the current values plus any overrides); actions taken during a
+generation are not replayed. Each rule is solved once, so the cost is
+linear in the size of the rule graph. Derivations through a reachable
+cycle are unbounded and reported as `None`.
+
+Run it on a bundle from the command line (exit status 1 if it has errors):
+
+    python legacy-python/grammar_analyzer.py generators/opera_character_generator_v0.2.0.json [--json] [--space]
+"""
+
+import math
+from fractions import Fraction
+from typing import Any, Dict, List, Optional
+
+from grammar_ir import (RULE_TOKEN_RE, ChoiceRule, ConditionalRule, ErrorRule, ErrorText, LiteralRule,
+                        MappedChoiceRule, MappedTexts, RuleRef, SequentialRule, TextNode, TextRule,
+                        VarRef, WeightedRule)
+from session import GenerationContext
+
+
+class GrammarReport:
+    """Result of analyze_generator; `errors` empty means the bundle is safe to serve"""
+
+    def __init__(self, generator_name: str):
+        self.generator_name = generator_name
+        self.rule_count = 0
+        self.missing_rules: Dict[str, List[str]] = {}        # rule name -> where it is referenced
+        self.invalid_rules: Dict[str, str] = {}              # rule name -> problem
+        self.undefined_references: Dict[str, List[str]] = {}
+        self.variable_references: Dict[str, List[str]] = {}
+        self.unreachable_rules: List[str] = []
+        self.cycles: List[List[str]] = []
+        self.max_depth: Optional[int] = None
+        self.rule_depths: Dict[str, Optional[int]] = {}
+
+    @property
+    def errors(self) -> List[str]:
+        errors = [f"missing rule '{name}' referenced by {', '.join(where)}"
+                  for name, where in sorted(self.missing_rules.items())]
+        errors += [f"invalid rule '{name}': {problem}" for name, problem in sorted(self.invalid_rules.items())]
+        return errors
+
+    @property
+    def warnings(self) -> List[str]:
+        warnings = [f"undefined reference '#{name}#' in {', '.join(where)}"
+                    for name, where in sorted(self.undefined_references.items())]
+        warnings += [f"unreachable rule '{name}'" for name in self.unreachable_rules]
+        warnings += [f"recursive cycle: {' -> '.join(cycle + cycle[:1])}" for cycle in self.cycles]
+        return warnings
+
+    @property
+    def ok(self) -> bool:
+        return not self.missing_rules and not self.invalid_rules
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'generator': self.generator_name,
+            'rules': self.rule_count,
+            'ok': self.ok,
+            'missing_rules': self.missing_rules,
+            'invalid_rules': self.invalid_rules,
+            'undefined_references': self.undefined_references,
+            'variable_references': self.variable_references,
+            'unreachable_rules': self.unreachable_rules,
+            'cycles': self.cycles,
+            'max_depth': self.max_depth,
+            'rule_depths': self.rule_depths,
+        }
+
+    def format(self) -> str:
+        depth = 'unbounded (recursive)' if self.max_depth is None else str(self.max_depth)
+        lines = [f"{self.generator_name}: {self.rule_count} rules, max expansion depth {depth}"]
+        lines += [f"  error: {line}" for line in self.errors]
+        lines += [f"  warning: {line}" for line in self.warnings]
+        if self.variable_references:
+            lines.append(f"  variables referenced: {', '.join(sorted(self.variable_references))}")
+        return '\n'.join(lines)
+
+
+def _texts(node):
+    """Compiled texts (TextNode/ErrorText) or raw strings that a rule can render"""
+    cls = node.__class__
+    if cls is TextRule:
+        return [node.text]
+    if cls is ChoiceRule:
+        return [option.text for option in node.options]
+    if cls is ConditionalRule:
+        texts = [option.text for option in node.options]
+        return texts + [node.fallback] if node.fallback is not None else texts
+    if cls is WeightedRule:
+        return node.texts.strings if isinstance(node.texts, MappedTexts) else list(node.texts)
+    if cls is MappedChoiceRule:
+        return node.texts.strings
+    if cls is SequentialRule:
+        return list(node.texts)
+    return []
+
+
+def _actions(node):
+    if node.__class__ in (ChoiceRule, ConditionalRule):
+        return [option.actions for option in node.options if option.actions]
+    return []
+
+
+def _problem(node) -> Optional[str]:
+    cls = node.__class__
+    if cls is ErrorRule:
+        return f"{node.exc_type.__name__}: {', '.join(map(str, node.args))}"
+    if cls is LiteralRule:
+        return node.value
+    if cls is ChoiceRule and not node.options:
+        return '[NO VALID OPTIONS]'
+    if cls is TextRule and node.text.__class__ is TextNode and (node.text.static or '').startswith('[INCLUDE_ERROR:'):
+        return node.text.static
+    for text in _texts(node):
+        if text.__class__ is ErrorText:
+            return f"{text.exc_type.__name__}: {', '.join(map(str, text.args))}"
+    return None
+
+
+def _references(text, grammar):
+    """Yield (name, is_rule) for every placeholder in a text"""
+    if text.__class__ is str:
+        if '#' in text:
+            for match in RULE_TOKEN_RE.finditer(text):
+                yield match.group(1), match.group(1) in grammar
+        return
+    if text.__class__ is not TextNode:
+        return
+    for part in text.parts:
+        cls = part.__class__
+        if cls is RuleRef:
+            yield part.name, True
+        elif cls is VarRef:
+            yield part.name, False
+
+
+def _strongly_connected(edges: Dict[str, set]) -> List[List[str]]:
+    """Tarjan's algorithm without recursion (grammars can be thousands of rules deep)"""
+    index_of, low, on_stack = {}, {}, set()
+    stack, components = [], []
+    counter = 0
+    for root in edges:
+        if root in index_of:
+            continue
+        work = [(root, iter(sorted(edges[root])))]
+        index_of[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            node, children = work[-1]
+            advanced = False
+            for child in children:
+                if child not in index_of:
+                    index_of[child] = low[child] = counter
+                    counter += 1
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(sorted(edges[child]))))
+                    advanced = True
+                    break
+                if child in on_stack:
+                    low[node] = min(low[node], index_of[child])
+            if advanced:
+                continue
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                low[parent] = min(low[parent], low[node])
+            if low[node] == index_of[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == node:
+                        break
+                components.append(component)
+    return components
+
+
+def analyze_generator(engine, generator_name: str) -> GrammarReport:
+    generator = engine.loaded_generators[generator_name]
+    compiled = engine._compiled[generator_name]
+    grammar = compiled.rules
+    report = GrammarReport(generator_name)
+    report.rule_count = len(grammar)
+
+    known_variables = set(generator.get('variables') or {})
+    store = engine._stores[generator_name]
+    for node in grammar.values():
+        for actions in _actions(node):
+            known_variables.update(store.names[slot] for _, slot, _ in actions)
+
+    def note(table, name, where):
+        places = table.setdefault(name, [])
+        if where not in places:
+            places.append(where)
+
+    # Rule dependency graph
+    edges: Dict[str, set] = {}
+    for rule_name, node in grammar.items():
+        problem = _problem(node)
+        if problem is not None:
+            report.invalid_rules[rule_name] = problem
+        children = edges[rule_name] = set()
+        for text in _texts(node):
+            for name, is_rule in _references(text, grammar):
+                if is_rule:
+                    children.add(name)
+                elif name in known_variables:
+                    note(report.variable_references, name, rule_name)
+                else:
+                    note(report.undefined_references, name, rule_name)
+
+    # Roots: entry points (rule names or templates) and targeting templates
+    roots = set()
+    template_roots = []  # rules referenced from templates, expanded at depth 1
+    for key, entry in (generator.get('entry_points') or {}).items():
+        for value in (entry if isinstance(entry, list) else [entry]):
+            if not isinstance(value, str):
+                continue
+            where = f"entry point '{key}'"
+            if '#' in value:
+                for name, is_rule in _references(value, grammar):
+                    if is_rule:
+                        template_roots.append(name)
+                    elif name not in known_variables:
+                        note(report.undefined_references, name, where)
+            elif value in grammar:
+                roots.add(value)
+            else:
+                note(report.missing_rules, value, where)
+    for target, config in (generator.get('targeting') or {}).items():
+        if not isinstance(config, dict) or not isinstance(config.get('template'), str):
+            continue
+        for name in compiled.target_placeholders(config['template']):
+            if name in grammar:
+                roots.add(name)
+            else:
+                note(report.missing_rules, name, f"target '{target}'")
+    roots.update(template_roots)
+
+    # Reachability
+    seen = set()
+    pending = list(roots)
+    while pending:
+        name = pending.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+        pending.extend(edges[name] - seen)
+    report.unreachable_rules = sorted(name for name in grammar if name not in seen)
+
+    # Cycles and worst-case depth over the condensed graph
+    components = _strongly_connected(edges)
+    component_of = {}
+    for number, component in enumerate(components):
+        for name in component:
+            component_of[name] = number
+        if len(component) > 1 or component[0] in edges[component[0]]:
+            report.cycles.append(sorted(component))
+    report.cycles.sort()
+
+    # Tarjan emits components in reverse topological order: children first
+    component_depth: List[Optional[int]] = []
+    for number, component in enumerate(components):
+        recursive = len(component) > 1 or component[0] in edges[component[0]]
+        depth = 1
+        for name in component:
+            for child in edges[name]:
+                if component_of[child] == number:
+                    continue
+                child_depth = component_depth[component_of[child]]
+                if child_depth is None:
+                    recursive = True
+                else:
+                    depth = max(depth, child_depth + 1)
+        component_depth.append(None if recursive else depth)
+    report.rule_depths = {name: component_depth[component_of[name]] for name in sorted(grammar)}
+
+    depths = [report.rule_depths[name] for name in roots]
+    if any(depth is None for depth in depths):
+        report.max_depth = None
+    else:
+        report.max_depth = max(depths, default=0)
+    return report
+
+
+class RuleSpace:
+    """Output space of one rule; the measures are `None` when it is recursive"""
+    __slots__ = ('derivations', 'entropy_bits', 'collision_probability', 'max_probability', 'probabilities')
+
+    def __init__(self, derivations, entropy_bits, collision_probability, max_probability, probabilities):
+        self.derivations: Optional[int] = derivations
+        self.entropy_bits: Optional[float] = entropy_bits
+        self.collision_probability: Optional[Fraction] = collision_probability
+        self.max_probability: Optional[Fraction] = max_probability
+        self.probabilities: List[Fraction] = probabilities  # per option, 0 when it cannot be picked
+
+
+class OutputSpace(RuleSpace):
+    """Result of count_outputs for one entry point or target, with every rule it reaches"""
+    __slots__ = ('generator_name', 'entry', 'rules')
+
+    def __init__(self, generator_name: str, entry: str, root: RuleSpace, rules: Dict[str, RuleSpace]):
+        super().__init__(root.derivations, root.entropy_bits, root.collision_probability,
+                         root.max_probability, root.probabilities)
+        self.generator_name = generator_name
+        self.entry = entry
+        self.rules = rules
+
+    @property
+    def bounded(self) -> bool:
+        return self.derivations is not None
+
+    def to_dict(self) -> Dict[str, Any]:
+        def number(value):
+            return None if value is None else str(value)
+        return {
+            'generator': self.generator_name,
+            'entry': self.entry,
+            'derivations': number(self.derivations),
+            'entropy_bits': self.entropy_bits,
+            'collision_probability': number(self.collision_probability),
+            'max_probability': number(self.max_probability),
+        }
+
+    def format(self) -> str:
+        if not self.bounded:
+            return f"{self.entry}: unbounded (recursive)"
+        digits = len(str(self.derivations))
+        count = str(self.derivations) if digits <= 15 else f"~1e{digits - 1}"
+        return (f"{self.entry}: {count} derivations, {self.entropy_bits:.2f} bits, "
+                f"most likely {float(self.max_probability):.3g}, "
+                f"collision {float(self.collision_probability):.3g}")
+
+
+_ONE = Fraction(1)
+_CERTAIN = [(_ONE, ())]
+
+
+class _SpaceCounter:
+    """Memoized, iterative walk of the rule graph under one variable assignment"""
+
+    def __init__(self, engine, generator_name: str, variables: Optional[Dict[str, Any]]):
+        self.grammar = engine._compiled[generator_name].rules
+        store = engine._stores[generator_name]
+        values = store.snapshot()
+        for name, value in (variables or {}).items():
+            slot = store.slots.get(name)
+            if slot is not None:  # a variable no condition reads cannot change the result
+                values[slot] = value
+        self.context = GenerationContext(generator_name, store, values, values, None)
+        self.spaces: Dict[str, RuleSpace] = {}
+
+    def refs(self, text) -> tuple:
+        grammar = self.grammar
+        return tuple(name for name, is_rule in _references(text, grammar) if is_rule and name in grammar)
+
+    def options(self, node) -> list:
+        """(probability, referenced rules) for every option the rule can pick"""
+        cls = node.__class__
+        context = self.context
+        if cls is TextRule:
+            return [(_ONE, self.refs(node.text))]
+        if cls is SequentialRule:
+            return [(_ONE, sum((self.refs(text) for text in node.texts), ()))]
+        if cls is ConditionalRule:
+            for option in node.options:
+                if option.check is None or option.check(context):
+                    return [(_ONE, self.refs(option.text))]
+            return _CERTAIN if node.fallback is None else [(_ONE, self.refs(node.fallback))]
+        if cls is ChoiceRule:
+            weights = [Fraction(opt.weight) if opt.check is None or not node.dynamic or opt.check(context)
+                       else Fraction(0) for opt in node.options]
+            total = sum(weights)
+            if total <= 0:
+                return _CERTAIN  # '[NO VALID OPTIONS]'
+            return [(w / total if w > 0 else 0, self.refs(opt.text)) for w, opt in zip(weights, node.options)]
+        if cls is MappedChoiceRule:
+            strings = node.texts.strings
+            p = Fraction(1, len(strings))
+            return [(p, self.refs(text)) for text in strings]
+        if cls is WeightedRule:
+            texts = node.texts.strings if isinstance(node.texts, MappedTexts) else node.texts
+            if not texts:
+                return _CERTAIN
+            total = Fraction(node.total)
+            weights = [Fraction(w) for w in node.weights[:len(texts)]]
+            weights += [Fraction(0)] * (len(texts) - len(weights))
+            # Draws past the last text's cumulative weight fall back to the first text
+            weights[0] += total - sum(weights)
+            return [(w / total if w > 0 else 0, self.refs(text)) for w, text in zip(weights, texts)]
+        return _CERTAIN  # literal markers and errors render one fixed outcome
+
+    def solve(self, root: str) -> RuleSpace:
+        spaces = self.spaces
+        if root in spaces:
+            return spaces[root]
+        live: Dict[str, list] = {}
+        active = set()  # rules whose expansion is in progress: the current path
+        stack = [root]
+        while stack:
+            name = stack[-1]
+            if name in spaces:
+                stack.pop()
+                continue
+            options = live.get(name)
+            if options is None:
+                options = live[name] = self.options(self.grammar[name])
+                active.add(name)
+            pushed = recursive = False
+            for p, refs in options:
+                if not p:
+                    continue
+                for child in refs:
+                    if child in spaces:
+                        continue
+                    if child in active:
+                        recursive = True
+                    else:
+                        stack.append(child)
+                        pushed = True
+            if pushed:
+                continue
+            stack.pop()
+            active.discard(name)
+            spaces[name] = self.combine(options, recursive)
+        return spaces[root]
+
+    def combine(self, options, recursive: bool) -> RuleSpace:
+        spaces = self.spaces
+        probabilities = [p for p, _ in options]
+        derivations = 0
+        entropy = 0.0
+        collision = Fraction(0)
+        best = Fraction(0)
+        for p, refs in options:
+            if not p:
+                continue
+            d, h, c, m = 1, 0.0, _ONE, _ONE
+            for child in refs:
+                space = spaces[child]
+                if space.derivations is None:
+                    recursive = True
+                    break
+                d *= space.derivations
+                h += space.entropy_bits
+                c *= space.collision_probability
+                m *= space.max_probability
+            if recursive:
+                break
+            derivations += d
+            entropy += float(p) * (h - math.log2(p))
+            collision += p * p * c
+            best = max(best, p * m)
+        if recursive:
+            return RuleSpace(None, None, None, None, probabilities)
+        return RuleSpace(derivations, entropy, collision, best, probabilities)
+
+
+def count_outputs(engine, generator_name: str, entry_point: Optional[str] = None, target: Optional[str] = None,
+                  variables: Optional[Dict[str, Any]] = None) -> OutputSpace:
+    generator = engine.loaded_generators[generator_name]
+    compiled = engine._compiled[generator_name]
+    counter = _SpaceCounter(engine, generator_name, variables)
+
+    if target:
+        if target not in (generator.get('targeting') or {}):
+            raise ValueError(f"Target '{target}' not found in generator '{generator_name}'")
+        entry = f"target '{target}'"
+        # Each distinct placeholder is expanded once per generation
+        names = dict.fromkeys(compiled.target_placeholders(generator['targeting'][target]['template']))
+        refs = tuple(name for name in names if name in counter.grammar)
+    else:
+        start = entry_point or generator['entry_points']['default']
+        entry = start
+        if isinstance(start, str) and '#' in start:
+            refs = counter.refs(start)
+        elif start in counter.grammar:
+            refs = (start,)
+        else:
+            refs = ()  # renders '[MISSING RULE: ...]'
+
+    for name in refs:
+        counter.solve(name)
+    root = counter.combine([(_ONE, refs)], False)
+    return OutputSpace(generator_name, entry, root, counter.spaces)
+
+
+def main(argv=None):
+    import argparse
+    import contextlib
+    import io
+    import json
+
+    from RandomizerEngine import RandomizerEngine
+
+    parser = argparse.ArgumentParser(description='Statically analyze generator bundles')
+    parser.add_argument('bundles', nargs='+', help='bundle .json files')
+    parser.add_argument('--json', action='store_true', help='print reports as JSON')
+    parser.add_argument('--space', action='store_true',
+                        help='also count derivations and entropy for every entry point and target')
+    args = parser.parse_args(argv)
+
+    engine = RandomizerEngine()
+    results = []
+    spaces = {}  # generator name -> OutputSpace per entry point and target
+    for path in args.bundles:
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                name = engine.load_generator_file(path)
+        except Exception as error:
+            results.append({'bundle': path, 'ok': False, 'load_error': f"{type(error).__name__}: {error}"})
+            continue
+        report = engine.analyze_generator(name)
+        if args.space:
+            generator = engine.loaded_generators[name]
+            entries = [value for entry in generator['entry_points'].values()
+                       for value in (entry if isinstance(entry, list) else [entry]) if isinstance(value, str)]
+            spaces[name] = [engine.count_outputs(name, entry_point=entry) for entry in dict.fromkeys(entries)]
+            spaces[name] += [engine.count_outputs(name, target=target) for target in generator.get('targeting') or {}]
+        results.append(report)
+
+    def as_dict(result):
+        if isinstance(result, dict):
+            return result
+        data = result.to_dict()
+        if args.space:
+            data['output_space'] = [space.to_dict() for space in spaces[result.generator_name]]
+        return data
+
+    def as_text(result):
+        if isinstance(result, dict):
+            return f"{result['bundle']}: failed to load ({result['load_error']})"
+        lines = [result.format()]
+        if args.space:
+            lines += [f"  space: {space.format()}" for space in spaces[result.generator_name]]
+        return '\n'.join(lines)
+
+    if args.json:
+        print(json.dumps([as_dict(r) for r in results], indent=2))
+    else:
+        print('\n'.join(as_text(r) for r in results))
+    return 0 if all(r['ok'] if isinstance(r, dict) else r.ok for r in results) else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
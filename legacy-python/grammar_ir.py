@@ -0,0 +1,964 @@
+"""
+Pre-parsed rule IR for the Python RandomizerEngine.
+
+`compile_generator` turns the raw grammar of a loaded bundle into a tree of
+small immutable nodes (literals, rule refs, variable refs, modifier chains and
+one node per rule type) so that `generate` never has to tokenize a string on
+the hot path. Every node reproduces the exact behaviour of the original
+regex-based interpreter, including its RNG consumption, so seeded output is
+unchanged.
+"""
+
+import math
+import operator
+import re
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from mapped_strings import MappedStrings
+from variable_store import UNSET
+
+# Same placeholder grammar the engine has always used: #ruleName.mod1.mod2#
+RULE_TOKEN_RE = re.compile(r'#([a-zA-Z_][a-zA-Z0-9_]*)(?:\.([a-zA-Z0-9_.]+))?#')
+VARIABLE_TOKEN_RE = re.compile(r'#([a-zA-Z_][a-zA-Z0-9_]*)#')
+
+# Integer weights below this bound can be selected with bisect and still match
+# the sequential `rand -= weight` scan bit for bit (all intermediate values are exact).
+_EXACT_WEIGHT_LIMIT = 2 ** 53
+
+# Compiled texts of memory-mapped options kept per generator (least recently used evicted)
+MAPPED_TEXT_CACHE_SIZE = 4096
+
+
+class RuleRef:
+    """`#rule#` or `#rule.mod1.mod2#` placeholder that points at a grammar rule"""
+    __slots__ = ('name', 'modifiers', 'node')
+
+    def __init__(self, name: str, modifiers: tuple):
+        self.name = name
+        self.modifiers = modifiers
+        self.node = None  # linked once every rule has been compiled
+
+
+class VarRef:
+    """`#name#` or `#name.mod1.mod2#` placeholder that is not a rule, resolved against variables"""
+    __slots__ = ('name', 'slot', 'modifiers', 'raw')
+
+    def __init__(self, name: str, slot: int, modifiers: tuple = ()):
+        self.name = name
+        self.slot = slot
+        self.modifiers = modifiers
+        self.raw = f"#{'.'.join((name,) + modifiers)}#"  # kept when the variable is unset
+
+
+# Compiled action opcodes: (op, slot, argument)
+SET, MULTIPLY, INCREMENT = 0, 1, 2
+# Compiled condition clause heads; anything else is a variable slot
+AND, OR, NOT = '$and', '$or', '$not'
+
+
+def compile_conditions(conditions, store):
+    """Resolve a condition dict to a tuple of clauses with variable names replaced by slots"""
+    if not conditions:
+        return None
+    clauses = []
+    for key, value in conditions.items():
+        if key == AND or key == OR:
+            clauses.append((key, tuple(compile_conditions(cond, store) for cond in value)))
+        elif key == NOT:
+            clauses.append((key, compile_conditions(value, store)))
+        else:
+            clauses.append((store.slot(key), value))
+    return tuple(clauses)
+
+
+def compile_actions(actions, store):
+    """Resolve `set` / `increment` / `$multiply` actions to (op, slot, argument) tuples"""
+    if not actions:
+        return None
+    ops = []
+    if 'set' in actions:
+        for var_name, value in actions['set'].items():
+            if isinstance(value, dict) and '$multiply' in value:
+                ops.append((MULTIPLY, store.slot(var_name), value['$multiply']))
+            else:
+                ops.append((SET, store.slot(var_name), value))
+    if 'increment' in actions:
+        for var_name, amount in actions['increment'].items():
+            ops.append((INCREMENT, store.slot(var_name), amount))
+    return tuple(ops) or None
+
+
+# Comparison keys in the order they are tested, with the test that fails each
+_COMPARISONS = (('$lt', operator.ge), ('$gt', operator.le), ('$eq', operator.ne),
+                ('$gte', operator.lt), ('$lte', operator.gt))
+
+
+def _always(context):
+    return True
+
+
+def _compare(condition, value):
+    """The per-variable comparisons, for condition values that are not dicts"""
+    for key, fails in _COMPARISONS:
+        if key in condition and fails(value, condition[key]):
+            return False
+    return True
+
+
+def _variable_check(slot, condition):
+    if not isinstance(condition, dict):
+        def check(context):
+            value = context.snapshot[slot] or context.values[slot]
+            return _compare(condition, None if value is UNSET else value)
+        return check
+
+    tests = tuple((fails, condition[key]) for key, fails in _COMPARISONS if key in condition)
+    if not tests:
+        return _always
+    if len(tests) == 1:
+        fails, operand = tests[0]
+
+        def check(context):
+            value = context.snapshot[slot] or context.values[slot]
+            return not fails(None if value is UNSET else value, operand)
+        return check
+
+    def check(context):
+        value = context.snapshot[slot] or context.values[slot]
+        if value is UNSET:
+            value = None
+        for fails, operand in tests:
+            if fails(value, operand):
+                return False
+        return True
+    return check
+
+
+def compile_check(clauses):
+    """
+    Closure(context) -> bool over compiled condition clauses (`$and`, `$or`,
+    `$not` and per-variable comparisons against the start-of-generation
+    value); None when there is nothing to check
+    """
+    if not clauses:
+        return None
+    checks = []
+    for key, value in clauses:
+        if key == AND or key == OR:
+            subchecks = tuple(compile_check(cond) or _always for cond in value)
+            if key == AND:
+                checks.append(lambda context, subchecks=subchecks: all(c(context) for c in subchecks))
+            else:
+                checks.append(lambda context, subchecks=subchecks: any(c(context) for c in subchecks))
+        elif key == NOT:
+            subcheck = compile_check(value) or _always
+            checks.append(lambda context, subcheck=subcheck: not subcheck(context))
+        else:
+            checks.append(_variable_check(key, value))
+    if len(checks) == 1:
+        return checks[0]
+    checks = tuple(checks)
+
+    def check(context):
+        for c in checks:
+            if not c(context):
+                return False
+        return True
+    return check
+
+
+def _action_step(op, slot, argument):
+    if op == SET:
+        def step(context):
+            context.values[slot] = argument
+        return step
+    combine = operator.mul if op == MULTIPLY else operator.add
+
+    def step(context):
+        current_value = context.snapshot[slot] or context.values[slot]
+        if current_value is UNSET:
+            current_value = 0
+        context.values[slot] = combine(current_value, argument)
+    return step
+
+
+def compile_run(ops):
+    """
+    Closure(context) over compiled (op, slot, argument) actions, applied in
+    order; None without actions
+    """
+    if not ops:
+        return None
+    if all(op == SET for op, _, _ in ops):
+        slots = tuple(slot for _, slot, _ in ops)
+        arguments = tuple(argument for _, _, argument in ops)
+        if len(ops) == 1:
+            slot, argument = slots[0], arguments[0]
+
+            def run(context):
+                context.values[slot] = argument
+            return run
+
+        def run(context):
+            values = context.values
+            for slot, argument in zip(slots, arguments):
+                values[slot] = argument
+        return run
+    steps = tuple(_action_step(op, slot, argument) for op, slot, argument in ops)
+    if len(steps) == 1:
+        return steps[0]
+
+    def run(context):
+        for step in steps:
+            step(context)
+    return run
+
+
+class TextNode:
+    """A piece of text split into literals, rule refs and variable refs"""
+    __slots__ = ('parts', 'static', 'has_hash', 'var_count', 'has_refs')
+
+    def __init__(self, parts: tuple, static: Optional[str], has_hash: bool):
+        self.parts = parts
+        self.static = static
+        self.has_hash = has_hash
+        self.var_count = sum(1 for p in parts if p.__class__ is VarRef)
+        # Without rule refs, rendering never recurses
+        self.has_refs = any(p.__class__ is RuleRef for p in parts)
+
+    def render(self, engine, context):
+        if self.static is not None:
+            return self.static
+
+        out = []
+        dirty = self.has_hash
+        for part in self.parts:
+            cls = part.__class__
+            if cls is str:
+                out.append(part)
+            elif cls is RuleRef:
+                value = part.node.expand(engine, context)
+                if part.modifiers:
+                    value = engine._apply_modifiers(value, part.modifiers)
+                if not dirty and '#' in value:
+                    dirty = True
+                out.append(value)
+            else:
+                out.append(part)
+
+        if dirty:
+            # Literal '#' characters (or '#' produced by a sub-rule) can form new
+            # variable placeholders once joined, so run the original second pass.
+            joined = ''.join(p.raw if p.__class__ is VarRef else p for p in out)
+            return engine._substitute_variables(joined, context)
+
+        if self.var_count:
+            for i, part in enumerate(out):
+                if part.__class__ is VarRef:
+                    out[i] = engine._lookup_variable(part, context)
+        return ''.join(out)
+
+
+class ErrorText:
+    """Text that cannot be processed; raises the original error when rendered"""
+    __slots__ = ('exc_type', 'args')
+
+    def __init__(self, exc_type, *args):
+        self.exc_type = exc_type
+        self.args = args
+
+    def render(self, engine, context):
+        raise self.exc_type(*self.args)
+
+
+class Option:
+    """
+    A selectable option inside an array, markov or conditional rule. The
+    condition and action tuples are compiled once more into closures
+    (`check`, `run`) that rules call on the hot path.
+    """
+    __slots__ = ('text', 'raw_text', 'weight', 'conditions', 'actions', 'check', 'run')
+
+    def __init__(self, text, raw_text, weight, conditions, actions):
+        self.text = text
+        self.raw_text = raw_text
+        self.weight = weight
+        self.conditions = conditions
+        self.actions = actions
+        self.check = compile_check(conditions)
+        self.run = compile_run(actions)
+
+    def __getstate__(self):
+        # Closures do not pickle; they are rebuilt from the tuples
+        return self.text, self.raw_text, self.weight, self.conditions, self.actions
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+
+def _is_exact_weight(weight) -> bool:
+    return isinstance(weight, int) and 0 <= weight
+
+
+class AliasTable:
+    """Walker/Vose alias table: O(1) weighted pick from a single uniform float"""
+    __slots__ = ('n', 'prob', 'alias')
+
+    def __init__(self, weights: list):
+        n = len(weights)
+        total = float(sum(weights))
+        scaled = [w * n / total for w in weights]
+        prob = [1.0] * n
+        alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            prob[s] = scaled[s]
+            alias[s] = l
+            scaled[l] = (scaled[l] + scaled[s]) - 1.0
+            (small if scaled[l] < 1.0 else large).append(l)
+        # Leftovers are 1.0 up to rounding error
+        self.n = n
+        self.prob = tuple(prob)
+        self.alias = tuple(alias)
+
+    @classmethod
+    def build(cls, weights: list):
+        """Return a table, or None when the weights cannot form a distribution"""
+        if not weights:
+            return None
+        if not all(isinstance(w, (int, float)) and w >= 0 for w in weights):
+            return None
+        if sum(weights) <= 0:
+            return None
+        return cls(weights)
+
+    def pick(self, rand: float) -> int:
+        u = rand * self.n
+        i = int(u)
+        if i >= self.n:
+            i = self.n - 1
+        return i if u - i < self.prob[i] else self.alias[i]
+
+
+class LiteralRule:
+    """Rule that always yields the same string (error markers, empty text)"""
+    __slots__ = ('value',)
+
+    def __init__(self, value: str):
+        self.value = value
+
+    def select(self, engine, context):
+        return self.value
+
+    def expand(self, engine, context):
+        return self.value
+
+
+class ErrorRule:
+    """Rule whose raw definition is malformed; raises when expanded"""
+    __slots__ = ('exc_type', 'args')
+
+    def __init__(self, exc_type, *args):
+        self.exc_type = exc_type
+        self.args = args
+
+    def select(self, engine, context):
+        raise self.exc_type(*self.args)
+
+    expand = select
+
+
+class TextRule:
+    """Rule defined as a single raw string"""
+    __slots__ = ('text',)
+
+    def __init__(self, text):
+        self.text = text
+
+    def select(self, engine, context):
+        return self.text
+
+    def expand(self, engine, context):
+        return self.text.render(engine, context)
+
+
+class ChoiceRule:
+    """Array of options (plain, markov or dict-wrapped) with optional weights"""
+    __slots__ = ('options', 'dynamic', 'total', 'cum', 'alias')
+
+    def __init__(self, options: List[Option]):
+        self.options = tuple(options)
+        self.dynamic = any(opt.conditions for opt in options)
+        self.total = None
+        self.cum = None
+        self.alias = None
+        if not self.dynamic:
+            self.alias = AliasTable.build([opt.weight for opt in options])
+            total = 0
+            for opt in options:
+                total += opt.weight
+            self.total = total
+            if all(_is_exact_weight(opt.weight) for opt in options) and total < _EXACT_WEIGHT_LIMIT:
+                cum = []
+                running = 0
+                for opt in options:
+                    running += opt.weight
+                    cum.append(running)
+                self.cum = tuple(cum)
+
+    def _eligible(self, engine, context):
+        eligible = []
+        total = 0
+        for opt in self.options:
+            if opt.check is None or opt.check(context):
+                eligible.append(opt)
+                total += opt.weight
+        return eligible, total
+
+    def select(self, engine, context):
+        if self.dynamic:
+            options, total = self._eligible(engine, context)
+        else:
+            options, total = self.options, self.total
+        if not options:
+            return '[NO VALID OPTIONS]'
+
+        if self.alias is not None and engine._alias_selection:
+            option = options[self.alias.pick(context.random())]
+            if option.run is not None:
+                option.run(context)
+            return option.text
+
+        rand = context.random() * total
+        if self.cum is not None and not self.dynamic:
+            option = options[bisect_left(self.cum, rand)]
+        else:
+            option = None
+            for candidate in options:
+                rand -= candidate.weight
+                if rand <= 0:
+                    option = candidate
+                    break
+            if option is None:
+                return options[0].raw_text
+
+        if option.run is not None:
+            option.run(context)
+        return option.text
+
+    def expand(self, engine, context):
+        chosen = self.select(engine, context)
+        if chosen.__class__ is TextNode or chosen.__class__ is ErrorText:
+            return chosen.render(engine, context)
+        return chosen  # marker or the raw text of the rounding-error fallback
+
+
+class MappedText:
+    """One option decoded from a `MappedStrings` file, compiled only if it has placeholders"""
+    __slots__ = ('value',)
+
+    def __init__(self, value: str):
+        self.value = value
+
+    def render(self, engine, context):
+        if '#' not in self.value:
+            return self.value
+        return engine._process_text(self.value, context)
+
+
+class MappedTexts:
+    """Lazy sequence of `MappedText` over a `MappedStrings` option list"""
+    __slots__ = ('strings',)
+
+    def __init__(self, strings: MappedStrings):
+        self.strings = strings
+
+    def __len__(self):
+        return len(self.strings)
+
+    def __getitem__(self, index):
+        return MappedText(self.strings[index])
+
+
+class MappedChoiceRule:
+    """`{"$strings": ...}` rule: uniform pick, decoding only the chosen option"""
+    __slots__ = ('texts',)
+
+    def __init__(self, texts: MappedTexts):
+        self.texts = texts
+
+    def select(self, engine, context):
+        n = len(self.texts)
+        if not n:
+            return '[NO VALID OPTIONS]'
+        rand = context.random() * n
+        if engine._alias_selection:
+            # An alias table over equal weights never takes the alias branch
+            i = min(int(rand), n - 1)
+        else:
+            # The index bisect_left over the cumulative weights 1..n would return
+            i = max(math.ceil(rand) - 1, 0)
+        return self.texts[i]
+
+    def expand(self, engine, context):
+        chosen = self.select(engine, context)
+        return chosen if chosen.__class__ is str else chosen.render(engine, context)
+
+
+class WeightedRule:
+    """`{"type": "weighted", "options": [...], "weights": [...]}`"""
+    __slots__ = ('texts', 'weights', 'total', 'cum', 'alias')
+
+    def __init__(self, texts: List[Any], weights: list):
+        self.texts = texts if isinstance(texts, MappedTexts) else tuple(texts)
+        self.weights = tuple(weights)
+        self.total = sum(weights)
+        self.cum = None
+        self.alias = None
+        if len(weights) == len(texts):
+            self.alias = AliasTable.build(list(weights))
+        if (texts and len(weights) >= len(texts)
+                and all(_is_exact_weight(w) for w in weights)
+                and self.total < _EXACT_WEIGHT_LIMIT):
+            cum = []
+            running = 0
+            for w in weights[:len(texts)]:
+                running += w
+                cum.append(running)
+            self.cum = tuple(cum)
+
+    def select(self, engine, context):
+        if self.alias is not None and engine._alias_selection:
+            return self.texts[self.alias.pick(context.random())]
+
+        rand = context.random() * self.total
+        if self.cum is not None:
+            i = bisect_left(self.cum, rand)
+            if i < len(self.texts):
+                return self.texts[i]
+            return self.texts[0]
+
+        weights = self.weights
+        for i in range(len(self.texts)):
+            rand -= weights[i]
+            if rand <= 0:
+                return self.texts[i]
+        return self.texts[0]
+
+    def expand(self, engine, context):
+        return self.select(engine, context).render(engine, context)
+
+
+class ConditionalRule:
+    """
+    `{"type": "conditional", "options": [...], "fallback": ...}`
+
+    When every option tests one and the same variable with `$eq` alone, the
+    options are indexed by that value (`slot`, `table`) and picked with one
+    dict lookup instead of a scan.
+    """
+    __slots__ = ('options', 'fallback', 'slot', 'table')
+
+    def __init__(self, options: List[Option], fallback):
+        self.options = tuple(options)
+        self.fallback = fallback
+        self.slot = None
+        self.table = None
+        slots = set()
+        table = {}
+        for option in self.options:
+            clauses = option.conditions
+            if not clauses or len(clauses) != 1:
+                return
+            slot, condition = clauses[0]
+            if slot.__class__ is not int or not isinstance(condition, dict) or list(condition) != ['$eq']:
+                return
+            slots.add(slot)
+            try:
+                table.setdefault(condition['$eq'], option)
+            except TypeError:  # unhashable value
+                return
+        if len(slots) == 1:
+            self.slot = slots.pop()
+            self.table = table
+
+    def select(self, engine, context):
+        if self.table is None:
+            option = self._scan(context)
+        else:
+            value = context.snapshot[self.slot] or context.values[self.slot]
+            try:
+                option = self.table.get(None if value is UNSET else value)
+            except TypeError:  # unhashable variable value: scan as usual
+                option = self._scan(context)
+        if option is not None:
+            if option.run is not None:
+                option.run(context)
+            return option.text
+
+        # Use fallback even if it is an empty string; only display error if fallback key missing
+        if self.fallback is not None:
+            return self.fallback
+        return '[NO CONDITIONS MET]'
+
+    def _scan(self, context):
+        for option in self.options:
+            if option.check is None or option.check(context):
+                return option
+        return None
+
+    def expand(self, engine, context):
+        chosen = self.select(engine, context)
+        return chosen if chosen.__class__ is str else chosen.render(engine, context)
+
+
+class SequentialRule:
+    """`{"type": "sequential", "options": [...]}` joined with per-option joiners"""
+    __slots__ = ('texts', 'joiners')
+
+    def __init__(self, texts: List[Any], joiners: list):
+        self.texts = tuple(texts)
+        self.joiners = tuple(joiners)
+
+    def select(self, engine, context):
+        # Nothing to choose; the expander renders the texts in order
+        return self
+
+    def expand(self, engine, context):
+        final_result = ''
+        last = len(self.texts) - 1
+        for i, text in enumerate(self.texts):
+            final_result += text.render(engine, context)
+            if i < last:
+                final_result += self.joiners[i]
+        return final_result
+
+
+# Literal text between two placeholders that keeps the segment rendering of a
+# target identical to replacing each `#name#` in turn (see CompiledTarget)
+_SEPARATOR_RE = re.compile(r'[^a-zA-Z0-9_#]')
+
+
+class CompiledTarget:
+    """
+    A `targeting` entry: the placeholder rule names of its template in order,
+    the template split into literal and placeholder segments, and the
+    parameterMap lookups that apply to those rules.
+
+    Targets used to be rendered by one `str.replace` per rule over the whole
+    template; `render` produces the same string by filling the segments. Where
+    the two could differ (a placeholder value containing '#', or a template
+    whose placeholders are not separated by literal text with a character that
+    cannot be part of a name), it falls back to the replacements.
+    """
+    __slots__ = ('template', 'names', 'maps', 'segments', 'positions')
+
+    def __init__(self, template: str, parameter_map=None):
+        self.template = template
+        self.names = tuple(dict.fromkeys(VARIABLE_TOKEN_RE.findall(template)))
+        self.maps = tuple((name, mapping) for name, mapping in parameter_map.items()
+                          if name in self.names) if parameter_map else ()
+
+        segments = []
+        positions = []
+        pos = 0
+        safe = True
+        for match in VARIABLE_TOKEN_RE.finditer(template):
+            literal = template[pos:match.start()]
+            if '#' in literal or (positions and not _SEPARATOR_RE.search(literal)):
+                safe = False
+            if literal:
+                segments.append(literal)
+            positions.append((len(segments), match.group(1)))
+            segments.append(None)
+            pos = match.end()
+        tail = template[pos:]
+        if '#' in tail:
+            safe = False
+        if tail:
+            segments.append(tail)
+        self.segments = tuple(segments) if safe else None
+        self.positions = tuple(positions) if safe else None
+
+    def render(self, values: Dict[str, Any]) -> str:
+        """The template filled with `values` (rule name -> expanded text), after the parameterMap"""
+        if self.maps:
+            values = dict(values)
+            for name, mapping in self.maps:
+                if values[name] in mapping:
+                    values[name] = mapping[values[name]]
+        if self.segments is not None:
+            out = list(self.segments)
+            for index, name in self.positions:
+                value = values[name]
+                if value.__class__ is not str:
+                    value = str(value)
+                if '#' in value:
+                    return self._replace(values)
+                out[index] = value
+            return ''.join(out)
+        return self._replace(values)
+
+    def _replace(self, values):
+        result = self.template
+        for name in self.names:
+            result = result.replace(f'#{name}#', str(values[name]))
+        return result
+
+
+class ErrorTarget:
+    """Targeting entry whose definition is malformed; raises when rendered"""
+    __slots__ = ('exc_type', 'args')
+    names = ()
+
+    def __init__(self, exc_type, *args):
+        self.exc_type = exc_type
+        self.args = args
+
+    def render(self, values):
+        raise self.exc_type(*self.args)
+
+
+class CompiledGenerator:
+    """Compiled rules plus memoized entry-point texts for one loaded generator"""
+
+    def __init__(self, name: str, generator: Dict[str, Any], store):
+        self.name = name
+        self.store = store
+        self.grammar = generator['grammar']
+        self.rules: Dict[str, Any] = {}
+        self._refs: List[RuleRef] = []
+        self._texts: Dict[str, Any] = {}
+        self._mapped_texts: 'OrderedDict[str, Any]' = OrderedDict()
+        self._target_placeholders: Dict[str, List[str]] = {}
+        # Every modifier name used by the compiled texts, to report unknown ones at load
+        self.modifier_names = set()
+        # Guards compilation of new ad-hoc texts; cache hits never take it
+        self._lock = threading.Lock()
+
+        for rule_name, rule in self.grammar.items():
+            try:
+                self.rules[rule_name] = self._compile_rule(rule)
+            except Exception as error:
+                self.rules[rule_name] = ErrorRule(type(error), *error.args)
+        self._link()
+
+        self.targets: Dict[str, Any] = {}
+        targeting = generator.get('targeting')
+        if isinstance(targeting, dict):
+            for target_name, config in targeting.items():
+                try:
+                    self.targets[target_name] = CompiledTarget(config['template'], config.get('parameterMap'))
+                except Exception as error:
+                    self.targets[target_name] = ErrorTarget(type(error), *error.args)
+
+    # -- public helpers -------------------------------------------------
+
+    def rule(self, rule_name):
+        """Return the compiled rule, or a literal marker when it does not exist"""
+        node = self.rules.get(rule_name)
+        if node is None:
+            return LiteralRule(f"[MISSING RULE: {rule_name}]")
+        return node
+
+    def text(self, text):
+        """Compile (once) and return an ad-hoc text such as an entry point"""
+        if not isinstance(text, str):
+            return self.compile_text(text)
+        node = self._texts.get(text)
+        if node is None:
+            with self._lock:
+                node = self._texts.get(text)
+                if node is None:
+                    node = self.compile_text(text)
+                    self._link()
+                    self._texts[text] = node
+        return node
+
+    def mapped_text(self, text: str):
+        """
+        Compile a memory-mapped option with placeholders. Such lists can hold
+        millions of distinct lines, so only the most recently used
+        MAPPED_TEXT_CACHE_SIZE are kept
+        """
+        cache = self._mapped_texts
+        node = cache.get(text)
+        if node is not None:
+            try:
+                cache.move_to_end(text)
+            except KeyError:
+                pass  # evicted by another thread meanwhile
+            return node
+        with self._lock:
+            node = cache.get(text)
+            if node is None:
+                node = self.compile_text(text)
+                self._link()
+                cache[text] = node
+                if len(cache) > MAPPED_TEXT_CACHE_SIZE:
+                    cache.popitem(last=False)
+        return node
+
+    def target_placeholders(self, template: str) -> List[str]:
+        names = self._target_placeholders.get(template)
+        if names is None:
+            names = VARIABLE_TOKEN_RE.findall(template)
+            self._target_placeholders[template] = names
+        return names
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    # -- compilation ----------------------------------------------------
+
+    def compile_text(self, text):
+        if not text:
+            return TextNode((), '', False)
+        if not isinstance(text, str):
+            return ErrorText(TypeError, f"expected string or bytes-like object, got '{type(text).__name__}'")
+
+        parts = []
+        literal = []
+        pos = 0
+        for match in RULE_TOKEN_RE.finditer(text):
+            literal.append(text[pos:match.start()])
+            pos = match.end()
+            rule_name, modifier_str = match.group(1), match.group(2)
+            if rule_name in self.grammar:
+                if literal:
+                    parts.append(''.join(literal))
+                    literal = []
+                ref = RuleRef(rule_name, self._modifiers(modifier_str))
+                self._refs.append(ref)
+                parts.append(ref)
+            else:
+                if literal:
+                    parts.append(''.join(literal))
+                    literal = []
+                parts.append(VarRef(rule_name, self.store.slot(rule_name), self._modifiers(modifier_str)))
+        literal.append(text[pos:])
+        tail = ''.join(literal)
+        if tail:
+            parts.append(tail)
+        parts = [p for p in parts if p != '']
+
+        has_hash = any(p.__class__ is str and '#' in p for p in parts)
+        if all(p.__class__ is str for p in parts) and not has_hash:
+            return TextNode(tuple(parts), ''.join(parts), False)
+        return TextNode(tuple(parts), None, has_hash)
+
+    def _modifiers(self, modifier_str):
+        if not modifier_str:
+            return ()
+        modifiers = tuple(modifier_str.split('.'))
+        self.modifier_names.update(modifiers)
+        return modifiers
+
+    def _compile_option(self, option) -> Optional[Option]:
+        if isinstance(option, str):
+            return Option(self.compile_text(option), option, 1, None, None)
+        if isinstance(option, dict) and 'text' in option:
+            return Option(
+                self.compile_text(option['text']),
+                option['text'],
+                option.get('weight', 1),
+                compile_conditions(option.get('conditions'), self.store),
+                compile_actions(option.get('actions'), self.store),
+            )
+        return None
+
+    def _compile_merged_option(self, option, top_actions) -> Optional[Option]:
+        """Option of a dict-wrapped list, with the rule's top-level actions appended to its own"""
+        if isinstance(option, dict):
+            # The merge happens once here, on a derived structure; the loaded bundle is never touched
+            existing_actions = option.get('actions')
+            merged = dict(option, actions=existing_actions + top_actions if existing_actions else top_actions)
+            return self._compile_option(merged)
+        return self._compile_option({'text': option, 'actions': top_actions})
+
+    def _compile_choice(self, options) -> ChoiceRule:
+        if isinstance(options, MappedStrings):
+            return MappedChoiceRule(MappedTexts(options))
+        compiled = [self._compile_option(opt) for opt in options]
+        return ChoiceRule([opt for opt in compiled if opt is not None])
+
+    def _compile_rule(self, rule):
+        if isinstance(rule, str):
+            return TextRule(self.compile_text(rule))
+
+        if isinstance(rule, (list, MappedStrings)):
+            return self._compile_choice(rule)
+
+        if isinstance(rule, dict) and 'type' in rule:
+            rule_type = rule.get('type')
+            if rule_type == 'weighted':
+                options = rule['options']
+                weights = rule.get('weights', [1] * len(options))
+                if isinstance(options, MappedStrings):
+                    return WeightedRule(MappedTexts(options), weights)
+                return WeightedRule([self.compile_text(opt) for opt in options], weights)
+            if rule_type == 'conditional':
+                options = []
+                for option in rule['options']:
+                    text = (self.compile_text(option['text']) if 'text' in option
+                            else ErrorText(KeyError, 'text'))
+                    options.append(Option(text, option.get('text'), 1,
+                                          compile_conditions(option.get('conditions'), self.store),
+                                          compile_actions(option.get('actions'), self.store)))
+                fallback = self.compile_text(rule.get('fallback', '')) if 'fallback' in rule else None
+                return ConditionalRule(options, fallback)
+            if rule_type == 'sequential':
+                texts, joiners = [], []
+                for option in rule['options']:
+                    joiner = ' '  # Default joiner
+                    if isinstance(option, str):
+                        text_to_process = option
+                    elif isinstance(option, dict) and 'text' in option:
+                        text_to_process = option['text']
+                        if 'joiner' in option:
+                            joiner = option['joiner']
+                    else:
+                        text_to_process = '[INVALID SEQUENTIAL OPTION]'
+                    texts.append(self.compile_text(text_to_process))
+                    joiners.append(joiner)
+                return SequentialRule(texts, joiners)
+            if rule_type == 'markov':
+                # Simplified Markov implementation
+                return self._compile_choice(rule['options'])
+            return LiteralRule(f"[UNKNOWN RULE TYPE: {rule_type}]")
+
+        if isinstance(rule, dict):
+            # Objects that wrap their options in a single-array field (e.g. {"species": [...], "actions": [...]})
+            list_fields = [v for v in rule.values() if isinstance(v, list)]
+            if list_fields:
+                # If multiple list fields exist, assume the first one contains the options
+                options = list_fields[0]
+                top_actions = rule.get('actions')
+                if top_actions:
+                    return ChoiceRule([opt for opt in (self._compile_merged_option(opt, top_actions)
+                                                       for opt in options) if opt is not None])
+                return self._compile_choice(options)
+
+        return LiteralRule('[INVALID RULE FORMAT]')
+
+    def _link(self):
+        for ref in self._refs:
+            ref.node = self.rules[ref.name]
+        self._refs = []
+
+
+def compile_generator(name: str, generator: Dict[str, Any], store) -> CompiledGenerator:
+    """Compile every grammar rule of a (fully include-resolved) generator bundle"""
+    return CompiledGenerator(name, generator, store)
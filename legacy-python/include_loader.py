@@ -0,0 +1,263 @@
+"""
+`$include` resolution for the Python RandomizerEngine.
+
+Include paths are resolved against the bundle's own location rather than the
+current working directory:
+
+- `/dir/file.json` is relative to the bundle's directory (the generators root)
+- `file.json` is tried next to the including file, then in the generators root,
+  then in `<root>/<bundle stem>/` (the layout used by televangelist_generator/)
+
+Includes inside included files are resolved recursively with cycle detection.
+Sibling files are read concurrently on a small thread pool, and parsed JSON is
+cached process-wide keyed by absolute path, mtime and size, so loading the
+same bundle again (from any engine) only costs a few `stat` calls. Cached data
+is shared and must be treated as read-only. `prefetch_bundle` fills the cache
+for a whole bundle ahead of time, e.g. on a thread for asyncio callers.
+
+`{"$strings": ...}` directives are located the same way and become
+memory-mapped `MappedStrings` (see mapped_strings.py).
+"""
+
+import json
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+MAX_INCLUDE_DEPTH = 20
+
+# abs path -> (mtime_ns, size, parsed JSON)
+_cache: Dict[str, Tuple[int, int, Any]] = {}
+_cache_lock = threading.Lock()
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class IncludeError(Exception):
+    """An include file is missing, unreadable, invalid JSON or part of a cycle"""
+
+
+def _warn(error):
+    # logging and the thread pool are imported on first use to keep CLI startup short
+    import logging
+    logging.getLogger(__name__).warning("%s", error)
+
+
+def _pool():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                _executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='randomizer-include')
+    return _executor
+
+
+def read_json(path: str) -> Any:
+    """Parse a JSON file, reusing the cached result while its mtime and size are unchanged"""
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    cached = _cache.get(path)
+    if cached is not None and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        return cached[2]
+    with open(path, 'r') as f:
+        data = json.load(f)
+    with _cache_lock:
+        _cache[path] = (stat.st_mtime_ns, stat.st_size, data)
+    return data
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+
+
+def prefetch_bundle(path: str):
+    """
+    Read a bundle file and every include it reaches into the cache, so that
+    loading it afterwards does no file I/O beyond `stat` calls. Unreadable
+    files are skipped; loading reports them.
+    """
+    try:
+        data = read_json(path)
+    except (OSError, ValueError):
+        return
+    if isinstance(data, dict) and isinstance(data.get('grammar'), dict):
+        root_dir = os.path.dirname(path)
+        resolver = IncludeResolver(root_dir, os.path.splitext(os.path.basename(path))[0])
+        resolver.prefetch_all(data['grammar'], root_dir)
+
+
+def bundle_stem(name: str) -> str:
+    """`Televangelist Generator` -> `televangelist_generator` (the bundle file naming convention)"""
+    return re.sub(r'[^a-z0-9]+', '_', name.lower()).strip('_')
+
+
+def _is_include(node) -> bool:
+    return isinstance(node, dict) and '$include' in node
+
+
+class IncludeResolver:
+    """Resolve `$include` directives for one bundle"""
+
+    def __init__(self, root_dir: str, stem: Optional[str] = None):
+        self.root_dir = root_dir
+        self.stem = stem
+        # Absolute paths of every include file read (for snapshot source hashes)
+        self.files: List[str] = []
+
+    def locate(self, include_path: str, here: str) -> Optional[str]:
+        if include_path.startswith('/'):
+            candidates = [os.path.join(self.root_dir, include_path.lstrip('/'))]
+        else:
+            candidates = [os.path.join(here, include_path), os.path.join(self.root_dir, include_path)]
+            if self.stem:
+                candidates.append(os.path.join(self.root_dir, self.stem, include_path))
+        for candidate in candidates:
+            if os.path.isfile(candidate):
+                return candidate
+        return None
+
+    def load(self, include_path: str, here: str, chain: tuple) -> Any:
+        """Read one include (and everything it includes); raises IncludeError"""
+        path = self.locate(include_path, here)
+        if path is None:
+            raise IncludeError(f"Included file not found: {include_path}")
+        path = os.path.abspath(path)
+        if path in chain:
+            raise IncludeError(f"Circular include: {' -> '.join(chain + (path,))}")
+        if len(chain) >= MAX_INCLUDE_DEPTH:
+            raise IncludeError(f"Max include depth exceeded at {include_path}")
+        try:
+            data = read_json(path)
+        except json.JSONDecodeError:
+            raise IncludeError(f"Invalid JSON in included file: {path}")
+        except OSError as error:
+            raise IncludeError(f"Could not read included file {path}: {error}")
+        if path not in self.files:
+            self.files.append(path)
+        return self.resolve(data, os.path.dirname(path), chain + (path,))
+
+    def resolve(self, node: Any, here: str, chain: tuple = ()) -> Any:
+        """Return `node` with nested includes inlined; unchanged subtrees are returned as-is"""
+        self._prefetch(node, here)
+        return self._substitute(node, here, chain)
+
+    def _prefetch(self, node, here):
+        paths = set()
+        self._collect(node, here, paths)
+        uncached = [p for p in paths if os.path.abspath(p) not in _cache]
+        if len(uncached) > 1:
+            # Failures surface again (with context) when the include is substituted
+            for _ in _pool().map(self._try_read, uncached):
+                pass
+
+    def prefetch_all(self, node, here):
+        """Read every include reachable from `node` into the cache, one level of nesting at a time"""
+        seen = set()
+        level = [(node, here)]
+        while level:
+            paths = set()
+            for item, item_here in level:
+                self._collect(item, item_here, paths)
+            paths = [path for path in map(os.path.abspath, paths) if path not in seen]
+            seen.update(paths)
+            level = [(data, os.path.dirname(path))
+                     for path, data in zip(paths, _pool().map(self._try_read, paths)) if data is not None]
+
+    @staticmethod
+    def _try_read(path):
+        try:
+            return read_json(path)
+        except Exception:
+            return None
+
+    def _collect(self, node, here, paths):
+        if _is_include(node):
+            include_path = node['$include']
+            if isinstance(include_path, str):
+                path = self.locate(include_path, here)
+                if path is not None:
+                    paths.add(path)
+        elif isinstance(node, dict):
+            for value in node.values():
+                self._collect(value, here, paths)
+        elif isinstance(node, list):
+            for value in node:
+                self._collect(value, here, paths)
+
+    def load_strings(self, strings_path: str, here: str):
+        """Map a `{"$strings": ...}` file; raises IncludeError"""
+        from mapped_strings import open_strings
+
+        path = self.locate(strings_path, here)
+        if path is None:
+            raise IncludeError(f"Strings file not found: {strings_path}")
+        try:
+            strings = open_strings(path)
+        except (OSError, ValueError) as error:
+            raise IncludeError(f"Could not map strings file {path}: {error}")
+        if strings.path not in self.files:
+            self.files.append(strings.path)
+        return strings
+
+    def _substitute(self, node, here, chain):
+        if isinstance(node, dict):
+            if '$strings' in node:
+                try:
+                    return self.load_strings(node['$strings'], here)
+                except IncludeError as error:
+                    _warn(error)
+                    return node
+            if _is_include(node):
+                try:
+                    return self.load(node['$include'], here, chain)
+                except IncludeError as error:
+                    # Nested failures keep the directive in place (it has no text, so it never gets picked)
+                    _warn(error)
+                    return node
+            changed = False
+            out = {}
+            for key, value in node.items():
+                new_value = self._substitute(value, here, chain)
+                changed = changed or new_value is not value
+                out[key] = new_value
+            return out if changed else node
+
+        if isinstance(node, list):
+            changed = False
+            out = []
+            for value in node:
+                if _is_include(value):
+                    new_value = self._substitute(value, here, chain)
+                    if new_value is not value:
+                        changed = True
+                        # Included arrays are spliced into the surrounding option list
+                        if isinstance(new_value, list):
+                            out.extend(new_value)
+                        else:
+                            out.append(new_value)
+                        continue
+                    out.append(value)
+                    continue
+                new_value = self._substitute(value, here, chain)
+                changed = changed or new_value is not value
+                out.append(new_value)
+            return out if changed else node
+
+        return node
+
+    def resolve_grammar(self, grammar: Dict[str, Any]):
+        """Inline includes into a grammar dict in place; failed top-level includes become markers"""
+        self._prefetch(grammar, self.root_dir)
+        for rule_name, rule_content in grammar.items():
+            if _is_include(rule_content):
+                include_path = rule_content['$include']
+                try:
+                    grammar[rule_name] = self.load(include_path, self.root_dir, ())
+                except IncludeError as error:
+                    _warn(error)
+                    grammar[rule_name] = f"[INCLUDE_ERROR: {include_path}]"
+            else:
+                grammar[rule_name] = self._substitute(rule_content, self.root_dir, ())
@@ -0,0 +1,144 @@
+"""
+Memory-mapped string arrays for very large option lists.
+
+A `.strings` file is an offset table followed by one UTF-8 blob:
+
+    MAGIC | byte order | uint64 count | uint64 offsets[count + 1] | blob
+
+`MappedStrings` maps the file read-only and decodes a single option when it
+is indexed, so a 100k-entry wordlist costs a few pages instead of 100k Python
+strings, and every process using the file shares it through the page cache.
+Pickling only sends the path, so parallel workers and snapshots re-map the
+file instead of copying it.
+
+Bundles reference a file with `{"$strings": "path.strings"}` wherever a
+plain list of strings (a rule, or the options of a weighted rule) is expected;
+the path is resolved like an `$include`.
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections.abc import Sequence
+from typing import Dict, Iterable, Optional
+
+STRINGS_MAGIC = b'RNDSTR1\n'
+_BYTE_ORDER = b'<' if sys.byteorder == 'little' else b'>'
+_COUNT = struct.Struct('=Q')
+_HEADER_SIZE = len(STRINGS_MAGIC) + 8 + _COUNT.size  # byte order padded to 8 bytes
+
+
+def write_strings(path: str, strings: Iterable[str]):
+    """Write `strings` as a .strings file (atomically)"""
+    offsets = array('Q', [0])
+    blob = bytearray()
+    for string in strings:
+        if not isinstance(string, str):
+            raise TypeError(f"Only plain strings can be mapped, got {type(string).__name__}")
+        blob += string.encode('utf-8')
+        offsets.append(len(blob))
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(STRINGS_MAGIC)
+        f.write(_BYTE_ORDER.ljust(8, b'\0'))
+        f.write(_COUNT.pack(len(offsets) - 1))
+        f.write(offsets.tobytes())
+        f.write(blob)
+    os.replace(tmp_path, path)
+
+
+class MappedStrings(Sequence):
+    """Read-only sequence of str backed by a memory-mapped .strings file"""
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        with open(self.path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        header = self._map[:_HEADER_SIZE]
+        if not header.startswith(STRINGS_MAGIC):
+            raise ValueError(f"{path} is not a .strings file")
+        if header[len(STRINGS_MAGIC):len(STRINGS_MAGIC) + 1] != _BYTE_ORDER:
+            raise ValueError(f"{path} was written on a machine with a different byte order")
+        (self._count,) = _COUNT.unpack_from(header, len(STRINGS_MAGIC) + 8)
+        table_end = _HEADER_SIZE + 8 * (self._count + 1)
+        self._offsets = memoryview(self._map)[_HEADER_SIZE:table_end].cast('Q')
+        self._blob_start = table_end
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError('MappedStrings index out of range')
+        base = self._blob_start
+        return self._map[base + self._offsets[index]:base + self._offsets[index + 1]].decode('utf-8')
+
+    def __reduce__(self):
+        return (MappedStrings, (self.path,))
+
+    def __repr__(self):
+        return f"MappedStrings({self.path!r}, {self._count} strings)"
+
+    def close(self):
+        self._offsets.release()
+        self._map.close()
+
+
+# abs path -> (mtime_ns, size, MappedStrings); one mapping per file per process
+_mapped: Dict[str, tuple] = {}
+
+
+def open_strings(path: str) -> MappedStrings:
+    """Map a .strings file, reusing the process-wide mapping while the file is unchanged"""
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    cached = _mapped.get(path)
+    if cached is not None and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        return cached[2]
+    strings = MappedStrings(path)
+    _mapped[path] = (stat.st_mtime_ns, stat.st_size, strings)
+    return strings
+
+
+def externalize_string_lists(bundle_path: str, out_path: str, min_options: int = 1000,
+                             strings_dir: Optional[str] = None) -> Dict[str, str]:
+    """
+    Rewrite a bundle so that every plain-string option list with at least
+    `min_options` entries (after resolving includes) is stored in a .strings
+    file. Returns {rule name: .strings path}.
+    """
+    from include_loader import IncludeResolver, read_json
+
+    generator = dict(read_json(bundle_path))
+    grammar = generator['grammar'] = dict(generator['grammar'])
+    IncludeResolver(os.path.dirname(bundle_path),
+                    os.path.splitext(os.path.basename(bundle_path))[0]).resolve_grammar(grammar)
+
+    out_dir = os.path.dirname(os.path.abspath(out_path))
+    strings_dir = strings_dir or os.path.join(out_dir, os.path.splitext(os.path.basename(out_path))[0])
+    written = {}
+    for rule_name, rule in grammar.items():
+        options = rule.get('options') if isinstance(rule, dict) and rule.get('type') == 'weighted' else rule
+        if not (isinstance(options, list) and len(options) >= min_options
+                and all(isinstance(option, str) for option in options)):
+            continue
+        os.makedirs(strings_dir, exist_ok=True)
+        path = os.path.join(strings_dir, f"{rule_name}.strings")
+        write_strings(path, options)
+        directive = {'$strings': os.path.relpath(path, out_dir)}
+        if options is rule:
+            grammar[rule_name] = directive
+        else:
+            grammar[rule_name] = dict(rule, options=directive)
+        written[rule_name] = path
+
+    with open(out_path, 'w') as f:
+        json.dump(generator, f, indent=2)
+    return written
@@ -0,0 +1,130 @@
+"""
+Process-pool batch generation for the Python RandomizerEngine.
+
+Generation is pure-Python CPU work, so scaling across cores needs processes.
+The compiled generator is pickled once and installed in every worker by the
+pool initializer; afterwards only (start, count) chunk descriptors travel to
+the workers. At most `IN_FLIGHT_PER_WORKER` chunks per worker are pending at
+a time, so a slow consumer holds the pool back instead of piling up results.
+Each item follows the `generate_many` contract (its PRNG state is derived
+from the base seed and its index), so the output is identical to the
+single-process order for any worker count or chunk size.
+"""
+
+import os
+import pickle
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+# Chunks submitted but not yet consumed, per worker: enough to keep every worker busy
+# while the caller drains the head chunk, without buffering results for a slow consumer
+IN_FLIGHT_PER_WORKER = 2
+
+# Engine installed in each worker process by _init_worker
+_worker_engine = None
+_worker_job = None
+
+
+def _engine_payload(engine, generator_name, entry_point, target, context, include_variables=False):
+    """Pickle everything a worker needs to reproduce generate_many for one generator"""
+    custom_modifiers = {}
+    for mod_name, func in engine.modifiers.items():
+        if engine._builtin_modifiers.get(mod_name) is func:
+            continue  # recreated by the worker's own engine
+        try:
+            pickle.dumps(func)
+        except Exception:
+            raise ValueError(
+                f"Modifier '{mod_name}' cannot be sent to worker processes; "
+                "register a module-level function instead of a lambda or closure")
+        custom_modifiers[mod_name] = func
+
+    state = {
+        'selection': engine.selection,
+        'prng': engine.prng,
+        'limits': (engine._expander.max_depth, engine._expander.max_expansions),
+        'generator_name': generator_name,
+        'generator': engine.loaded_generators[generator_name],
+        'compiled': engine._compiled[generator_name],
+        'store': engine._stores[generator_name],
+        'modifiers': custom_modifiers,
+        'modifier_cache': (engine._modifier_cache_size, engine._pure_modifiers),
+        'vectorize': engine.vectorize,
+        'job': (entry_point, target, context, include_variables),
+    }
+    return pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _init_worker(payload):
+    global _worker_engine, _worker_job
+    from RandomizerEngine import RandomizerEngine
+
+    state = pickle.loads(payload)
+    max_depth, max_expansions = state['limits']
+    cache_size, pure_modifiers = state['modifier_cache']
+    engine = RandomizerEngine(selection=state['selection'], prng=state['prng'],
+                              max_depth=max_depth, max_expansions=max_expansions, modifier_cache_size=cache_size,
+                              vectorize=state['vectorize'])
+    name = state['generator_name']
+    engine.loaded_generators[name] = state['generator']
+    engine._compiled[name] = state['compiled']
+    engine._stores[name] = state['store']
+    engine.modifiers.update(state['modifiers'])
+    engine._pure_modifiers = set(pure_modifiers)
+    _worker_engine = engine
+    _worker_job = (name,) + state['job']
+
+
+def _run_chunk(args):
+    seed, start, count = args
+    name, entry_point, target, context, include_variables = _worker_job
+    return list(_worker_engine._generate_many(name, count, seed, entry_point, target, context, start,
+                                              include_variables))
+
+
+def default_chunk_size(n, workers):
+    """A few chunks per worker, so workers finishing at different speeds still share the tail of the batch"""
+    return max(1, min(5000, -(-n // (workers * 4))))
+
+
+def generate_parallel(engine, generator_name, n, seed, workers=None, entry_point=None, target=None,
+                      context=None, start=0, chunk_size=None, include_variables=False, trace=None):
+    """
+    Iterator over `n` items in index order, produced by a pool of worker
+    processes; (output, variables) pairs with include_variables
+    """
+    if trace is not None or engine.traces is not None:
+        # Checked whatever the worker count, so a call does not depend on the machine's core count
+        raise ValueError('Worker processes cannot record traces; use generate_many to trace a batch')
+    return _generate_parallel(engine, generator_name, n, seed, workers, entry_point, target, context, start,
+                              chunk_size, include_variables)
+
+
+def _generate_parallel(engine, generator_name, n, seed, workers, entry_point, target, context, start, chunk_size,
+                       include_variables):
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or n <= 0:
+        yield from engine._generate_many(generator_name, n, seed, entry_point, target, context, start,
+                                         include_variables)
+        return
+
+    chunk_size = chunk_size or default_chunk_size(n, workers)
+    chunks = ((seed, index, min(chunk_size, start + n - index))
+              for index in range(start, start + n, chunk_size))
+    payload = _engine_payload(engine, generator_name, entry_point, target, context or {}, include_variables)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(payload,)) as pool:
+        # A sliding window of futures in index order: a new chunk is submitted only as the
+        # head one is consumed, so memory stays bounded however slowly the caller reads
+        pending = deque(pool.submit(_run_chunk, chunk) for chunk in islice(chunks, IN_FLIGHT_PER_WORKER * workers))
+        try:
+            while pending:
+                items = pending.popleft().result()
+                chunk = next(chunks, None)
+                if chunk is not None:
+                    pending.append(pool.submit(_run_chunk, chunk))
+                yield from items
+        finally:
+            for future in pending:
+                future.cancel()  # the caller stopped early
@@ -0,0 +1,219 @@
+"""
+Pluggable pseudo-random number generators for the Python RandomizerEngine.
+
+Every generator exposes the same small interface:
+
+- `from_seed(seed)`        build a generator from a str/int seed (None → system random)
+- `for_index(seed, index)` generator for item `index` of a seeded batch
+- `index_states(seed)`     callable index -> `for_index(seed, index).getstate()`, with the
+                           per-seed work done once (batches reuse one generator through it)
+- `random()`               next float in [0, 1]
+- `jump(n)`                advance by `n` draws without generating them
+- `substream(key)`         independent child generator, derived without advancing this one
+- `getstate()/setstate()`  picklable state for snapshots and replays (an int for
+                           `LCG32`, a `(state, gamma)` tuple for `SplitMix64`)
+
+`LCG32` is the engine's historical generator and stays bit-compatible with
+older seeds. `SplitMix64` has a 2^64 period, O(1) jump-ahead and cheap stream
+splitting, so batches, workers and sessions can each get their own substream.
+"""
+
+import random
+from typing import Any
+
+MASK32 = 0xFFFFFFFF
+MASK64 = 0xFFFFFFFFFFFFFFFF
+
+
+def xfnv1a(string_seed: str) -> int:
+    """Simple string to int hash for seeding."""
+    h = 2166136261
+    for char in string_seed:
+        h = (h ^ ord(char)) * 16777619
+    return h & MASK32 # Ensure 32-bit unsigned like behavior
+
+
+def fnv1a64(string_seed: str) -> int:
+    """64-bit variant of xfnv1a"""
+    h = 0xCBF29CE484222325
+    for char in string_seed:
+        h = ((h ^ ord(char)) * 0x100000001B3) & MASK64
+    return h
+
+
+def _affine_power(a: int, c: int, n: int, mask: int):
+    """Compose x -> a*x + c with itself n times (O(log n)); returns (A, C)"""
+    acc_a, acc_c = 1, 0
+    while n:
+        if n & 1:
+            acc_a, acc_c = (acc_a * a) & mask, (acc_c * a + c) & mask
+        a, c = (a * a) & mask, (c * a + c) & mask
+        n >>= 1
+    return acc_a, acc_c
+
+
+class LCG32:
+    """Linear Congruential Generator (Numerical Recipes parameters), 2^32 period."""
+    __slots__ = ('state',)
+
+    A = 1664525
+    C = 1013904223
+
+    def __init__(self, state: int):
+        self.state = state & MASK32
+
+    @classmethod
+    def from_seed(cls, seed: Any) -> 'LCG32':
+        if isinstance(seed, str):
+            state = xfnv1a(seed)
+        elif isinstance(seed, int):
+            state = seed & MASK32 # Ensure 32-bit
+        else:
+            state = random.randint(0, MASK32)
+        rng = cls(state)
+        # Call LCG a few times to warm it up, as first few numbers can be less random
+        rng.jump(5)
+        return rng
+
+    @classmethod
+    def for_index(cls, seed: Any, index: int) -> 'LCG32':
+        return cls.from_seed(f"{seed}:{index}")
+
+    @classmethod
+    def index_states(cls, seed: Any):
+        # The hash of f"{seed}:" is shared by every item, the hash of all but the last
+        # digit by runs of ten consecutive items; the warm-up is one affine step
+        prefix = xfnv1a(f"{seed}:")
+        a, c = _affine_power(cls.A, cls.C, 5, MASK32)
+        head = [None, prefix]  # index // 10 and the hash up to its last digit
+
+        def index_state(index: int) -> int:
+            tens, digit = divmod(index, 10)
+            if tens != head[0]:
+                h = prefix
+                if index < 0:
+                    for char in str(index):
+                        h = ((h ^ ord(char)) * 16777619) & MASK32
+                    return (a * h + c) & MASK32
+                if tens:
+                    for char in str(tens):
+                        h = ((h ^ ord(char)) * 16777619) & MASK32
+                head[0], head[1] = tens, h
+            h = ((head[1] ^ (48 + digit)) * 16777619) & MASK32
+            return (a * h + c) & MASK32
+        return index_state
+
+    def random(self) -> float:
+        self.state = (1664525 * self.state + 1013904223) & MASK32
+        return self.state / MASK32
+
+    def jump(self, n: int):
+        a, c = _affine_power(self.A, self.C, n, MASK32)
+        self.state = (a * self.state + c) & MASK32
+
+    def substream(self, key: int) -> 'LCG32':
+        return LCG32.from_seed(f"{self.state}:{key}")
+
+    def getstate(self) -> int:
+        return self.state
+
+    def setstate(self, state: int):
+        self.state = state & MASK32
+
+
+GOLDEN_GAMMA = 0x9E3779B97F4A7C15
+
+
+def _mix64(z: int) -> int:
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK64
+    return z ^ (z >> 31)
+
+
+def _mix_gamma(z: int) -> int:
+    # Odd gamma with enough bit transitions (as in java.util.SplittableRandom)
+    z = ((z ^ (z >> 33)) * 0xFF51AFD7ED558CCD) & MASK64
+    z = ((z ^ (z >> 33)) * 0xC4CEB9FE1A85EC53) & MASK64
+    z = (z ^ (z >> 33)) | 1
+    if bin(z ^ (z >> 1)).count('1') < 24:
+        z ^= 0xAAAAAAAAAAAAAAAA
+    return z
+
+
+class SplitMix64:
+    """SplitMix64 / SplittableRandom: 2^64 period, O(1) jump and stream splitting."""
+    __slots__ = ('state', 'gamma')
+
+    def __init__(self, state: int, gamma: int = GOLDEN_GAMMA):
+        self.state = state & MASK64
+        self.gamma = gamma | 1
+
+    @classmethod
+    def from_seed(cls, seed: Any) -> 'SplitMix64':
+        if isinstance(seed, str):
+            state = fnv1a64(seed)
+        elif isinstance(seed, int):
+            state = seed & MASK64
+        else:
+            state = random.getrandbits(64)
+        return cls(state)
+
+    @classmethod
+    def for_index(cls, seed: Any, index: int) -> 'SplitMix64':
+        return cls.from_seed(seed).substream(index)
+
+    @classmethod
+    def index_states(cls, seed: Any):
+        root = cls.from_seed(seed)
+        state, gamma = root.state, root.gamma
+
+        def index_state(index: int):
+            # substream(index) of the root generator
+            base = (state + (index + 1) * gamma) & MASK64
+            return _mix64(base), _mix_gamma((base + GOLDEN_GAMMA) & MASK64)
+        return index_state
+
+    def random(self) -> float:
+        self.state = (self.state + self.gamma) & MASK64
+        return (_mix64(self.state) >> 11) * 1.1102230246251565e-16  # 2**-53
+
+    def jump(self, n: int):
+        self.state = (self.state + n * self.gamma) & MASK64
+
+    def substream(self, key: int) -> 'SplitMix64':
+        base = (self.state + (key + 1) * self.gamma) & MASK64
+        return SplitMix64(_mix64(base), _mix_gamma((base + GOLDEN_GAMMA) & MASK64))
+
+    def getstate(self):
+        return (self.state, self.gamma)
+
+    def setstate(self, state):
+        self.state, self.gamma = state
+
+
+PRNGS = {
+    'lcg': LCG32,
+    'splitmix64': SplitMix64,
+}
+
+
+def get_prng(name: str):
+    """Look up a generator class by name (or accept a class implementing the interface)"""
+    if isinstance(name, type):
+        return name
+    if name not in PRNGS:
+        raise ValueError(f"Unknown PRNG '{name}', expected one of {tuple(PRNGS)}")
+    return PRNGS[name]
+
+
+def index_states(prng, seed: Any):
+    """`prng.index_states(seed)`, or the equivalent through for_index for generators without it"""
+    states = getattr(prng, 'index_states', None)
+    if states is not None:
+        return states(seed)
+    return lambda index: prng.for_index(seed, index).getstate()
+
+
+def parse_seed(text: str):
+    """Seed given as text (command line, CSV): digits are an integer seed, anything else a string seed"""
+    return int(text) if text.lstrip('-').isdigit() else text
@@ -0,0 +1,257 @@
+"""
+Opt-in per-rule profiling for the Python RandomizerEngine.
+
+`engine.enable_profiling()` swaps the engine's `Expander` for a
+`ProfilingExpander` that records, per generator and rule:
+
+- expansions: how often the rule was expanded
+- inclusive time: from picking an option to the fully rendered text,
+  including nested rules
+- exclusive time: inclusive minus the nested rules' inclusive time
+- choices: how often each option was picked (by option index; options of
+  memory-mapped lists and marker strings are keyed by their text)
+
+`disable_profiling()` puts the plain expander back. Nothing in the default
+path checks for profiling; the cost exists only while it is enabled. The
+instrumented walker expands exactly like `Expander`, so seeded output is
+unchanged. Counters are not locked: profile one thread at a time.
+
+`InstrumentedExpander` is the expander with its hooks turned on and the
+recording left to subclasses; tracer.py builds on it too.
+"""
+
+from collections import Counter
+from time import perf_counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from expander import _PUSHED, _SEQ, _TEXT, Expander
+from grammar_ir import ChoiceRule, ConditionalRule, ErrorText, MappedText, SequentialRule, TextNode, WeightedRule
+
+# Extra fields appended to the expander's frames
+_NAME, _START, _CHILD = -3, -2, -1
+
+
+class RuleStats:
+    __slots__ = ('expansions', 'inclusive', 'exclusive', 'choices')
+
+    def __init__(self):
+        self.expansions = 0
+        self.inclusive = 0.0
+        self.exclusive = 0.0
+        self.choices: Counter = Counter()
+
+
+class RuleNames:
+    """Rule name of a compiled rule node, per compiled generator"""
+    __slots__ = ('_names',)
+
+    def __init__(self):
+        # generator -> (compiled generator, id(rule node) -> rule name); holding the
+        # compiled generator keeps its nodes, and so their ids, alive
+        self._names: Dict[str, Tuple[Any, Dict[int, str]]] = {}
+
+    def __call__(self, engine, generator_name: str, node) -> Optional[str]:
+        compiled = engine._compiled[generator_name]
+        cached = self._names.get(generator_name)
+        if cached is None or cached[0] is not compiled:
+            # First use, or the generator was reloaded and its nodes are new objects
+            cached = self._names[generator_name] = (compiled, {id(rule): name for name, rule in compiled.rules.items()})
+        return cached[1].get(id(node))
+
+    def clear(self):
+        self._names.clear()
+
+
+class OptionIndex:
+    """Option index of the text a rule picked, or the text itself when there is no index"""
+    __slots__ = ('_options',)
+
+    def __init__(self):
+        # id(rule node) -> (rule node, id(text) -> option index); the node is kept so
+        # that its id is not reused by a node of a reloaded generator
+        self._options: Dict[int, Tuple[Any, Optional[Dict[int, int]]]] = {}
+
+    def __call__(self, node, chosen):
+        key = id(node)
+        cached = self._options.get(key)
+        if cached is not None and cached[0] is node:
+            options = cached[1]
+        else:
+            cls = node.__class__
+            if cls is ChoiceRule:
+                texts = [option.text for option in node.options]
+            elif cls is ConditionalRule:
+                texts = [option.text for option in node.options] + [node.fallback]  # fallback: last index
+            elif cls is WeightedRule and isinstance(node.texts, tuple):
+                texts = list(node.texts)
+            else:
+                texts = None
+            options = None if texts is None else {id(text): i for i, text in reversed(list(enumerate(texts)))}
+            self._options[key] = (node, options)
+        if options is not None:
+            index = options.get(id(chosen))
+            if index is not None:
+                return index
+        if chosen.__class__ is MappedText:
+            return chosen.value
+        return chosen if chosen.__class__ is str else repr(chosen)
+
+    def clear(self):
+        self._options.clear()
+
+
+class Profile:
+    """Counters collected while profiling is enabled"""
+
+    def __init__(self):
+        self.rules: Dict[str, Dict[str, RuleStats]] = {}  # generator -> rule -> stats
+        self.rule_name = RuleNames()
+        self.choice_key = OptionIndex()
+
+    def stats(self, generator_name: str, rule_name: str) -> RuleStats:
+        rules = self.rules.get(generator_name)
+        if rules is None:
+            rules = self.rules[generator_name] = {}
+        stats = rules.get(rule_name)
+        if stats is None:
+            stats = rules[rule_name] = RuleStats()
+        return stats
+
+    def clear(self):
+        self.rules.clear()
+        self.rule_name.clear()
+        self.choice_key.clear()
+
+    def report(self, top: Optional[int] = None, sort: str = 'exclusive') -> List[Dict[str, Any]]:
+        """Rows for the hottest rules, sorted by 'exclusive', 'inclusive' or 'expansions'"""
+        if sort not in ('exclusive', 'inclusive', 'expansions'):
+            raise ValueError(f"Unknown sort key '{sort}'")
+        rows = []
+        for generator_name, rules in self.rules.items():
+            for rule_name, stats in rules.items():
+                rows.append({
+                    'generator': generator_name,
+                    'rule': rule_name,
+                    'expansions': stats.expansions,
+                    'inclusive': stats.inclusive,
+                    'exclusive': stats.exclusive,
+                    'choices': dict(stats.choices),
+                })
+        rows.sort(key=lambda row: row[sort], reverse=True)
+        return rows[:top] if top is not None else rows
+
+    def format(self, top: int = 20, sort: str = 'exclusive') -> str:
+        rows = self.report(top, sort)
+        lines = [f"{'rule':40} {'expansions':>10} {'incl ms':>10} {'excl ms':>10} {'us/call':>8}  top choices"]
+        for row in rows:
+            choices = ', '.join(f"{key}:{count}" for key, count in
+                                Counter(row['choices']).most_common(3))
+            per_call = row['inclusive'] / row['expansions'] * 1e6 if row['expansions'] else 0.0
+            name = f"{row['generator']}:{row['rule']}" if len(self.rules) > 1 else row['rule']
+            lines.append(f"{name[:40]:40} {row['expansions']:10} {row['inclusive'] * 1000:10.2f} "
+                         f"{row['exclusive'] * 1000:10.2f} {per_call:8.2f}  {choices}")
+        return '\n'.join(lines)
+
+
+class InstrumentedExpander(Expander):
+    """
+    Expander whose walk passes every rule expansion through `_expand_rule` and
+    every completed rule frame through `_finish` (the `Expander` hooks), with
+    the rule name, start time and child time carried on each frame;
+    subclasses record what they need
+    """
+    __slots__ = ()
+    hooked = True
+
+    def expand(self, engine, rule, context) -> str:
+        stack = []
+        value = self._expand_rule(engine, context, rule, self._root_name(engine, rule, context), stack, 1, None)
+        if value is not _PUSHED:
+            return value
+        return self._run(engine, context, stack, self.max_expansions - 1)
+
+    def render(self, engine, text, context) -> str:
+        stack = []
+        value = self._push_text(engine, text, context, stack, 0, None, None)
+        if value is not _PUSHED:
+            return value
+        return self._run(engine, context, stack, self.max_expansions)
+
+    def _root_name(self, engine, rule, context) -> Optional[str]:
+        raise NotImplementedError
+
+    def _expand_rule(self, engine, context, node, name, stack, depth, parent):
+        raise NotImplementedError
+
+    def _push(self, engine, chosen, context, stack, depth):
+        # Texts of sequential rules: frames without a rule name of their own
+        return self._push_text(engine, chosen, context, stack, depth, None, None)
+
+    def _push_text(self, engine, chosen, context, stack, depth, name, start):
+        """Expander._push with the rule name, start time and child time carried on the frame"""
+        cls = chosen.__class__
+        if cls is TextNode:
+            if chosen.static is not None:
+                return chosen.static
+            if not chosen.has_refs:
+                return chosen.render(engine, context)
+            stack.append([_TEXT, chosen, 0, [], chosen.has_hash, depth, name, start, 0.0])
+            return _PUSHED
+        if cls is MappedText:
+            if '#' not in chosen.value:
+                return chosen.value
+            return self._push_text(engine, engine._text_node(chosen.value, context), context, stack, depth,
+                                   name, start)
+        if cls is SequentialRule:
+            if not chosen.texts:
+                return ''
+            stack.append([_SEQ, chosen, 0, '', depth, name, start, 0.0])
+            return _PUSHED
+        if cls is ErrorText:
+            chosen.render(engine, context)  # raises the original error
+        return chosen
+
+
+class ProfilingExpander(InstrumentedExpander):
+    """Expander that times and counts every rule expansion (see module docstring)"""
+    __slots__ = ('profile',)
+
+    def __init__(self, max_depth: int, max_expansions: int, profile: Profile):
+        super().__init__(max_depth, max_expansions)
+        self.profile = profile
+
+    def _root_name(self, engine, rule, context):
+        return self.profile.rule_name(engine, context.generator_name, rule)
+
+    def _expand_rule(self, engine, context, node, name, stack, depth, parent):
+        start = perf_counter()
+        chosen = node.select(engine, context)
+        if name is not None:
+            self.profile.stats(context.generator_name, name).choices[self.profile.choice_key(node, chosen)] += 1
+        value = self._push_text(engine, chosen, context, stack, depth, name, start)
+        if value is not _PUSHED:
+            elapsed = perf_counter() - start
+            if name is not None:
+                stats = self.profile.stats(context.generator_name, name)
+                stats.expansions += 1
+                stats.inclusive += elapsed
+                stats.exclusive += elapsed
+            if parent is not None:
+                parent[_CHILD] += elapsed
+        return value
+
+    def _finish(self, frame, stack, generator_name):
+        """Record a completed frame and hand its time to the enclosing one"""
+        name = frame[_NAME]
+        parent = stack[-1] if stack else None
+        if name is None:
+            if parent is not None:
+                parent[_CHILD] += frame[_CHILD]
+            return
+        elapsed = perf_counter() - frame[_START]
+        stats = self.profile.stats(generator_name, name)
+        stats.expansions += 1
+        stats.inclusive += elapsed
+        stats.exclusive += elapsed - frame[_CHILD]
+        if parent is not None:
+            parent[_CHILD] += elapsed
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Command line for the Python RandomizerEngine.
+
+    randomizer generate BUNDLE... [-n N] [--seed S] [--entry-point E | --target T] [--format text|jsonl|csv]
+    randomizer batch BUNDLE... -n N [--seed S] [--workers W] [--format ...] [-o FILE]
+    randomizer export BUNDLE OUTPUT -n N [--seed S] [--workers W] [--resume]    (exporter.py)
+    randomizer analyze BUNDLE... [--json] [--space]                           (grammar_analyzer.py)
+    randomizer bench [BUNDLE...] [-o results.json] [--baseline old.json]      (benchmarks/bench_suite.py)
+
+`generate` runs the engine's own seeded stream (variables carry over from
+one output to the next, like `engine.generate`). `batch` streams a
+reproducible `generate_many` / `generate_parallel` batch, where item i
+depends only on (seed, i). Results go to stdout or `-o FILE`, so the command
+fits shell pipelines. `--profile [TOP]` on either command prints the hottest
+rules to stderr (see profiler.py); a profiled batch runs in-process. Only
+argparse is imported before a subcommand is chosen; the engine, exporter and
+analyzer load on demand.
+
+Without packaging, run it as `python legacy-python/randomizer.py ...`; a console
+script entry point can target `randomizer:main`.
+"""
+
+import argparse
+import os
+import sys
+
+_DESCRIPTION = 'Generate text from RandomizerEngine generator bundles'
+
+# Subcommands whose own command line lives in another module: (module, directory, help)
+_DELEGATED = {
+    'analyze': ('grammar_analyzer', '', 'statically analyze bundles (see grammar_analyzer.py --help)'),
+    'export': ('exporter', '', 'write a batch to a .jsonl/.csv file, resumable (see exporter.py --help)'),
+    'bench': ('bench_suite', 'benchmarks', 'benchmark hot paths, compare with a baseline (see bench_suite.py --help)'),
+}
+
+
+def _seed(text):
+    from prng import parse_seed
+    return parse_seed(text)
+
+
+def _load(paths):
+    """Engine with every bundle loaded (load messages suppressed) and their generator names"""
+    import contextlib
+    import io
+
+    from RandomizerEngine import RandomizerEngine
+
+    engine = RandomizerEngine()
+    names = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for path in paths:
+            names.append(engine.load_generator_file(path))
+    return engine, names
+
+
+class _Writer:
+    """Rows to a text stream as plain lines, JSON lines or CSV"""
+
+    def __init__(self, stream, fmt):
+        self.stream = stream
+        self.fmt = fmt
+        self._csv = None
+        if fmt == 'csv':
+            import csv
+            self._csv = csv.writer(stream)
+            self._csv.writerow(('generator', 'index', 'seed', 'output'))
+        elif fmt == 'jsonl':
+            import json
+            self._dumps = json.dumps
+
+    def write(self, generator, index, seed, output):
+        if self.fmt == 'text':
+            self.stream.write(output)
+            self.stream.write('\n')
+        elif self.fmt == 'jsonl':
+            self.stream.write(self._dumps({'generator': generator, 'index': index, 'seed': seed, 'output': output},
+                                          ensure_ascii=False))
+            self.stream.write('\n')
+        else:
+            self._csv.writerow((generator, index, seed, output))
+
+
+def _report_profile(engine, args):
+    if args.profile:
+        print(engine.disable_profiling().format(args.profile), file=sys.stderr)
+
+
+def _generate(args, out):
+    engine, names = _load(args.bundles)
+    if args.profile:
+        engine.enable_profiling()
+    if args.seed is not None:
+        engine.set_seed(args.seed)
+    writer = _Writer(out, args.format)
+    options = {'entry_point': args.entry_point, 'target': args.target}
+    for name in names:
+        for index in range(args.count):
+            writer.write(name, index, args.seed, engine.generate(name, options))
+    _report_profile(engine, args)
+
+
+def _batch(args, out):
+    import random
+
+    engine, names = _load(args.bundles)
+    seed = args.seed if args.seed is not None else random.getrandbits(32)
+    writer = _Writer(out, args.format)
+    if args.profile:
+        engine.enable_profiling()
+    for name in names:
+        if args.workers and args.workers > 1 and not args.profile:
+            outputs = engine.generate_parallel(name, args.count, workers=args.workers, seed=seed,
+                                               entry_point=args.entry_point, target=args.target)
+        else:
+            outputs = engine.generate_many(name, args.count, seed=seed, entry_point=args.entry_point,
+                                           target=args.target)
+        for index, output in enumerate(outputs):
+            writer.write(name, index, seed, output)
+    _report_profile(engine, args)
+
+
+def _parser():
+    parser = argparse.ArgumentParser(prog='randomizer', description=_DESCRIPTION)
+    commands = parser.add_subparsers(dest='command', metavar='COMMAND', required=True)
+
+    def job(name, help, count_default):
+        sub = commands.add_parser(name, help=help, description=help)
+        sub.add_argument('bundles', nargs='+', metavar='BUNDLE', help='generator bundle .json files')
+        sub.add_argument('-n', '--count', type=int, default=count_default, help='outputs per bundle')
+        sub.add_argument('-s', '--seed', type=_seed, help='seed (digits are an integer seed)')
+        group = sub.add_mutually_exclusive_group()
+        group.add_argument('-e', '--entry-point', help='rule name or template to start from')
+        group.add_argument('-t', '--target', help='targeting template name')
+        return sub
+
+    for name in ('generate', 'batch'):
+        help = ('generate from the seeded engine stream' if name == 'generate'
+                else 'generate a reproducible batch (item i depends only on seed and i)')
+        sub = job(name, help, 1 if name == 'generate' else 10)
+        sub.add_argument('-f', '--format', choices=('text', 'jsonl', 'csv'), default='text',
+                         help='output rows (default: one output per line)')
+        sub.add_argument('-o', '--output', help='write to this file instead of stdout')
+        sub.add_argument('--profile', type=int, nargs='?', const=20, default=0, metavar='TOP',
+                         help='print the TOP hottest rules (default 20) to stderr; generates in-process')
+        if name == 'batch':
+            sub.add_argument('-w', '--workers', type=int, help='worker processes')
+    for name, (_, _, help) in _DELEGATED.items():
+        commands.add_parser(name, help=help, add_help=False)
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv and argv[0] in _DELEGATED:
+        module_name, directory, _ = _DELEGATED[argv[0]]
+        if directory:
+            sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), directory))
+        return __import__(module_name).main(argv[1:])
+
+    args = _parser().parse_args(argv)
+    run = {'generate': _generate, 'batch': _batch}[args.command]
+    output = getattr(args, 'output', None)
+    try:
+        if output:
+            with open(output, 'w', encoding='utf-8', newline='') as f:
+                run(args, f)
+        else:
+            run(args, sys.stdout)
+            sys.stdout.flush()
+    except BrokenPipeError:
+        # The reader went away (e.g. `| head`); stop quietly instead of printing a traceback
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,90 @@
+"""
+Per-call generation state for the Python RandomizerEngine.
+
+Loaded and compiled grammars are shared read-only by everything that uses an
+engine. Everything a generation mutates (the PRNG and variable values) lives
+in a `GenerationContext`, so many threads or asyncio tasks can generate from
+one engine concurrently, each through its own `GenerationSession`, without
+locks on the hot path and without seeing each other's variable changes.
+"""
+
+import random
+from typing import Any, Dict, List, Optional
+
+from variable_store import UNSET
+
+
+class GenerationContext:
+    """State threaded through one generation: PRNG, live values and the start-of-run snapshot"""
+    __slots__ = ('generator_name', 'store', 'values', 'snapshot', 'rng', 'extra', 'trace')
+
+    def __init__(self, generator_name: str, store, values: List[Any], snapshot: List[Any], rng, extra=None,
+                 trace=None):
+        self.generator_name = generator_name
+        self.store = store          # slot names (shared, read-only during generation)
+        self.values = values        # live values written by actions
+        self.snapshot = snapshot    # values as of the start of this generation
+        self.rng = rng
+        self.extra = extra or {}    # caller-supplied options['context']
+        self.trace = trace          # TraceLog recording this generation, or None
+
+    def random(self) -> float:
+        rng = self.rng
+        if rng is not None:
+            return rng.random()
+        # Fallback to Python's default random if no seed was set
+        return random.random()
+
+
+class GenerationSession:
+    """
+    Independent PRNG stream and variable values over a shared engine.
+
+    Variables start from the engine's values for a generator the first time the
+    session uses it; afterwards the session's actions only change its own copy.
+    """
+
+    def __init__(self, engine, seed: Any = None, rng=None):
+        self.engine = engine
+        if rng is None and seed is not None:
+            rng = engine.prng.from_seed(seed)
+        self.rng = rng
+        self._values: Dict[str, List[Any]] = {}
+
+    def _values_for(self, generator_name: str) -> List[Any]:
+        store = self.engine._stores[generator_name]
+        values = self._values.get(generator_name)
+        if values is None:
+            values = self._values[generator_name] = store.snapshot()
+        elif len(values) < len(store.values):
+            # The generator was reloaded or compiled new text since this session started
+            values.extend([UNSET] * (len(store.values) - len(values)))
+        return values
+
+    def generate(self, generator_name: str, options: Optional[Dict[str, Any]] = None) -> str:
+        """Same as RandomizerEngine.generate, using this session's PRNG and variables"""
+        return self.engine._generate(generator_name, options, self)
+
+    def generate_targets(self, generator_name: str, targets: Optional[List[str]] = None,
+                         context: Optional[Dict[str, Any]] = None, trace=None) -> Dict[str, str]:
+        """Same as RandomizerEngine.generate_targets, using this session's PRNG and variables"""
+        return self.engine._generate_targets(generator_name, targets, context, self, trace)
+
+    def get_variables(self, generator_name: str) -> Dict[str, Any]:
+        store = self.engine._stores[generator_name]
+        values = self._values_for(generator_name)
+        return {name: value for name, value in zip(store.names, values) if value is not UNSET}
+
+    def set_variable(self, generator_name: str, var_name: str, value: Any):
+        store = self.engine._stores[generator_name]
+        slot = store.slots.get(var_name)
+        if slot is None:
+            raise KeyError(f"Variable '{var_name}' is not used by generator '{generator_name}'")
+        self._values_for(generator_name)[slot] = value
+
+    def reset(self, generator_name: Optional[str] = None):
+        """Forget session variables so they are copied from the engine again"""
+        if generator_name is None:
+            self._values.clear()
+        else:
+            self._values.pop(generator_name, None)
@@ -0,0 +1,135 @@
+"""
+Binary snapshots of loaded generators for the Python RandomizerEngine.
+
+A snapshot holds the fully include-resolved bundles together with their
+compiled rules (alias tables, cumulative weights, entry-point texts, targeting
+placeholders) and variable stores, so a short-lived process can skip JSON
+parsing, include resolution, validation and compilation.
+
+File layout:
+
+    MAGIC | uint32 header length | JSON header | pickle payload
+
+The header records the schema version, the Python version that wrote the
+pickle and a SHA-256 of every source file (bundle and includes), so a stale
+snapshot or one from another interpreter is refused instead of silently used.
+Snapshots are pickles: only load files you created yourself.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import struct
+import sys
+from typing import Any, Dict, List, Optional
+
+SNAPSHOT_MAGIC = b'RNDSNAP\n'
+SNAPSHOT_VERSION = 6
+
+_LENGTH = struct.Struct('>I')
+
+
+class SnapshotError(ValueError):
+    """The file is not a snapshot, has another schema or Python version, or is older than its sources"""
+
+
+def file_hash(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _warm(engine, name):
+    """Compile everything a generation could otherwise compile lazily"""
+    generator = engine.loaded_generators[name]
+    compiled = engine._compiled[name]
+    for entry in generator['entry_points'].values():
+        if isinstance(entry, str) and '#' in entry:
+            compiled.text(entry)
+    for target_config in (generator.get('targeting') or {}).values():
+        if isinstance(target_config, dict) and isinstance(target_config.get('template'), str):
+            compiled.target_placeholders(target_config['template'])
+
+
+def save_snapshot(engine, path: str, generator_names: Optional[List[str]] = None):
+    names = list(generator_names or engine.loaded_generators)
+    bundles = {}
+    sources = {}
+    for name in names:
+        if name not in engine.loaded_generators:
+            raise ValueError(f"Generator '{name}' not found")
+        _warm(engine, name)
+        bundles[name] = {
+            'generator': engine.loaded_generators[name],
+            'compiled': engine._compiled[name],
+            'store': engine._stores[name],
+            'assets': engine.assets.get(name),
+            'sources': engine._sources.get(name, []),
+        }
+        for source in engine._sources.get(name, []):
+            if source not in sources and os.path.isfile(source):
+                sources[source] = file_hash(source)
+
+    header = json.dumps({
+        'version': SNAPSHOT_VERSION,
+        'python': list(sys.version_info[:2]),
+        'generators': names,
+        'sources': sources,
+    }).encode('utf-8')
+    payload = pickle.dumps(bundles, protocol=pickle.HIGHEST_PROTOCOL)
+
+    # Write to a temporary file first so readers never see a partial snapshot
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(_LENGTH.pack(len(header)))
+        f.write(header)
+        f.write(payload)
+    os.replace(tmp_path, path)
+
+
+def _read(path: str):
+    with open(path, 'rb') as f:
+        data = f.read()
+    if not data.startswith(SNAPSHOT_MAGIC):
+        raise SnapshotError(f"{path} is not a generator snapshot")
+    offset = len(SNAPSHOT_MAGIC)
+    (header_length,) = _LENGTH.unpack_from(data, offset)
+    offset += _LENGTH.size
+    header = json.loads(data[offset:offset + header_length].decode('utf-8'))
+    if header.get('version') != SNAPSHOT_VERSION:
+        raise SnapshotError(
+            f"{path} has snapshot version {header.get('version')}, expected {SNAPSHOT_VERSION}")
+    return header, data, offset + header_length
+
+
+def read_header(path: str) -> Dict[str, Any]:
+    """Schema version, Python version, generator names and source hashes of a snapshot"""
+    return _read(path)[0]
+
+
+def load_snapshot(engine, path: str, validate: bool = True) -> List[str]:
+    header, data, offset = _read(path)
+    python = tuple(header.get('python') or ())
+    if python != tuple(sys.version_info[:2]):
+        raise SnapshotError(
+            f"{path} was written by Python {'.'.join(map(str, python)) or 'unknown'}, "
+            f"expected {sys.version_info[0]}.{sys.version_info[1]}")
+    if validate:
+        # Sources that are not deployed next to the snapshot cannot be checked
+        for source, digest in header['sources'].items():
+            if os.path.isfile(source) and file_hash(source) != digest:
+                raise SnapshotError(f"Snapshot {path} is stale: {source} has changed")
+
+    bundles = pickle.loads(data[offset:])
+    for name, bundle in bundles.items():
+        store = bundle['store']
+        engine._stores[name] = store
+        engine.variables.adopt(name, store)
+        engine.loaded_generators[name] = bundle['generator']
+        engine._compiled[name] = bundle['compiled']
+        engine._drop_batch_plans(name)
+        engine._sources[name] = bundle['sources']
+        if bundle['assets'] is not None:
+            engine.assets[name] = bundle['assets']
+    return list(bundles)
@@ -0,0 +1,224 @@
+"""
+Opt-in expansion traces for the Python RandomizerEngine.
+
+A call asks for a trace by passing a `TraceLog` (`generate(name, {'trace':
+log})`, or `trace=log` to `generate_many`, `generate_targets`,
+`generate_many_targets` and the session methods). The log travels on the
+call's `GenerationContext`, and only calls carrying one are walked by the
+`TracingExpander`, which appends one trace per generated output:
+
+- rule path: every rule expansion in order, with its nesting depth
+- chosen option: the index of the picked option (the fallback of a
+  conditional rule is the last index; -1 when a rule has no option index,
+  e.g. memory-mapped lists)
+- fired actions: the actions of each chosen option that has any
+- variable deltas: the variables whose value differs from the start of the
+  generation, with their new values
+
+The log is encoded in flat arrays: three ints per rule expansion (rule id,
+option, depth) and one offset per output, so traces cost 12 bytes per rule
+expansion plus the changed variables. `log[i]` decodes trace i on access.
+Actions are recovered from the compiled option a trace points at, not stored.
+
+`engine.enable_tracing()` sets a default log for the calls that do not pass
+one, until `disable_tracing()`; untraced calls keep the plain expander.
+Seeded output is unchanged. Worker processes cannot trace, so
+`generate_parallel` raises ValueError while a trace is requested. A log is not
+locked: record into one log from one thread at a time.
+"""
+
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+from grammar_ir import INCREMENT, MULTIPLY, SET, ChoiceRule, ConditionalRule
+from profiler import InstrumentedExpander, OptionIndex, RuleNames
+
+_ACTION_NAMES = {SET: 'set', INCREMENT: 'increment', MULTIPLY: '$multiply'}
+
+
+class Trace:
+    """View of one output's trace in a TraceLog"""
+    __slots__ = ('_log', '_index')
+
+    def __init__(self, log: 'TraceLog', index: int):
+        self._log = log
+        self._index = index
+
+    @property
+    def generator(self) -> str:
+        return self._log.generators[self._log.trace_generators[self._index]]
+
+    def _events(self):
+        log = self._log
+        start = log.starts[self._index] * 3
+        end = log.starts[self._index + 1] * 3 if self._index + 1 < len(log.starts) else len(log.events)
+        return log.events[start:end]
+
+    @property
+    def events(self) -> List[Tuple[str, int, int]]:
+        """(rule, option index, depth) for every rule expansion, in order"""
+        rules = self._log.rules
+        events = self._events()
+        return [(rules[events[i]][1], events[i + 1], events[i + 2]) for i in range(0, len(events), 3)]
+
+    @property
+    def path(self) -> List[str]:
+        return [rule for rule, _, _ in self.events]
+
+    @property
+    def options(self) -> List[int]:
+        return [option for _, option, _ in self.events]
+
+    @property
+    def actions(self) -> List[Tuple[str, int, List[Tuple[str, str, Any]]]]:
+        """(rule, option index, [(action, variable, argument), ...]) for each chosen option with actions"""
+        log = self._log
+        names = log.variable_names[log.trace_generators[self._index]]
+        events = self._events()
+        fired = []
+        for i in range(0, len(events), 3):
+            rule_id, option = events[i], events[i + 1]
+            node = log.nodes[rule_id]
+            if option < 0 or node.__class__ not in (ChoiceRule, ConditionalRule) or option >= len(node.options):
+                continue
+            actions = node.options[option].actions
+            if actions:
+                fired.append((log.rules[rule_id][1], option,
+                              [(_ACTION_NAMES[op], names[slot], argument) for op, slot, argument in actions]))
+        return fired
+
+    @property
+    def variables(self) -> Dict[str, Any]:
+        """Variables changed by this output, with their values at its end"""
+        deltas = self._log.deltas[self._index]
+        if not deltas:
+            return {}
+        names = self._log.variable_names[self._log.trace_generators[self._index]]
+        return {names[deltas[i]]: deltas[i + 1] for i in range(0, len(deltas), 2)}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'generator': self.generator,
+            'events': [list(event) for event in self.events],
+            'actions': [[rule, option, [list(action) for action in actions]]
+                        for rule, option, actions in self.actions],
+            'variables': self.variables,
+        }
+
+    def __repr__(self):
+        return f"Trace({self.generator!r}, {self.path!r})"
+
+
+class TraceLog:
+    """Traces of the outputs generated while tracing is enabled, in generation order"""
+
+    def __init__(self):
+        self.rules: List[Tuple[str, str]] = []          # rule id -> (generator, rule)
+        self.nodes: List[Any] = []                      # rule id -> compiled rule node
+        self.generators: List[str] = []                 # generator id -> name
+        self.variable_names: List[List[str]] = []       # generator id -> variable slot names
+        self.events = array('i')                        # rule id, option index, depth per expansion
+        self.starts = array('Q')                        # first expansion of each trace
+        self.trace_generators = array('H')              # generator id of each trace
+        self.deltas: List[Optional[tuple]] = []         # (slot, value, slot, value, ...) per trace
+        self._rule_ids: Dict[str, Dict[str, int]] = {}
+        self._generator_ids: Dict[str, int] = {}
+        self._context = None
+        self._values = None
+        self.rule_name = RuleNames()
+        self.option_index = OptionIndex()
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, index: int) -> Trace:
+        if index < 0:
+            index += len(self.starts)
+        if not 0 <= index < len(self.starts):
+            raise IndexError('trace index out of range')
+        return Trace(self, index)
+
+    def __iter__(self):
+        for index in range(len(self.starts)):
+            yield Trace(self, index)
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the encoded arrays (the delta tuples are extra)"""
+        return sum(a.itemsize * len(a) for a in (self.events, self.starts, self.trace_generators))
+
+    def clear(self):
+        del self.events[:], self.starts[:], self.trace_generators[:]
+        self.deltas.clear()
+        self._context = self._values = None
+
+    def _open(self, context):
+        """Start a trace for a new generation context; later calls with the same context extend it"""
+        # Batches reuse one context, with a fresh values list per item
+        if context is self._context and context.values is self._values:
+            return
+        self._context, self._values = context, context.values
+        generator_name = context.generator_name
+        generator_id = self._generator_ids.get(generator_name)
+        if generator_id is None or self.variable_names[generator_id] is not context.store.names:
+            # First trace of the generator, or it was unloaded and loaded again with new slots
+            generator_id = self._generator_ids[generator_name] = len(self.generators)
+            self.generators.append(generator_name)
+            self.variable_names.append(context.store.names)
+        self.starts.append(len(self.events) // 3)
+        self.trace_generators.append(generator_id)
+        self.deltas.append(None)
+
+    def _close(self, context):
+        """Record the variables the current trace's generation has changed so far"""
+        if context is not self._context or context.values is not self._values:
+            return
+        snapshot = context.snapshot
+        changed = []
+        for slot, value in enumerate(context.values):
+            if slot >= len(snapshot) or value != snapshot[slot]:
+                changed += (slot, value)
+        self.deltas[-1] = tuple(changed) if changed else None
+
+    def _record(self, generator_name, rule_name, node, chosen, depth):
+        ids = self._rule_ids.get(generator_name)
+        if ids is None:
+            ids = self._rule_ids[generator_name] = {}
+        rule_id = ids.get(rule_name)
+        if rule_id is None or self.nodes[rule_id] is not node:
+            # A new rule, or the rule of a reloaded generator: the id also fixes its options
+            rule_id = ids[rule_name] = len(self.rules)
+            self.rules.append((generator_name, rule_name))
+            self.nodes.append(node)
+        option = self.option_index(node, chosen)
+        self.events.extend((rule_id, option if option.__class__ is int else -1, depth))
+
+
+class TracingExpander(InstrumentedExpander):
+    """Expander that records every rule expansion into the context's TraceLog (see module docstring)"""
+    __slots__ = ()
+
+    def expand(self, engine, rule, context) -> str:
+        log = context.trace
+        log._open(context)
+        try:
+            return InstrumentedExpander.expand(self, engine, rule, context)
+        finally:
+            log._close(context)
+
+    def render(self, engine, text, context) -> str:
+        log = context.trace
+        log._open(context)
+        try:
+            return InstrumentedExpander.render(self, engine, text, context)
+        finally:
+            log._close(context)
+
+    def _root_name(self, engine, rule, context):
+        return context.trace.rule_name(engine, context.generator_name, rule)
+
+    def _expand_rule(self, engine, context, node, name, stack, depth, parent):
+        chosen = node.select(engine, context)
+        if name is not None:
+            context.trace._record(context.generator_name, name, node, chosen, depth)
+        return self._push_text(engine, chosen, context, stack, depth, name, None)
@@ -0,0 +1,137 @@
+"""
+Per-generator variable storage for the Python RandomizerEngine.
+
+Each loaded generator owns a `VariableStore`: variable names are resolved to
+integer slots when the grammar is compiled, and values live in a plain list,
+so conditions, actions and `#var#` substitution index a list instead of
+building `"{generator}.{var}"` keys. `VariablesView` keeps the historical flat
+`engine.variables["Generator Name.var"]` mapping available on top of the stores.
+"""
+
+from collections.abc import MutableMapping
+from typing import Any, Dict, List
+
+
+class _Unset:
+    """Marker for a slot that has a name but no value (e.g. only referenced by an action)"""
+    __slots__ = ()
+
+    def __bool__(self):
+        return False
+
+    def __repr__(self):
+        return 'UNSET'
+
+    def __reduce__(self):
+        return 'UNSET'
+
+
+UNSET = _Unset()
+
+
+class VariableStore:
+    """Slot-indexed variable values for one generator"""
+    __slots__ = ('slots', 'names', 'values')
+
+    def __init__(self):
+        self.slots: Dict[str, int] = {}
+        self.names: List[str] = []
+        self.values: List[Any] = []
+
+    def slot(self, name: str) -> int:
+        """Slot index for `name`, allocating an unset slot on first use"""
+        index = self.slots.get(name)
+        if index is None:
+            index = len(self.names)
+            self.slots[name] = index
+            self.names.append(name)
+            self.values.append(UNSET)
+        return index
+
+    def get(self, name: str, default=None):
+        index = self.slots.get(name)
+        if index is None:
+            return default
+        value = self.values[index]
+        return default if value is UNSET else value
+
+    def set(self, name: str, value: Any):
+        self.values[self.slot(name)] = value
+
+    def unset(self, name: str):
+        index = self.slots.get(name)
+        if index is None or self.values[index] is UNSET:
+            raise KeyError(name)
+        self.values[index] = UNSET
+
+    def snapshot(self) -> List[Any]:
+        return self.values[:]
+
+    def restore(self, snapshot: List[Any]):
+        self.values[:len(snapshot)] = snapshot
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {name: value for name, value in zip(self.names, self.values) if value is not UNSET}
+
+
+class VariablesView(MutableMapping):
+    """Flat `"{generator_name}.{var_name}"` view over the per-generator stores"""
+
+    def __init__(self, stores: Dict[str, VariableStore]):
+        self._stores = stores
+        # Keys written for generators that are not loaded (yet)
+        self._orphans: Dict[str, Any] = {}
+
+    def _resolve(self, key):
+        best = None
+        if isinstance(key, str):
+            for generator_name in self._stores:
+                if key.startswith(generator_name) and key[len(generator_name):len(generator_name) + 1] == '.':
+                    if best is None or len(generator_name) > len(best):
+                        best = generator_name
+        if best is None:
+            return None, None
+        return self._stores[best], key[len(best) + 1:]
+
+    def __getitem__(self, key):
+        store, name = self._resolve(key)
+        if store is None:
+            return self._orphans[key]
+        value = store.get(name, UNSET)
+        if value is UNSET:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        store, name = self._resolve(key)
+        if store is None:
+            self._orphans[key] = value
+        else:
+            store.set(name, value)
+
+    def __delitem__(self, key):
+        store, name = self._resolve(key)
+        if store is None:
+            del self._orphans[key]
+        else:
+            try:
+                store.unset(name)
+            except KeyError:
+                raise KeyError(key)
+
+    def __iter__(self):
+        for generator_name, store in list(self._stores.items()):
+            for name, value in zip(store.names, store.values):
+                if value is not UNSET:
+                    yield f"{generator_name}.{name}"
+        yield from list(self._orphans)
+
+    def __len__(self):
+        return (sum(1 for store in self._stores.values() for value in store.values if value is not UNSET)
+                + len(self._orphans))
+
+    def adopt(self, generator_name: str, store: VariableStore):
+        """Move orphaned keys that belong to a newly loaded generator into its store"""
+        prefix = f"{generator_name}."
+        for key in [k for k in self._orphans if isinstance(k, str) and k.startswith(prefix)]:
+            store.set(key[len(prefix):], self._orphans.pop(key))
@@ -0,0 +1,483 @@
+"""
+NumPy batch sampler for flat grammars in the Python RandomizerEngine.
+
+Many bundles are a template whose placeholders point at plain option lists,
+perhaps one level down (a rule that picks one of several such templates).
+For those, `generate_many` does not need the expander: every rule expansion
+is a single uniform draw mapped to an option index. This module builds a
+plan for such an entry point once, then for each chunk of the batch
+
+- derives the PRNG stream of every item at once (`LCG32` / `SplitMix64`
+  ported to uint64 arrays; both can compute draw k of item i directly),
+- maps the draws of each rule to option indices for all items together
+  (`searchsorted` over the cumulative weights, the alias table, or the
+  sequential weight scan, with the same float operations as the engine),
+- splits the items by chosen option only where the options differ in shape,
+- and joins the strings at the end, one %-format per item and template.
+
+Items are the same strings `generate_many` produces without it (item i is
+still a pure function of (seed, i)). Plans are only built for entry points
+that never read or change variables mid-generation: no conditions, actions,
+sequential or memory-mapped rules, recursion, or impure modifiers. Variable
+placeholders read the batch's starting values. Anything else, a custom PRNG,
+an active profiler/tracer, small batches or a missing numpy fall back to the
+scalar loop. numpy is optional; without it this module imports but
+`vectorized_batch` always returns None.
+"""
+
+from typing import Any, Iterator, Optional
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency: every batch takes the scalar path
+    np = None
+
+from expander import Expander
+from grammar_ir import (ChoiceRule, CompiledTarget, LiteralRule, RuleRef, TextNode, TextRule, VarRef,
+                        WeightedRule)
+from prng import GOLDEN_GAMMA, MASK32, LCG32, SplitMix64, _affine_power, xfnv1a
+from session import GenerationContext
+
+# Below this many items the scalar loop is as fast as building the arrays
+VECTORIZE_MIN_BATCH = 512
+# Items per chunk: the first chunk is small so lazy consumers (generate_unique)
+# pay little up front, later ones double up to the maximum
+FIRST_CHUNK = 1024
+MAX_CHUNK = 1 << 16
+
+
+class _Ineligible(Exception):
+    """Raised while planning when an entry point needs the scalar engine"""
+
+
+# --- PRNG streams ----------------------------------------------------------
+
+class _LCGDraws:
+    """`LCG32.for_index(seed, i)` for a run of items: seeds hashed digit by digit, draws by jump-ahead"""
+
+    def __init__(self, seed: Any, first: int, count: int, max_draws: int):
+        prefix = xfnv1a(f"{seed}:")
+        states = np.empty(count, dtype=np.uint64)
+        pos = 0
+        lo, end = first, first + count
+        while lo < end:
+            digits = len(str(lo))
+            hi = min(end, 10 ** digits)
+            index = np.arange(lo, hi, dtype=np.uint64)
+            h = np.full(hi - lo, prefix, dtype=np.uint64)
+            # xfnv1a over the decimal digits of the index; masking every step keeps the low 32 bits exact
+            for power in range(digits - 1, -1, -1):
+                digit = (index // np.uint64(10 ** power)) % np.uint64(10)
+                h = ((h ^ (digit + np.uint64(48))) * np.uint64(16777619)) & np.uint64(MASK32)
+            states[pos:pos + hi - lo] = h
+            pos += hi - lo
+            lo = hi
+        self.states = states
+        # Draw k (1-based) of an item is state -> A_k * state + C_k after the 5 warm-up steps of from_seed
+        steps = [_affine_power(LCG32.A, LCG32.C, k + 6, MASK32) for k in range(max_draws)]
+        self.mul = np.array([a for a, _ in steps], dtype=np.uint64)
+        self.add = np.array([c for _, c in steps], dtype=np.uint64)
+
+    def draw(self, items, offsets):
+        """Next float of each item, `offsets` being the draws it has already made"""
+        state = (self.mul[offsets] * self.states[items] + self.add[offsets]) & np.uint64(MASK32)
+        return state / float(MASK32)
+
+
+def _mix64(z):
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def _popcount64(x):
+    x = x - ((x >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    x = (x & np.uint64(0x3333333333333333)) + ((x >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    x = (x + (x >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return (x * np.uint64(0x0101010101010101)) >> np.uint64(56)
+
+
+def _mix_gamma(z):
+    z = (z ^ (z >> np.uint64(33))) * np.uint64(0xFF51AFD7ED558CCD)
+    z = (z ^ (z >> np.uint64(33))) * np.uint64(0xC4CEB9FE1A85EC53)
+    z = (z ^ (z >> np.uint64(33))) | np.uint64(1)
+    sparse = _popcount64(z ^ (z >> np.uint64(1))) < np.uint64(24)
+    return np.where(sparse, z ^ np.uint64(0xAAAAAAAAAAAAAAAA), z)
+
+
+class _SplitMixDraws:
+    """`SplitMix64.for_index(seed, i)` for a run of items: one substream per item"""
+
+    def __init__(self, seed: Any, first: int, count: int, max_draws: int):
+        root = SplitMix64.from_seed(seed)
+        index = np.arange(first, first + count, dtype=np.uint64)
+        base = np.uint64(root.state) + (index + np.uint64(1)) * np.uint64(root.gamma)
+        self.states = _mix64(base)
+        self.gammas = _mix_gamma(base + np.uint64(GOLDEN_GAMMA))
+
+    def draw(self, items, offsets):
+        state = self.states[items] + (offsets + 1).astype(np.uint64) * self.gammas[items]
+        return (_mix64(state) >> np.uint64(11)).astype(np.float64) * 1.1102230246251565e-16  # 2**-53
+
+
+_DRAWS = {LCG32: _LCGDraws, SplitMix64: _SplitMixDraws}
+
+
+class _Batch:
+    """What plans sample from: the chunk's draws and a context holding the batch's starting variables"""
+    __slots__ = ('engine', 'context', 'draws')
+
+    def __init__(self, engine, context, draws):
+        self.engine = engine
+        self.context = context
+        self.draws = draws
+
+
+# --- Plans -----------------------------------------------------------------
+#
+# Every plan has `draws` (most PRNG draws it can make), `refs` / `depth`
+# (most rule expansions and nesting below it, checked against the expander's
+# limits), `hashed` (its value may contain '#') and
+# `sample(batch, items, offsets) -> (values, offsets)`.
+
+class _Const:
+    """A value that needs no draw (static text, literal rules)"""
+    __slots__ = ('value', 'hashed')
+    draws = refs = depth = 0
+
+    def __init__(self, value: str):
+        self.value = value
+        self.hashed = '#' in value
+
+    def sample(self, batch, items, offsets):
+        return [self.value] * len(items), offsets
+
+
+class _Pick:
+    """One draw mapped to an option index, exactly like the rule's `select`"""
+    __slots__ = ('options', 'texts', 'n', 'total', 'cum', 'prob', 'alias', 'weights', 'fallback',
+                 'draws', 'refs', 'depth', 'hashed')
+
+    def __init__(self, options: list, fallback: int, total=None, cum=None, alias=None, weights=None):
+        # options[fallback] is what the rule returns when no weight is reached
+        self.options = options
+        self.fallback = fallback
+        self.n = 0
+        self.total = total
+        self.cum = None if cum is None else np.array(cum, dtype=np.float64)
+        self.prob = self.alias = None
+        if alias is not None:
+            self.prob = np.array(alias.prob, dtype=np.float64)
+            self.alias = np.array(alias.alias, dtype=np.int64)
+            self.n = alias.n
+        self.weights = weights
+        self.texts = None
+        if all(option.__class__ is _Const for option in options):
+            self.texts = np.empty(len(options), dtype=object)
+            self.texts[:] = [option.value for option in options]
+        self.draws = 1 + max(option.draws for option in options)
+        self.refs = max(option.refs for option in options)
+        self.depth = max(option.depth for option in options)
+        self.hashed = any(option.hashed for option in options)
+
+    def modified(self, options: list) -> '_Pick':
+        """Same selection over other constant options (the options with modifiers applied)"""
+        pick = _Pick.__new__(_Pick)
+        for name in _Pick.__slots__:
+            setattr(pick, name, getattr(self, name))
+        pick.options = options
+        pick.texts = np.empty(len(options), dtype=object)
+        pick.texts[:] = [option.value for option in options]
+        pick.hashed = any(option.hashed for option in options)
+        return pick
+
+    def select(self, rand):
+        if self.prob is not None:
+            # AliasTable.pick
+            u = rand * self.n
+            i = u.astype(np.int64)
+            np.minimum(i, self.n - 1, out=i)
+            return np.where(u - i < self.prob[i], i, self.alias[i])
+        rand = rand * self.total
+        if self.cum is not None:
+            # bisect_left over the cumulative weights; past the end means the fallback
+            i = np.searchsorted(self.cum, rand, 'left')
+            i[i >= len(self.cum)] = self.fallback
+            return i
+        # The sequential `rand -= weight` scan, one weight at a time for every item
+        chosen = np.full(len(rand), self.fallback, dtype=np.int64)
+        pending = np.ones(len(rand), dtype=bool)
+        for k, weight in enumerate(self.weights):
+            rand = rand - weight
+            hit = pending & (rand <= 0)
+            chosen[hit] = k
+            pending &= ~hit
+            if not pending.any():
+                break
+        return chosen
+
+    def sample(self, batch, items, offsets):
+        chosen = self.select(batch.draws.draw(items, offsets))
+        offsets = offsets + 1
+        if self.texts is not None:
+            return self.texts[chosen].tolist(), offsets
+        # Options of different shapes: sample each one for the items that chose it
+        values = np.empty(len(items), dtype=object)
+        for option in np.unique(chosen).tolist():
+            where = np.flatnonzero(chosen == option)
+            option_values, option_offsets = self.options[option].sample(batch, items[where], offsets[where])
+            values[where] = option_values
+            offsets[where] = option_offsets
+        return values.tolist(), offsets
+
+
+class _Modified:
+    """Modifiers applied to every value of a plan that is not constant"""
+    __slots__ = ('plan', 'modifiers', 'draws', 'refs', 'depth', 'hashed')
+
+    def __init__(self, plan, modifiers: tuple, hashed: bool):
+        self.plan = plan
+        self.modifiers = modifiers
+        self.draws, self.refs, self.depth = plan.draws, plan.refs, plan.depth
+        self.hashed = hashed
+
+    def sample(self, batch, items, offsets):
+        values, offsets = self.plan.sample(batch, items, offsets)
+        apply, modifiers = batch.engine._apply_modifiers, self.modifiers
+        return [apply(value, modifiers) for value in values], offsets
+
+
+class _Text:
+    """A TextNode: rule values and variables placed into one %-format string"""
+    __slots__ = ('rules', 'parts', 'raw_format', 'dirty', 'draws', 'refs', 'depth', 'hashed')
+
+    def __init__(self, node: TextNode, rules: list):
+        self.rules = rules
+        # Literals and variables, with None for each rule value; raw_format keeps
+        # variable placeholders as written for the engine's substitution pass
+        self.parts = tuple(part.replace('%', '%%') if part.__class__ is str
+                           else None if part.__class__ is RuleRef else part for part in node.parts)
+        self.raw_format = ''.join('%s' if part is None else part.raw.replace('%', '%%') if part.__class__ is VarRef
+                                  else part for part in self.parts)
+        self.dirty = node.has_hash
+        self.draws = sum(rule.draws for rule in rules)
+        self.refs = sum(1 + rule.refs for rule in rules)
+        self.depth = max((1 + rule.depth for rule in rules), default=0)
+        self.hashed = (node.has_hash or any(rule.hashed for rule in rules)
+                       or any(part.__class__ is VarRef for part in self.parts))
+
+    def sample(self, batch, items, offsets):
+        engine, context = batch.engine, batch.context
+        # Variables keep the batch's starting values, so they are formatted in once
+        fmt = ''.join('%s' if part is None
+                      else engine._lookup_variable(part, context).replace('%', '%%') if part.__class__ is VarRef
+                      else part for part in self.parts)
+        columns = []
+        for rule in self.rules:
+            values, offsets = rule.sample(batch, items, offsets)
+            columns.append(values)
+        if not columns:
+            value = engine._substitute_variables(self.raw_format % (), context) if self.dirty else fmt % ()
+            return [value] * len(items), offsets
+        if not self.dirty and not any(rule.hashed for rule in self.rules):
+            return list(map(fmt.__mod__, zip(*columns))), offsets
+        # Some values contain '#': those items take TextNode.render's substitution pass
+        values = []
+        for row in zip(*columns):
+            if self.dirty or any('#' in value for value in row):
+                values.append(engine._substitute_variables(self.raw_format % row, context))
+            else:
+                values.append(fmt % row)
+        return values, offsets
+
+
+class _Targets:
+    """A targeting template: its rules expanded in order, then `CompiledTarget.render`"""
+    __slots__ = ('target', 'rules', 'format', 'draws', 'refs', 'depth')
+
+    def __init__(self, target: CompiledTarget, rules: list):
+        self.target = target
+        self.rules = rules
+        self.format = None
+        if not target.maps and target.segments is not None and not any(rule.hashed for rule in rules):
+            fields = [None if segment is None else segment.replace('{', '{{').replace('}', '}}')
+                      for segment in target.segments]
+            for index, name in target.positions:
+                fields[index] = f'{{{target.names.index(name)}}}'
+            self.format = ''.join(fields)
+        self.draws = sum(rule.draws for rule in rules)
+
+    def sample(self, batch, items, offsets):
+        columns = []
+        for rule in self.rules:
+            values, offsets = rule.sample(batch, items, offsets)
+            columns.append(values)
+        if self.format is not None:
+            return list(map(self.format.format, *columns)), offsets
+        names, render = self.target.names, self.target.render
+        return [render(dict(zip(names, row))) for row in zip(*columns)], offsets
+
+
+class _Planner:
+    """Builds the plan of one entry point; raises _Ineligible for anything the scalar engine must run"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.rules = {}
+        self.active = set()
+
+    def _pure(self, modifiers: tuple) -> bool:
+        engine = self.engine
+        for name in modifiers:
+            func = engine.modifiers.get(name)
+            if func is not None and name not in engine._pure_modifiers and func is not engine._builtin_modifiers.get(name):
+                return False
+        return True
+
+    def text(self, node) -> Any:
+        if node.__class__ is not TextNode:
+            raise _Ineligible
+        if node.static is not None:
+            return _Const(node.static)
+        rules = []
+        for part in node.parts:
+            if part.__class__ is RuleRef:
+                rules.append(self.ref(part))
+            elif part.__class__ is VarRef and not self._pure(part.modifiers):
+                raise _Ineligible
+        return _Text(node, rules)
+
+    def ref(self, ref: RuleRef):
+        plan = self.rule(ref.node)
+        if not ref.modifiers:
+            return plan
+        if not self._pure(ref.modifiers):
+            raise _Ineligible
+        apply = self.engine._apply_modifiers
+        if plan.__class__ is _Const:
+            return _Const(apply(plan.value, ref.modifiers))
+        if plan.__class__ is _Pick and plan.texts is not None:
+            return plan.modified([_Const(apply(option.value, ref.modifiers)) for option in plan.options])
+        builtin = all(self.engine._builtin_modifiers.get(name) is self.engine.modifiers.get(name)
+                      for name in ref.modifiers)
+        return _Modified(plan, ref.modifiers, plan.hashed or not builtin)
+
+    def rule(self, node):
+        key = id(node)
+        plan = self.rules.get(key)
+        if plan is not None:
+            return plan
+        if key in self.active:
+            raise _Ineligible  # recursive grammar
+        self.active.add(key)
+        plan = self.rules[key] = self._rule(node)
+        self.active.discard(key)
+        return plan
+
+    def _rule(self, node):
+        cls = node.__class__
+        alias_selection = self.engine._alias_selection
+        if cls is LiteralRule:
+            return _Const(node.value)
+        if cls is TextRule:
+            return self.text(node.text)
+        if cls is ChoiceRule:
+            if node.dynamic:
+                raise _Ineligible
+            if not node.options:
+                return _Const('[NO VALID OPTIONS]')
+            if any(option.run is not None for option in node.options):
+                raise _Ineligible
+            options = [self.text(option.text) for option in node.options]
+            fallback = len(options)
+            options.append(_Const(node.options[0].raw_text))
+            if node.alias is not None and alias_selection:
+                return _Pick(options, fallback, alias=node.alias)
+            if node.cum is not None:
+                return _Pick(options, fallback, total=node.total, cum=node.cum)
+            return _Pick(options, fallback, total=node.total, weights=self._weights(node.total, [
+                option.weight for option in node.options]))
+        if cls is WeightedRule:
+            if not isinstance(node.texts, tuple) or not node.texts:
+                raise _Ineligible
+            options = [self.text(text) for text in node.texts]
+            if node.alias is not None and alias_selection:
+                return _Pick(options, 0, alias=node.alias)
+            if node.cum is not None:
+                return _Pick(options, 0, total=node.total, cum=node.cum)
+            if len(node.weights) < len(node.texts):
+                raise _Ineligible
+            return _Pick(options, 0, total=node.total, weights=self._weights(node.total, node.weights[:len(options)]))
+        raise _Ineligible  # conditional, sequential, memory-mapped or malformed rules
+
+    @staticmethod
+    def _weights(total, weights):
+        if not all(isinstance(w, (int, float)) for w in list(weights) + [total]):
+            raise _Ineligible
+        return tuple(weights)
+
+    def check_limits(self, plan):
+        expander = self.engine._expander
+        if plan.refs + 1 >= expander.max_expansions or plan.depth + 1 >= expander.max_depth:
+            raise _Ineligible
+
+
+def _plan(engine, generator_name, entry_point, target):
+    generator = engine.loaded_generators[generator_name]
+    compiled = engine._compiled[generator_name]
+    planner = _Planner(engine)
+    try:
+        if target:
+            compiled_target = compiled.targets.get(target)
+            if compiled_target.__class__ is not CompiledTarget:
+                return None  # missing or malformed: the scalar path raises
+            rules = [planner.rule(compiled.rule(name)) for name in compiled_target.names]
+            for rule in rules:
+                planner.check_limits(rule)
+            return _Targets(compiled_target, rules)
+        start_rule = entry_point or generator['entry_points']['default']
+        if not isinstance(start_rule, str):
+            return None
+        if '#' in start_rule:
+            plan = planner.text(compiled.text(start_rule))
+        else:
+            plan = planner.rule(compiled.rule(start_rule))
+        planner.check_limits(plan)
+        return plan
+    except _Ineligible:
+        return None
+
+
+def vectorized_batch(engine, generator_name: str, n: int, seed: Any, entry_point, target, initial: list,
+                     context: dict, start: int) -> Optional[Iterator[str]]:
+    """The items of a `generate_many` batch through the NumPy sampler, or None when it does not apply"""
+    if np is None or n < VECTORIZE_MIN_BATCH or start < 0 or engine._expander.__class__ is not Expander:
+        return None
+    if not isinstance(entry_point or '', str) or not isinstance(target or '', str):
+        return None
+    draws = _DRAWS.get(engine.prng)
+    if draws is None or (draws is _SplitMixDraws and not isinstance(seed, (str, int))):
+        return None
+    compiled = engine._compiled[generator_name]
+    key = (generator_name, entry_point, target)
+    cached = engine._batch_plans.get(key)
+    if cached is None or cached[0] is not compiled:
+        cached = engine._batch_plans[key] = (compiled, _plan(engine, generator_name, entry_point, target))
+    plan = cached[1]
+    if plan is None:
+        return None
+    batch_context = GenerationContext(generator_name, engine._stores[generator_name], initial[:], initial, None,
+                                      context)
+    return _sample_batch(engine, plan, draws, n, seed, batch_context, start)
+
+
+def _sample_batch(engine, plan, draws, n, seed, context, start):
+    first, end = start, start + n
+    chunk = FIRST_CHUNK
+    while first < end:
+        count = min(chunk, end - first)
+        batch = _Batch(engine, context, draws(seed, first, count, plan.draws))
+        values, _ = plan.sample(batch, np.arange(count), np.zeros(count, dtype=np.int64))
+        yield from values
+        first += count
+        chunk = min(chunk * 2, MAX_CHUNK)
@@ -1,6 +1,16 @@
 import unittest
+import gzip
 import json
+import os
+import struct
+import tempfile
+from fractions import Fraction
+import grammar_ir
 from RandomizerEngine import RandomizerEngine
+from mapped_strings import MappedStrings, externalize_string_lists
+from prng import LCG32, SplitMix64
+from snapshot import SNAPSHOT_MAGIC, SnapshotError
+from tracer import TraceLog
 
 class TestPythonRandomizerEngine(unittest.TestCase):
 
@@ -249,29 +259,763 @@ class TestPythonRandomizerEngine(unittest.TestCase):
         self.assertEqual(self.engine.generate("mod-test", {"entry_point": "custom_mod_rule"}), "APPLE!!!")
 
     def test_variable_and_rule_conflict_with_modifiers(self):
-        # Test that #varName.modifier# does not try to apply modifier if varName is only a variable
-        # And #ruleName.modifier# works if ruleName is a rule.
+        # #varName.modifier# applies the modifier to the variable's value,
+        # and #ruleName.modifier# still works if ruleName is a rule.
         var_mod_gen = {
             "metadata": {"name": "var-mod-conflict"},
             "variables": {"username": {"default": "testUser"}},
             "grammar": {
                 "greeting_rule": ["hello"],
-                "message_var_only": ["Hi #username.capitalize#"], # capitalize should not apply to username
-                "message_rule_mod": ["#greeting_rule.capitalize# #username#"]
+                "message_var_only": ["Hi #username.capitalize#"],
+                "message_rule_mod": ["#greeting_rule.capitalize# #username#"],
+                "message_unset": ["Hi #nobody.upper#"]
             },
             "entry_points": {"default": "message_var_only"}
         }
         self.engine.load_generator(var_mod_gen, "var-mod-conflict")
 
-        # Since "username" is not a rule, "capitalize" should not be processed by expand_and_modify_rule
-        # The variable substitution regex r'#([a-zA-Z_][a-zA-Z0-9_]*)#' will match #username.capitalize# as a whole
-        # and fail to find a variable named "username.capitalize". So it will return the literal.
-        # This is the current behavior based on the implementation.
-        # If we wanted #var.mod# to work, _process_text would need another phase or different logic.
-        self.assertEqual(self.engine.generate("var-mod-conflict", {"entry_point": "message_var_only"}), "Hi #username.capitalize#")
-
+        self.assertEqual(self.engine.generate("var-mod-conflict", {"entry_point": "message_var_only"}), "Hi Testuser")
         self.assertEqual(self.engine.generate("var-mod-conflict", {"entry_point": "message_rule_mod"}), "Hello testUser")
+        # An unset variable keeps the placeholder as written
+        self.assertEqual(self.engine.generate("var-mod-conflict", {"entry_point": "message_unset"}), "Hi #nobody.upper#")
+
+    def test_variable_next_to_a_literal_hash(self):
+        # A '#' from a sub-rule must not swallow the opening '#' of the variable after it
+        bundle = {
+            "metadata": {"name": "hash-neighbour"},
+            "variables": {"b": {"default": "w"}},
+            "grammar": {
+                "r4": ["##q.s"],
+                "r2": "#r4##b#",
+                "modded": "#r4##b.upper#"
+            },
+            "entry_points": {"default": "r2"}
+        }
+        self.engine.load_generator(bundle)
+        self.assertEqual(self.engine.generate("hash-neighbour"), "##q.sw")
+        self.assertEqual(self.engine.generate("hash-neighbour", {"entry_point": "modded"}), "##q.sW")
+
+    def test_compiled_text_keeps_literal_hash_semantics(self):
+        # Placeholders that only appear once sub-rules are joined must still resolve as variables
+        hash_gen = {
+            "metadata": {"name": "hash-test"},
+            "variables": {"lvl": {"default": 3}},
+            "grammar": {
+                "open": ["#"],
+                "issue": ["Issue #42 at ##lvl#"],
+                "joined": ["#open#lvl#open#"]
+            },
+            "entry_points": {"default": "issue"}
+        }
+        self.engine.load_generator(hash_gen, "hash-test")
+        self.assertEqual(self.engine.generate("hash-test"), "Issue #42 at #3")
+        self.assertEqual(self.engine.generate("hash-test", {"entry_point": "joined"}), "3")
+
+    def test_alias_selection_mode(self):
+        weighted_gen = {
+            "metadata": {"name": "alias-test"},
+            "grammar": {
+                "pick": [{"text": "rare", "weight": 1}, {"text": "common", "weight": 3.0}],
+                "w": {"type": "weighted", "options": ["A", "B"], "weights": [3, 1]}
+            },
+            "entry_points": {"default": "pick"}
+        }
+        engine1 = RandomizerEngine(seed="alias", selection="alias")
+        engine1.load_generator(weighted_gen)
+        engine2 = RandomizerEngine(seed="alias", selection="alias")
+        engine2.load_generator(weighted_gen)
+
+        results = [engine1.generate("alias-test") for _ in range(4000)]
+        self.assertEqual(results[:50], [engine2.generate("alias-test") for _ in range(50)])
+        self.assertAlmostEqual(results.count("common") / len(results), 0.75, delta=0.03)
+
+        picks = [engine1.generate("alias-test", {"entry_point": "w"}) for _ in range(4000)]
+        self.assertAlmostEqual(picks.count("A") / len(picks), 0.75, delta=0.03)
+
+        with self.assertRaisesRegex(ValueError, "Unknown selection mode"):
+            RandomizerEngine(selection="fastest")
+
+    def test_generate_many_reproducibility_contract(self):
+        counter_gen = {
+            "metadata": {"name": "batch-test"},
+            "variables": {"count": {"default": 0}},
+            "grammar": {
+                "pick": [{"text": "#word# #count#", "actions": {"increment": {"count": 1}}}],
+                "word": ["alpha", "beta", "gamma", "delta"]
+            },
+            "entry_points": {"default": "pick"}
+        }
+        self.engine.load_generator(counter_gen, "batch-test")
+        self.engine.set_seed("main")
+
+        small = list(self.engine.generate_many("batch-test", 5, seed="batch"))
+        large = list(self.engine.generate_many("batch-test", 50, seed="batch"))
+        self.assertEqual(small, large[:5])
+        self.assertEqual(list(self.engine.generate_many("batch-test", 3, seed="batch", start=10)), large[10:13])
+
+        # Each item starts from the batch-start variables and its own derived seed
+        self.assertTrue(all(item.endswith(" 0") for item in large))
+        single = RandomizerEngine(seed="batch:7")
+        single.load_generator(counter_gen, "batch-test")
+        self.assertEqual(single.generate("batch-test"), large[7])
+
+        # The engine's own stream and variables are untouched by the batch
+        self.assertEqual(self.engine.variables["batch-test.count"], 0)
+        reference = RandomizerEngine(seed="main")
+        reference.load_generator(counter_gen, "batch-test")
+        self.assertEqual(self.engine.generate("batch-test"), reference.generate("batch-test"))
+
+    def test_generate_parallel_matches_single_process(self):
+        expected = list(self.engine.generate_many("test-generator", 40, seed=99, entry_point="greeting"))
+        for workers in (1, 3):
+            result = list(self.engine.generate_parallel(
+                "test-generator", 40, workers=workers, seed=99, entry_point="greeting", chunk_size=7))
+            self.assertEqual(result, expected)
+
+        self.engine.register_modifier("shout", lambda s: s.upper())
+        with self.assertRaisesRegex(ValueError, "cannot be sent to worker processes"):
+            list(self.engine.generate_parallel("test-generator", 10, workers=2, seed=1))
+
+    def test_prng_jump_ahead_and_substreams(self):
+        for cls in (LCG32, SplitMix64):
+            stepped = cls.from_seed("jump")
+            jumped = cls.from_seed("jump")
+            for _ in range(1000):
+                stepped.random()
+            jumped.jump(1000)
+            self.assertEqual(stepped.getstate(), jumped.getstate())
+            self.assertEqual(stepped.random(), jumped.random())
+
+        base = SplitMix64.from_seed("streams")
+        first = [base.substream(0).random() for _ in range(3)]
+        self.assertEqual(first, [SplitMix64.from_seed("streams").substream(0).random() for _ in range(3)])
+        self.assertNotEqual(base.substream(0).random(), base.substream(1).random())
+
+        # Batches derive item states from one base; they must match for_index exactly
+        for cls in (LCG32, SplitMix64):
+            for seed in ("batch", 123):
+                index_state = cls.index_states(seed)
+                for index in list(range(25)) + [99, 100, 10 ** 9 + 7, 5, -3]:
+                    self.assertEqual(index_state(index), cls.for_index(seed, index).getstate())
+
+        engine1 = RandomizerEngine(seed="pcg", prng="splitmix64")
+        engine1.load_generator(self.generator_data, "gen1")
+        engine2 = RandomizerEngine(seed="pcg", prng="splitmix64")
+        engine2.load_generator(self.generator_data, "gen2")
+        results1 = [engine1.generate("gen1", {"entry_point": "greeting"}) for _ in range(10)]
+        self.assertEqual(results1, [engine2.generate("gen2", {"entry_point": "greeting"}) for _ in range(10)])
+        self.assertEqual(list(engine1.generate_many("gen1", 5, seed=3, entry_point="greeting")),
+                         list(engine2.generate_many("gen2", 5, seed=3, entry_point="greeting")))
+
+        with self.assertRaisesRegex(ValueError, "Unknown PRNG"):
+            RandomizerEngine(prng="mersenne")
+
+    def test_variables_view_over_generator_stores(self):
+        self.assertEqual(self.engine.variables["test-generator.score"], 0)
+        self.engine.variables["test-generator.score"] = 7
+        self.assertEqual(self.engine._get_variables_for_generator("test-generator"), {"score": 7})
+        self.assertEqual(self.engine.generate("test-generator", {"entry_point": "conditional_test"}), "Score is high")
+
+        # Keys for generators that are not loaded yet are kept and adopted on load
+        self.engine.variables["late.gen.mood"] = "calm"
+        self.engine.load_generator({
+            "metadata": {"name": "late.gen"},
+            "grammar": {"say": ["I feel #mood#"]},
+            "entry_points": {"default": "say"}
+        })
+        self.assertEqual(self.engine.generate("late.gen"), "I feel calm")
+        self.assertIn("late.gen.mood", dict(self.engine.variables.items()))
+
+        self.engine.unload_generator("test-generator")
+        self.assertNotIn("test-generator.score", self.engine.variables)
+        with self.assertRaises(KeyError):
+            self.engine.variables["test-generator.score"]
+
+    def test_sessions_are_isolated_and_thread_safe(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        counter_gen = {
+            "metadata": {"name": "session-test"},
+            "variables": {"count": {"default": 0}},
+            "grammar": {
+                "pick": [{"text": "#word#-#count#", "actions": {"increment": {"count": 1}}}],
+                "word": ["alpha", "beta", "gamma", "delta"]
+            },
+            "entry_points": {"default": "pick"}
+        }
+        self.engine.load_generator(counter_gen, "session-test")
+
+        def run(seed):
+            session = self.engine.session(seed=seed)
+            results = [session.generate("session-test") for _ in range(200)]
+            return results, session.get_variables("session-test")["count"]
+
+        expected = [run(f"worker-{i}") for i in range(8)]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            concurrent = list(pool.map(run, [f"worker-{i}" for i in range(8)]))
+        self.assertEqual(concurrent, expected)
+        self.assertTrue(all(count == 200 for _, count in concurrent))
+        self.assertEqual(self.engine.variables["session-test.count"], 0)
+
+        seeded = RandomizerEngine(seed="engine")
+        seeded.load_generator(counter_gen, "session-test")
+        first, second = seeded.session(), seeded.session()
+        self.assertNotEqual([first.generate("session-test") for _ in range(10)],
+                            [second.generate("session-test") for _ in range(10)])
+
+    def test_wrapped_option_actions_are_merged_once(self):
+        wrapped_gen = {
+            "metadata": {"name": "wrapped-test"},
+            "variables": {"picks": {"default": 0}},
+            "grammar": {
+                "tree": {
+                    "species": [{"text": "oak", "weight": 2}, "elm"],
+                    "actions": {"increment": {"picks": 1}}
+                }
+            },
+            "entry_points": {"default": "tree"}
+        }
+        self.engine.load_generator(wrapped_gen, "wrapped-test")
+        for _ in range(50):
+            self.assertIn(self.engine.generate("wrapped-test"), ["oak", "elm"])
+        self.assertEqual(self.engine.variables["wrapped-test.picks"], 50)
+        # The loaded bundle itself is never rewritten
+        self.assertEqual(wrapped_gen["grammar"]["tree"]["species"][0], {"text": "oak", "weight": 2})
+
+    def test_nested_includes_resolve_relative_to_bundle(self):
+        include_gen = {
+            "metadata": {"name": "include-test"},
+            "grammar": {
+                "origin": "#colour# #shape# #loop#",
+                "colour": {"$include": "colours.json"},
+                "shape": [{"_meta": {}}, {"$include": "/parts/shapes.json"}],
+                "loop": {"$include": "/parts/a.json"}
+            },
+            "entry_points": {"default": "origin"}
+        }
+        files = {
+            "include_test/colours.json": ["red"],
+            "parts/shapes.json": [{"$include": "more_shapes.json"}],
+            "parts/more_shapes.json": ["square"],
+            "parts/a.json": {"$include": "b.json"},
+            "parts/b.json": {"$include": "a.json"},
+        }
+        with tempfile.TemporaryDirectory() as root:
+            for rel, content in files.items():
+                os.makedirs(os.path.dirname(os.path.join(root, rel)), exist_ok=True)
+                with open(os.path.join(root, rel), 'w') as f:
+                    json.dump(content, f)
+            bundle_path = os.path.join(root, "include_test.json")
+            with open(bundle_path, 'w') as f:
+                json.dump(include_gen, f)
+
+            with self.assertLogs('include_loader', level='WARNING') as logs:
+                self.engine.load_generator_file(bundle_path)
+            self.assertTrue(any("Circular include" in line for line in logs.output))
+            self.assertEqual(self.engine.generate("include-test"), "red square [INVALID RULE FORMAT]")
+
+            # Cached across engines until the file changes
+            with open(os.path.join(root, "include_test/colours.json"), 'w') as f:
+                json.dump(["blue!"], f)
+            other = RandomizerEngine()
+            with self.assertLogs('include_loader', level='WARNING'):
+                other.load_generator_file(bundle_path)
+            self.assertTrue(other.generate("include-test").startswith("blue! square"))
+
+    def test_snapshot_round_trip(self):
+        with tempfile.TemporaryDirectory() as root:
+            bundle_path = os.path.join(root, "bundle.json")
+            with open(bundle_path, 'w') as f:
+                json.dump(self.generator_data, f)
+            source = RandomizerEngine(seed="snap")
+            source.load_generator_file(bundle_path)
+            snapshot_path = os.path.join(root, "bundle.snap")
+            source.save_snapshot(snapshot_path)
+            expected = [source.generate("test-generator") for _ in range(20)]
+
+            restored = RandomizerEngine(seed="snap")
+            self.assertEqual(restored.load_snapshot(snapshot_path), ["test-generator"])
+            self.assertEqual([restored.generate("test-generator") for _ in range(20)], expected)
+            self.assertEqual(restored.generate("test-generator", {"target": "midjourney"}),
+                             source.generate("test-generator", {"target": "midjourney"}))
+
+            with open(bundle_path, 'a') as f:
+                f.write("\n")
+            with self.assertRaises(ValueError):
+                RandomizerEngine().load_snapshot(snapshot_path)
+            RandomizerEngine().load_snapshot(snapshot_path, validate=False)
+
+            # A pickle written by another interpreter version is refused before unpickling
+            with open(snapshot_path, 'rb') as f:
+                data = f.read()
+            offset = len(SNAPSHOT_MAGIC) + 4
+            (length,) = struct.unpack('>I', data[len(SNAPSHOT_MAGIC):offset])
+            header = json.loads(data[offset:offset + length])
+            header['python'] = [2, 7]
+            header_bytes = json.dumps(header).encode('utf-8')
+            with open(snapshot_path, 'wb') as f:
+                f.write(SNAPSHOT_MAGIC + struct.pack('>I', len(header_bytes)) + header_bytes
+                        + data[offset + length:])
+            with self.assertRaisesRegex(SnapshotError, "written by Python 2.7"):
+                RandomizerEngine().load_snapshot(snapshot_path, validate=False)
+
+    def test_mapped_string_options_match_plain_lists(self):
+        words = [f"word{i}" for i in range(500)] + ["#greeting# friend", "caf\u00e9"]
+        plain_gen = {
+            "metadata": {"name": "mapped-test"},
+            "grammar": {
+                "greeting": ["hello"],
+                "word": words,
+                "weighted": {"type": "weighted", "options": words, "weights": list(range(1, len(words) + 1))},
+                "origin": "#word# #weighted#"
+            },
+            "entry_points": {"default": "origin"}
+        }
+        with tempfile.TemporaryDirectory() as root:
+            bundle_path = os.path.join(root, "mapped.json")
+            with open(bundle_path, 'w') as f:
+                json.dump(plain_gen, f)
+            mapped_path = os.path.join(root, "mapped_small.json")
+            written = externalize_string_lists(bundle_path, mapped_path, min_options=100)
+            self.assertEqual(sorted(written), ["weighted", "word"])
+
+            for selection in ('exact', 'alias'):
+                plain = RandomizerEngine(seed="mmap", selection=selection)
+                plain.load_generator(json.loads(json.dumps(plain_gen)))
+                mapped = RandomizerEngine(seed="mmap", selection=selection)
+                mapped.load_generator_file(mapped_path)
+                self.assertIsInstance(mapped.loaded_generators["mapped-test"]["grammar"]["word"], MappedStrings)
+                self.assertEqual([mapped.generate("mapped-test") for _ in range(300)],
+                                 [plain.generate("mapped-test") for _ in range(300)])
+                self.assertEqual(list(mapped.generate_parallel("mapped-test", 20, workers=2, seed=3)),
+                                 list(plain.generate_many("mapped-test", 20, seed=3)))
+
+            # Compiled mapped lines with placeholders are kept in a bounded LRU
+            plain_gen["grammar"]["word"] = [f"#greeting# {i}" for i in range(400)]
+            with open(bundle_path, 'w') as f:
+                json.dump(plain_gen, f)
+            externalize_string_lists(bundle_path, mapped_path, min_options=100)
+            plain = RandomizerEngine(seed="lru")
+            plain.load_generator(json.loads(json.dumps(plain_gen)))
+            mapped = RandomizerEngine(seed="lru")
+            mapped.load_generator_file(mapped_path)
+            cache_size, grammar_ir.MAPPED_TEXT_CACHE_SIZE = grammar_ir.MAPPED_TEXT_CACHE_SIZE, 16
+            try:
+                self.assertEqual([mapped.generate("mapped-test") for _ in range(200)],
+                                 [plain.generate("mapped-test") for _ in range(200)])
+            finally:
+                grammar_ir.MAPPED_TEXT_CACHE_SIZE = cache_size
+            self.assertLessEqual(len(mapped._compiled["mapped-test"]._mapped_texts), 16)
+
+
+    def test_deep_grammars_expand_without_recursion_error(self):
+        levels = 3000
+        grammar = {f"level{i}": [f"{i} #level{i + 1}#"] for i in range(levels)}
+        grammar[f"level{levels}"] = ["end"]
+        chain_gen = {"metadata": {"name": "chain"}, "grammar": grammar, "entry_points": {"default": "level0"}}
+
+        deep = RandomizerEngine(seed="deep", max_depth=levels + 1)
+        deep.load_generator(chain_gen)
+        self.assertTrue(deep.generate("chain").endswith(f"{levels - 1} end"))
+
+        shallow = RandomizerEngine(seed="deep", max_depth=3)
+        shallow.load_generator(chain_gen)
+        self.assertEqual(shallow.generate("chain"), "0 1 2 [MAX DEPTH EXCEEDED: level3]")
+
+        looping_gen = {"metadata": {"name": "loop"}, "grammar": {"a": "#a##a#"}, "entry_points": {"default": "a"}}
+        budgeted = RandomizerEngine(max_expansions=5)
+        budgeted.load_generator(looping_gen)
+        self.assertIn("[EXPANSION LIMIT REACHED]", budgeted.generate("loop"))
+
+    def test_static_grammar_analysis(self):
+        analysis_gen = {
+            "metadata": {"name": "analysis-test"},
+            "variables": {"mood": {"default": "calm"}},
+            "grammar": {
+                "origin": ["#adjective# #noun# #mood# #typo#"],
+                "adjective": [{"text": "big", "actions": {"set": {"size": 3}}}],
+                "noun": "#leaf# #size#",
+                "leaf": "tree",
+                "ping": "#pong#",
+                "pong": ["#ping#", "done"],
+                "broken": {"type": "mystery"}
+            },
+            "entry_points": {"default": "origin", "other": "nowhere"},
+            "targeting": {"short": {"template": "#noun# #absent#"}}
+        }
+        self.engine.load_generator(analysis_gen)
+        report = self.engine.analyze_generator("analysis-test")
+        self.assertFalse(report.ok)
+        self.assertEqual(report.missing_rules, {"nowhere": ["entry point 'other'"], "absent": ["target 'short'"]})
+        self.assertEqual(report.invalid_rules, {"broken": "[UNKNOWN RULE TYPE: mystery]"})
+        self.assertEqual(report.undefined_references, {"typo": ["origin"]})
+        self.assertEqual(sorted(report.variable_references), ["mood", "size"])
+        self.assertEqual(report.unreachable_rules, ["broken", "ping", "pong"])
+        self.assertEqual(report.cycles, [["ping", "pong"]])
+        self.assertEqual(report.max_depth, 3)
+        self.assertIsNone(report.rule_depths["ping"])
+
+    def test_output_space_counting(self):
+        space_gen = {
+            "metadata": {"name": "space-test"},
+            "variables": {"score": {"default": 3}},
+            "grammar": {
+                "origin": "#color# #size#",
+                "color": {"type": "weighted", "options": ["red", "blue", "green"], "weights": [2, 1, 1]},
+                "size": {
+                    "type": "conditional",
+                    "options": [{"text": "#big#", "conditions": {"score": {"$gt": 5}}}],
+                    "fallback": "small"
+                },
+                "big": ["huge", "vast"],
+                "loop": ["end", "#loop# again"]
+            },
+            "entry_points": {"default": "origin"},
+            "targeting": {"twice": {"template": "#color# / #color#"}}
+        }
+        self.engine.load_generator(space_gen)
+        space = self.engine.count_outputs("space-test")
+        self.assertEqual(space.derivations, 3)
+        self.assertAlmostEqual(space.entropy_bits, 1.5)
+        self.assertEqual(space.rules["color"].probabilities, [Fraction(1, 2), Fraction(1, 4), Fraction(1, 4)])
+        self.assertEqual(space.max_probability, Fraction(1, 2))
+        self.assertEqual(space.collision_probability, Fraction(3, 8))
+
+        space = self.engine.count_outputs("space-test", variables={"score": 9})
+        self.assertEqual(space.derivations, 6)
+        self.assertAlmostEqual(space.entropy_bits, 2.5)
+        self.assertEqual(space.collision_probability, Fraction(3, 16))
+
+        self.assertEqual(self.engine.count_outputs("space-test", entry_point="#color# #color#").derivations, 9)
+        self.assertEqual(self.engine.count_outputs("space-test", target="twice").derivations, 3)
+        self.assertIsNone(self.engine.count_outputs("space-test", entry_point="loop").derivations)
+
+    def test_generate_unique_stops_when_space_is_exhausted(self):
+        small_gen = {
+            "metadata": {"name": "unique-test"},
+            "grammar": {"origin": "#a# #b#", "a": ["1", "2", "3"], "b": ["x", "y"]},
+            "entry_points": {"default": "origin"}
+        }
+        self.engine.load_generator(small_gen)
+        for mode in ("bloom", "exact"):
+            sampler = self.engine.generate_unique("unique-test", 4, seed=7, mode=mode)
+            outputs = list(sampler)
+            self.assertEqual(len(set(outputs)), 4)
+            self.assertEqual(sampler.stop_reason, "complete")
+
+        sampler = self.engine.generate_unique("unique-test", 10, seed=7, mode="exact", window=100)
+        self.assertEqual(sorted(sampler), ["1 x", "1 y", "2 x", "2 y", "3 x", "3 y"])
+        self.assertTrue(sampler.exhausted)
+        self.assertEqual(sampler.report()["produced"], 6)
+
+    def test_export_resumes_interrupted_files(self):
+        self.engine.load_generator(self.generator_data)
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in ("rows.jsonl", "rows.csv.gz"):
+                full, part = os.path.join(tmp, "full-" + name), os.path.join(tmp, "part-" + name)
+                self.engine.export("test-generator", full, 40, seed=3, include_variables=True, chunk_size=7)
+                self.engine.export("test-generator", part, 25, seed=3, include_variables=True, chunk_size=7)
+                with open(part, "r+b") as f:
+                    f.truncate(os.path.getsize(part) - 5)  # tear the last row
+                result = self.engine.export("test-generator", part, 40, include_variables=True, resume=True)
+                self.assertEqual(result["seed"], 3)
+                self.assertEqual(result["next_index"], 40)
+                opener = gzip.open if name.endswith(".gz") else open
+                with opener(full, "rb") as a, opener(part, "rb") as b:
+                    self.assertEqual(a.read(), b.read())
+
+            # String seeds of digits keep their type in CSV (a different stream from the int)
+            engine = RandomizerEngine(prng="splitmix64")
+            engine.load_generator(self.generator_data)
+            full, part = os.path.join(tmp, "full-seed.csv"), os.path.join(tmp, "part-seed.csv")
+            engine.export("test-generator", full, 30, seed="007", include_variables=True, workers=2, chunk_size=4)
+            engine.export("test-generator", part, 12, seed="007", include_variables=True)
+            with self.assertRaisesRegex(ValueError, "written with seed"):
+                engine.export("test-generator", part, 30, seed=7, resume=True, include_variables=True)
+            self.assertEqual(engine.export("test-generator", part, 20, seed="007", resume=True,
+                                           include_variables=True)["next_index"], 20)
+            self.assertEqual(engine.export("test-generator", part, 30, resume=True,
+                                           include_variables=True)["seed"], "007")
+            with open(full, "rb") as a, open(part, "rb") as b:
+                self.assertEqual(a.read(), b.read())
+
+            rows = os.path.join(tmp, "rows.jsonl")
+            self.engine.export("test-generator", rows, 3, seed=1)
+            with open(rows) as f:
+                first = json.loads(f.readline())
+            self.assertEqual(first["index"], 0)
+            self.assertEqual(first["output"], list(self.engine.generate_many("test-generator", 1, seed=1))[0])
+
+    def test_command_line_batch_matches_generate_many(self):
+        import contextlib
+        import io
+        import randomizer
+
+        with tempfile.TemporaryDirectory() as tmp:
+            bundle = os.path.join(tmp, "bundle.json")
+            with open(bundle, "w") as f:
+                json.dump(self.generator_data, f)
+            out = io.StringIO()
+            with contextlib.redirect_stdout(out):
+                status = randomizer.main(["batch", bundle, "-n", "4", "--seed", "11", "--format", "jsonl"])
+        self.assertEqual(status, 0)
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.engine.load_generator(self.generator_data)
+        self.assertEqual([row["output"] for row in rows],
+                         list(self.engine.generate_many("test-generator", 4, seed=11)))
+        self.assertEqual({row["seed"] for row in rows}, {11})
+
+    def test_profiling_counts_rules_without_changing_output(self):
+        self.engine.load_generator(self.generator_data)
+        expected = list(self.engine.generate_many("test-generator", 20, seed=5))
+        profile = self.engine.enable_profiling()
+        self.assertEqual(list(self.engine.generate_many("test-generator", 20, seed=5)), expected)
+        rows = {row["rule"]: row for row in profile.report(sort="expansions")}
+        self.assertEqual(rows["greeting"]["expansions"], 20)
+        self.assertEqual(sum(rows["greeting"]["choices"].values()), 20)
+        self.assertEqual(set(rows["greeting"]["choices"]), {0, 1})
+        self.assertGreaterEqual(rows["greeting"]["inclusive"], rows["greeting"]["exclusive"])
+        self.assertIs(self.engine.disable_profiling(), profile)
+        self.assertEqual(list(self.engine.generate_many("test-generator", 20, seed=5)), expected)
+
+    def test_tracing_records_path_options_and_variable_changes(self):
+        bundle = {
+            "metadata": {"name": "trace-test"},
+            "variables": {"mood": {"default": "calm"}},
+            "grammar": {
+                "animal": ["owl", {"text": "fox", "actions": {"set": {"mood": "wild"}}}],
+                "origin": ["The #animal# is #mood#"]
+            },
+            "entry_points": {"default": "origin"}
+        }
+        self.engine.load_generator(bundle)
+        expected = list(self.engine.generate_many("trace-test", 30, seed=2))
+        log = self.engine.enable_tracing()
+        self.assertEqual(list(self.engine.generate_many("trace-test", 30, seed=2)), expected)
+        self.assertIs(self.engine.disable_tracing(), log)
+        self.assertEqual(len(log), 30)
+        for output, trace in zip(expected, log):
+            fox = "fox" in output
+            self.assertEqual(trace.path, ["origin", "animal"])
+            self.assertEqual(trace.events[1], ("animal", 1 if fox else 0, 2))
+            self.assertEqual(trace.actions, [("animal", 1, [("set", "mood", "wild")])] if fox else [])
+            self.assertEqual(trace.variables, {"mood": "wild"} if fox else {})
+
+    def test_profiling_and_tracing_survive_a_reload(self):
+        bundle = {
+            "metadata": {"name": "reload"},
+            "variables": {"v": {"default": "0"}},
+            "grammar": {"a": ["#b#"], "b": [{"text": "x", "actions": {"set": {"v": "1"}}}]},
+            "entry_points": {"default": "a"}
+        }
+        profile = self.engine.enable_profiling()
+        self.engine.load_generator(bundle)
+        self.engine.generate("reload")
+        self.engine.load_generator(bundle)
+        self.engine.generate("reload")
+        rows = {row["rule"]: row for row in profile.report()}
+        self.assertEqual((rows["a"]["expansions"], rows["b"]["expansions"]), (2, 2))
+        self.assertEqual(rows["b"]["choices"], {0: 2})
+        self.engine.disable_profiling()
+
+        log = TraceLog()
+        self.engine.load_generator(bundle)
+        self.engine.generate("reload", {"trace": log})
+        self.engine.unload_generator("reload")
+        reordered = dict(bundle, variables={"w": {"default": "0"}, "v": {"default": "0"}})
+        self.engine.load_generator(reordered)
+        self.engine.generate("reload", {"trace": log})
+        self.assertEqual([trace.path for trace in log], [["a", "b"]] * 2)
+        self.assertEqual([trace.options for trace in log], [[0, 0]] * 2)
+        self.assertEqual([trace.variables for trace in log], [{"v": "1"}] * 2)
+
+    def test_tracing_per_call(self):
+        bundle = {
+            "metadata": {"name": "trace-call"},
+            "grammar": {"animal": ["owl", "fox"], "origin": ["The #animal#"]},
+            "entry_points": {"default": "origin"}
+        }
+        self.engine.load_generator(bundle)
+        expected = list(self.engine.generate_many("trace-call", 5, seed=3))
+        log = TraceLog()
+        self.assertEqual(list(self.engine.generate_many("trace-call", 5, seed=3, trace=log)), expected)
+        self.engine.set_seed(9)
+        self.engine.generate("trace-call")
+        self.engine.generate("trace-call", {"trace": log})
+        self.engine.session(seed=1).generate("trace-call", {"trace": log})
+        self.assertEqual(len(log), 7)
+        self.assertEqual([trace.path for trace in log], [["origin", "animal"]] * 7)
+
+        with self.assertRaisesRegex(ValueError, "cannot record traces"):
+            self.engine.generate_parallel("trace-call", 5, workers=2, seed=3, trace=log)
+        self.engine.enable_tracing()
+        with self.assertRaisesRegex(ValueError, "cannot record traces"):
+            self.engine.generate_parallel("trace-call", 5, workers=1, seed=3)
+        self.engine.disable_tracing()
+
+    def test_eq_conditional_rules_dispatch_through_value_index(self):
+        bundle = {
+            "metadata": {"name": "stages"},
+            "variables": {"stage": {"default": 1}},
+            "grammar": {
+                "orchestrator": {
+                    "type": "conditional",
+                    "options": [
+                        {"text": "one", "conditions": {"stage": {"$eq": 1}}, "actions": {"set": {"stage": 2}}},
+                        {"text": "two", "conditions": {"stage": {"$eq": 2}}, "actions": {"increment": {"stage": 1}}},
+                        {"text": "again", "conditions": {"stage": {"$eq": 2}}}
+                    ],
+                    "fallback": "done"
+                }
+            },
+            "entry_points": {"default": "orchestrator"}
+        }
+        self.engine.load_generator(bundle)
+        rule = self.engine._compiled["stages"].rule("orchestrator")
+        self.assertEqual(set(rule.table), {1, 2})
+        self.assertEqual([self.engine.generate("stages") for _ in range(4)], ["one", "two", "done", "done"])
+        self.engine.variables["stages.stage"] = [2]  # unhashable: falls back to the scan
+        self.assertEqual(self.engine.generate("stages"), "done")
+
+    def test_generate_targets_renders_every_target_from_one_derivation(self):
+        bundle = {
+            "metadata": {"name": "fan-out"},
+            "grammar": {
+                "subject": ["a knight", "a dragon", "a wizard", "a ship", "a tower"],
+                "style": ["oil", "ink", "pixel"]
+            },
+            "entry_points": {"default": "#subject#"},
+            "targeting": {
+                "midjourney": {"template": "#subject#, #style# --ar 16:9",
+                               "parameterMap": {"style": {"pixel": "pixel art"}}},
+                "imagen": {"template": "A #style# image of #subject#."}
+            }
+        }
+        self.engine.load_generator(bundle)
+        self.engine.set_seed(7)
+        outputs = [self.engine.generate_targets("fan-out") for _ in range(20)]
+        for output in outputs:
+            self.assertEqual(list(output), ["midjourney", "imagen"])
+            subject = output["imagen"][len("A "):].split(" image of ")[1].rstrip(".")
+            self.assertTrue(output["midjourney"].startswith(subject + ", "))
+        self.engine.set_seed(7)
+        self.assertEqual([self.engine.generate("fan-out", {"target": "midjourney"}) for _ in range(20)],
+                         [output["midjourney"] for output in outputs])
+        batch = list(self.engine.generate_many_targets("fan-out", 5, ["imagen", "midjourney"], seed=3))
+        self.assertEqual([item["imagen"] for item in batch],
+                         list(self.engine.generate_many("fan-out", 5, seed=3, target="imagen")))
+        with self.assertRaises(ValueError):
+            self.engine.generate_targets("fan-out", ["imagen", "missing"])
+
+    def test_unknown_modifiers_are_reported_once_and_pure_modifiers_cached(self):
+        import contextlib
+        import io
+
+        bundle = {
+            "metadata": {"name": "mods"},
+            "grammar": {"noun": ["owl", "yak"], "origin": ["#noun.a_an.bogus# #noun.plural.bogus#"]},
+            "entry_points": {"default": "origin"}
+        }
+        engine = RandomizerEngine(seed=4, modifier_cache_size=16)
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            engine.load_generator(bundle)
+            outputs = [engine.generate("mods") for _ in range(10)]
+        self.assertEqual(out.getvalue().count("Modifier 'bogus' not found"), 1)
+        self.engine.set_seed(4)
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.engine.load_generator(bundle)
+            self.assertEqual([self.engine.generate("mods") for _ in range(10)], outputs)
+        engine.register_modifier("bogus", str.upper, pure=True)
+        self.assertEqual(engine._apply_modifiers("owl", ("a_an", "bogus")), "AN OWL")
+
+    def test_vectorized_batches_match_the_scalar_loop(self):
+        import contextlib
+        import io
+
+        from vectorized import np
+        if np is None:
+            self.skipTest('numpy is not installed')
+        bundle = {
+            "metadata": {"name": "flat"},
+            "variables": {"tone": {"default": "muted"}},
+            "grammar": {
+                "color": ["red", {"text": "teal", "weight": 3}, "ochre"],
+                "shape": {"type": "weighted", "options": ["disc", "orb"], "weights": [0.25, 0.75]},
+                "panel": ["#color.capitalize# #shape.a_an#", "#tone# 100% #shape.plural#"],
+                "origin": ["A #panel# panel", "#color# {x} #shape#"],
+                "mood": {"type": "conditional", "options": [{"conditions": {"tone": {"$eq": "muted"}}, "text": "calm"}],
+                         "fallback": "loud"}
+            },
+            "entry_points": {"default": "origin"}
+        }
+        engines = []
+        for prng in ('lcg', 'splitmix64'):
+            for vectorize in (True, False):
+                engine = RandomizerEngine(prng=prng, vectorize=vectorize)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    engine.load_generator(bundle)
+                engines.append(engine)
+        for fast, slow in (engines[:2], engines[2:]):
+            for entry_point in (None, "#mood# #color#"):
+                for start in (0, 9500):
+                    self.assertEqual(list(fast.generate_many("flat", 1000, seed="s", entry_point=entry_point, start=start)),
+                                     list(slow.generate_many("flat", 1000, seed="s", entry_point=entry_point, start=start)))
+            self.assertIsNotNone(fast._batch_plans[("flat", None, None)][1])
+            self.assertIsNone(fast._batch_plans[("flat", "#mood# #color#", None)][1])  # conditional: scalar path
+            with contextlib.redirect_stdout(io.StringIO()):
+                fast.load_generator(bundle)
+            self.assertFalse([key for key in fast._batch_plans if key[0] == "flat"])
+            list(fast.generate_many("flat", 10, seed="s"))
+            fast.unload_generator("flat")
+            self.assertEqual(fast._batch_plans, {})
+
+    def test_async_generation_matches_sync_and_leaves_engine_untouched_on_timeout(self):
+        import asyncio
+        import contextlib
+        import io
+
+        bundle = {
+            "metadata": {"name": "async-test"},
+            "variables": {"count": {"default": 0}},
+            "grammar": {
+                "pick": [{"text": "#word# #count#", "actions": {"increment": {"count": 1}}}],
+                "word": ["alpha", "beta", "gamma"],
+                "tree": ["#tree# #tree#", "#tree# #tree#", "leaf"]
+            },
+            "entry_points": {"default": "pick"}
+        }
+        sync_engine = RandomizerEngine(seed="a", prng="splitmix64", max_expansions=20000)
+        async_engine = RandomizerEngine(seed="a", prng="splitmix64", max_expansions=20000)
+        with contextlib.redirect_stdout(io.StringIO()):
+            sync_engine.load_generator(bundle)
+            async_engine.load_generator(bundle)
+
+        async def run():
+            outputs = [await async_engine.agenerate("async-test", slice_size=1) for _ in range(5)]
+            with self.assertRaises(TimeoutError):
+                await async_engine.agenerate("async-test", {"entry_point": "tree"}, timeout=0)
+            outputs.append(await async_engine.agenerate("async-test", {"entry_point": "tree"}))
+            batch = [item async for item in async_engine.agenerate_many("async-test", 20, seed="b", slice_size=2)]
+            return outputs, batch
+
+        outputs, batch = asyncio.run(run())
+        expected = [sync_engine.generate("async-test") for _ in range(5)]
+        expected.append(sync_engine.generate("async-test", {"entry_point": "tree"}))
+        self.assertEqual(outputs, expected)
+        self.assertEqual(async_engine.variables["async-test.count"], 5)
+        self.assertEqual(batch, list(sync_engine.generate_many("async-test", 20, seed="b")))
+
+        # Calls never wait for each other, and a call only writes back the variables it changed
+        async def overlap():
+            slow = asyncio.ensure_future(async_engine.agenerate("async-test", {"entry_point": "tree"}, slice_size=1))
+            await asyncio.sleep(0)
+            async_engine.generate("async-test")
+            await async_engine.agenerate("async-test")
+            await slow
 
+        asyncio.run(overlap())
+        self.assertEqual(async_engine.variables["async-test.count"], 7)
 
 if __name__ == '__main__':
     unittest.main()